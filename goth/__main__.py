@@ -5,7 +5,9 @@ from datetime import datetime, timezone
 import logging
 from pathlib import Path
 import shutil
+import sys
 
+from goth.api_monitor.latency import compare_reports, load_report
 from goth.configuration import load_yaml
 from goth.interactive import start_network
 from goth.runner.log import configure_logging, DEFAULT_LOG_DIR
@@ -57,6 +59,25 @@ def create_config(args):
     shutil.copytree(input_dir, output_dir, dirs_exist_ok=args.overwrite)
 
 
+def compare_api_latency(args):
+    """Compare API latency reports of two test runs.
+
+    Exit with status 1 if any operation's latency increased by more than
+    `args.threshold`.
+    """
+
+    lines, regressions = compare_reports(
+        load_report(Path(args.base)),
+        load_report(Path(args.new)),
+        percentile=args.percentile,
+        threshold=args.threshold,
+    )
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} operation(s) with latency regressions")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(prog="goth")
@@ -95,6 +116,32 @@ if __name__ == "__main__":
     )
     parser_cfg.set_defaults(function=create_config)
 
+    parser_cmp = subparsers.add_parser(
+        "compare-api-latency", help="compare API latency reports of two test runs"
+    )
+    parser_cmp.add_argument(
+        "base",
+        metavar="BASE",
+        help="report file or test log directory of the reference run",
+    )
+    parser_cmp.add_argument(
+        "new", metavar="NEW", help="report file or test log directory to compare"
+    )
+    parser_cmp.add_argument(
+        "--percentile",
+        type=int,
+        choices=[50, 95, 99],
+        default=95,
+        help="latency percentile to compare",
+    )
+    parser_cmp.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative latency increase reported as a regression",
+    )
+    parser_cmp.set_defaults(function=compare_api_latency)
+
     args = parser.parse_args()
     try:
         args.function(args)
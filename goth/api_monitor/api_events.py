@@ -2,18 +2,25 @@
 
 import abc
 import json
-import re
-from typing import Optional, Type
+import time
+from typing import Any, Dict, List, Optional, Type
 
 from mitmproxy.flow import Error
 from mitmproxy.http import HTTPRequest, HTTPResponse
 
+from goth.api_monitor.body_store import Body, BodyStore
 from goth.api_monitor.router_addon import CALLER_HEADER, CALLEE_HEADER
+from goth.api_monitor.routes import classify_request, Operation
+
+_NOT_PARSED = object()
+"""Marks cached values which were not computed yet."""
 
 
 class APIEvent(abc.ABC):
     """Abstract superclass of API event classes."""
 
+    __slots__ = ()
+
     @property
     @abc.abstractmethod
     def timestamp(self) -> float:
@@ -29,47 +36,135 @@ class APIEvent(abc.ABC):
         """
 
 
-class APIRequest(APIEvent):
-    """Represents an API request."""
+class _BodyMixin:
+    """Access to the body of a request or a response, decoded and parsed lazily.
 
-    number: int
-    http_request: HTTPRequest
+    Bodies kept in memory are decoded and parsed once, on first access. Bodies
+    spilled to a `BodyStore` are loaded, decoded and parsed on each access, so that
+    they don't stay in memory.
+    """
 
-    def __init__(self, number: int, http_request: HTTPRequest):
-        self.number = number
-        self.http_request = http_request
+    __slots__ = ()
+
+    _body: Body
+    _content: Any
+    _json: Any
 
     @property
-    def timestamp(self) -> float:
-        """Start time op the `http_request`."""
-        return self.http_request.timestamp_start
+    def body(self) -> bytes:
+        """Return the raw body."""
+        return self._body if isinstance(self._body, bytes) else self._body.load()
 
     @property
-    def method(self) -> str:
-        """Return the method of the underlying HTTP request."""
+    def body_size(self) -> int:
+        """Return the size of the body in bytes, without loading a spilled body."""
+        return len(self._body) if isinstance(self._body, bytes) else self._body.length
 
-        return self.http_request.method
+    @property
+    def content(self) -> str:
+        """Return the body decoded as UTF-8."""
+        if self._content is not _NOT_PARSED:
+            return self._content
+        content = self.body.decode("utf-8")
+        if isinstance(self._body, bytes):
+            self._content = content
+        return content
 
     @property
-    def path(self) -> str:
-        """Return the method of the underlying HTTP request."""
+    def json(self) -> Any:
+        """Return the body parsed as JSON."""
+        if self._json is not _NOT_PARSED:
+            return self._json
+        parsed = json.loads(self.content)
+        if isinstance(self._body, bytes):
+            self._json = parsed
+        return parsed
 
-        return self.http_request.path
 
-    @property
-    def caller(self) -> Optional[str]:
-        """Return the caller name."""
-        return self.http_request.headers.get(CALLER_HEADER)
+def _store_body(body: bytes, body_store: Optional[BodyStore]) -> Body:
+    return body_store.store(body) if body_store else body
 
-    @property
-    def callee(self) -> Optional[str]:
-        """Return the callee name."""
-        return self.http_request.headers.get(CALLEE_HEADER)
 
-    @property
-    def content(self) -> str:
-        """Return the request body."""
-        return self.http_request.content.decode("utf-8")
+class APIRequest(_BodyMixin, APIEvent):
+    """Represents an API request."""
+
+    __slots__ = (
+        "number",
+        "method",
+        "path",
+        "operation",
+        "path_params",
+        "caller",
+        "callee",
+        "timestamp",
+        "_body",
+        "_content",
+        "_json",
+    )
+
+    number: int
+
+    method: str
+    """HTTP method of the request."""
+
+    path: str
+    """Path of the request, including the query string."""
+
+    operation: Operation
+    """Operation of the yagna REST API, classified when the event is created."""
+
+    path_params: Dict[str, str]
+    """Parameters extracted from the path, e.g. `subscription_id` or `invoice_id`."""
+
+    caller: Optional[str]
+    """Name of the calling node."""
+
+    callee: Optional[str]
+    """Name of the called node."""
+
+    timestamp: float
+    """Time at which the request started."""
+
+    def __init__(
+        self,
+        number: int,
+        method: str,
+        path: str,
+        caller: Optional[str] = None,
+        callee: Optional[str] = None,
+        body: bytes = b"",
+        timestamp: Optional[float] = None,
+        body_store: Optional[BodyStore] = None,
+    ):
+        self.number = number
+        self.method = method
+        self.path = path
+        self.operation, self.path_params = classify_request(method, path)
+        self.caller = caller
+        self.callee = callee
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self._body = _store_body(body, body_store)
+        self._content = _NOT_PARSED
+        self._json = _NOT_PARSED
+
+    @classmethod
+    def from_http(
+        cls,
+        number: int,
+        http_request: HTTPRequest,
+        body_store: Optional[BodyStore] = None,
+    ) -> "APIRequest":
+        """Create a request event from a mitmproxy request object."""
+        return cls(
+            number,
+            http_request.method,
+            http_request.path,
+            caller=http_request.headers.get(CALLER_HEADER),
+            callee=http_request.headers.get(CALLEE_HEADER),
+            body=http_request.get_content(strict=False) or b"",
+            timestamp=http_request.timestamp_start,
+            body_store=body_store,
+        )
 
     @property
     def header_str(self) -> str:
@@ -80,31 +175,69 @@ class APIRequest(APIEvent):
         return f"[request] {self.header_str}; body: {self.content}"
 
 
-class APIResponse(APIEvent):
+class APIResponse(_BodyMixin, APIEvent):
     """Represents a response to an API request."""
 
+    __slots__ = (
+        "request",
+        "status_code",
+        "timestamp",
+        "timestamp_end",
+        "streamed",
+        "_body",
+        "_content",
+        "_json",
+    )
+
     request: APIRequest
-    http_response: HTTPResponse
 
-    def __init__(self, request: APIRequest, http_response: HTTPResponse):
-        self.request = request
-        self.http_response = http_response
+    status_code: int
+    """HTTP status code of the response."""
 
-    @property
-    def timestamp(self) -> float:
-        """Start time op the `http_response`."""
-        return self.http_response.timestamp_start
+    timestamp: float
+    """Time at which the response started, i.e. its first byte was received."""
 
-    @property
-    def status_code(self) -> int:
-        """Return the HTTP status code."""
+    timestamp_end: float
+    """Time at which the whole response was received."""
 
-        return self.http_response.status_code
+    streamed: bool
+    """Whether the body was passed to the client chunk by chunk, as it arrived."""
 
-    @property
-    def content(self) -> str:
-        """Return the response body."""
-        return self.http_response.content.decode("utf-8")
+    def __init__(
+        self,
+        request: APIRequest,
+        status_code: int,
+        body: bytes = b"",
+        timestamp: Optional[float] = None,
+        timestamp_end: Optional[float] = None,
+        body_store: Optional[BodyStore] = None,
+        streamed: bool = False,
+    ):
+        self.request = request
+        self.status_code = status_code
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.timestamp_end = timestamp_end or self.timestamp
+        self.streamed = streamed
+        self._body = _store_body(body, body_store)
+        self._content = _NOT_PARSED
+        self._json = _NOT_PARSED
+
+    @classmethod
+    def from_http(
+        cls,
+        request: APIRequest,
+        http_response: HTTPResponse,
+        body_store: Optional[BodyStore] = None,
+    ) -> "APIResponse":
+        """Create a response event from a mitmproxy response object."""
+        return cls(
+            request,
+            http_response.status_code,
+            body=http_response.get_content(strict=False) or b"",
+            timestamp=http_response.timestamp_start,
+            timestamp_end=http_response.timestamp_end,
+            body_store=body_store,
+        )
 
     def __str__(self) -> str:
         return (
@@ -116,98 +249,162 @@ class APIResponse(APIEvent):
 class APIError(APIEvent):
     """Represents an error when making an API request or sending a response."""
 
+    __slots__ = ("request", "message", "timestamp")
+
     request: APIRequest
-    error: Error
-    http_response: Optional[HTTPResponse]
+
+    message: str
+    """Description of the error."""
+
+    timestamp: float
+    """Time of the error."""
+
+    def __init__(
+        self, request: APIRequest, message: str, timestamp: Optional[float] = None
+    ):
+        self.request = request
+        self.message = message
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    @classmethod
+    def from_flow_error(cls, request: APIRequest, error: Error) -> "APIError":
+        """Create an error event from a mitmproxy error object."""
+        return cls(request, error.msg, error.timestamp)
+
+    @property
+    def content(self) -> str:
+        """Return the error message."""
+        return self.message
+
+    def __str__(self) -> str:
+        return f"[error] {self.request.header_str}: {self.content}"
+
+
+class APIShaping(APIEvent):
+    """Represents the shaping applied by the proxy to an API call.
+
+    Emitted after the request event, before the request is forwarded.
+    """
+
+    __slots__ = ("request", "delay", "bandwidth", "failure_status", "timestamp")
+
+    request: APIRequest
+
+    delay: float
+    """Delay of the request, in seconds, not including the transfer time."""
+
+    bandwidth: Optional[int]
+    """Bandwidth limit for the request and response bodies, in bytes per second."""
+
+    failure_status: Optional[int]
+    """If set, the request is not forwarded and a response with this status is sent."""
+
+    timestamp: float
+    """Time at which the shaping was decided."""
 
     def __init__(
         self,
         request: APIRequest,
-        error: Error,
-        http_response: Optional[HTTPResponse] = None,
+        delay: float = 0.0,
+        bandwidth: Optional[int] = None,
+        failure_status: Optional[int] = None,
+        timestamp: Optional[float] = None,
     ):
         self.request = request
-        self.error = error
-        self.http_reponse = http_response
+        self.delay = delay
+        self.bandwidth = bandwidth
+        self.failure_status = failure_status
+        self.timestamp = timestamp if timestamp is not None else time.time()
 
-    @property
-    def timestamp(self) -> float:
-        """Time of the error."""
-        return self.error.timestamp
+    def transfer_time(self, size: int) -> float:
+        """Return the time of transferring `size` bytes with the bandwidth limit."""
+        return size / self.bandwidth if self.bandwidth else 0.0
 
     @property
     def content(self) -> str:
-        """Return self."""
-        return self.error.msg
+        """Return the description of the shaping."""
+
+        content = f"delay={self.delay:.3f}s"
+        if self.bandwidth:
+            content += f", bandwidth={self.bandwidth}B/s"
+        if self.failure_status:
+            content += f", failure_status={self.failure_status}"
+        return content
 
     def __str__(self) -> str:
-        return f"[error] {self.request.header_str}: {self.content}"
+        return f"[shaping] {self.request.header_str}: {self.content}"
 
 
-def _match_event(
+def get_operation(event: APIEvent) -> Operation:
+    """Return the operation of the request related to `event`."""
+
+    if isinstance(event, APIRequest):
+        return event.operation
+    if isinstance(event, (APIResponse, APIError, APIShaping)):
+        return event.request.operation
+    return Operation.UNKNOWN
+
+
+def _match_operation(
     event: APIEvent,
     event_class: Type[APIEvent],
-    method: Optional[str] = None,
-    path_regex: Optional[str] = None,
+    operation: Operation,
+    **path_params: str,
 ) -> bool:
+    """Check if `event` is of `event_class` and its request is of `operation`.
 
-    http_request: HTTPRequest
-    if isinstance(event, APIRequest):
-        http_request = event.http_request
-    elif isinstance(event, (APIResponse, APIError)):
-        http_request = event.request.http_request
-    else:
+    Path parameters given as keyword arguments with non-empty values must match
+    the parameters extracted from the request's path.
+    """
+
+    if not isinstance(event, event_class):
         return False
 
-    return (
-        isinstance(event, event_class)
-        and (method is None or http_request.method == method)
-        and (path_regex is None or re.search(path_regex, http_request.path) is not None)
+    request = event if isinstance(event, APIRequest) else event.request
+    return request.operation == operation and all(
+        not value or request.path_params.get(name) == value
+        for name, value in path_params.items()
     )
 
 
 def is_create_agreement_request(event: APIEvent) -> bool:
     """Check if `event` is a request of CreateAgreement operation."""
 
-    return _match_event(event, APIRequest, "POST", "^/market-api/v1/agreements$")
+    return _match_operation(event, APIRequest, Operation.CREATE_AGREEMENT)
 
 
 def is_collect_demands_request(event: APIEvent, sub_id: str = "") -> bool:
     """Check if `event` is a request of CollectDemants operation."""
 
-    sub_id_re = sub_id if sub_id else "[^/]+"
-    return _match_event(
-        event, APIRequest, "GET", f"^/market-api/v1/offers/{sub_id_re}/events"
+    return _match_operation(
+        event, APIRequest, Operation.COLLECT_DEMANDS, subscription_id=sub_id
     )
 
 
 def is_subscribe_offer_request(event: APIEvent) -> bool:
     """Check if `event` is a request of SubscribeOffer operation."""
 
-    return _match_event(event, APIRequest, "POST", "^/market-api/v1/offers$")
+    return _match_operation(event, APIRequest, Operation.SUBSCRIBE_OFFER)
 
 
 def is_unsubscribe_offer_request(event: APIEvent, sub_id: str = "") -> bool:
     """Check if `event` is a request of UnsubscribeOffer operation."""
 
-    sub_id_re = sub_id if sub_id else "[^/]+"
-    return _match_event(
-        event, APIRequest, "DELETE", f"^/market-api/v1/offers/{sub_id_re}$"
+    return _match_operation(
+        event, APIRequest, Operation.UNSUBSCRIBE_OFFER, subscription_id=sub_id
     )
 
 
 def is_subscribe_offer_response(event: APIEvent) -> bool:
     """Check if `event` is a response of SubscribeOffer operation."""
 
-    return _match_event(event, APIResponse, "POST", "^/market-api/v1/offers$")
+    return _match_operation(event, APIResponse, Operation.SUBSCRIBE_OFFER)
 
 
 def is_invoice_send_response(event: APIEvent) -> bool:
     """Check if `event` is a response for InvoiceSend operation."""
 
-    return _match_event(
-        event, APIResponse, "POST", "^/payment-api/v1/provider/invoices/.*/send$"
-    )
+    return _match_operation(event, APIResponse, Operation.SEND_INVOICE)
 
 
 def get_response_json(event: APIEvent):
@@ -217,11 +414,36 @@ def get_response_json(event: APIEvent):
     """
 
     if isinstance(event, APIResponse):
-        return json.loads(event.http_response.text)
+        return event.json
 
     return None
 
 
+def get_response_events(event: APIEvent) -> List[dict]:
+    """If `event` is a response with a list of yagna API events then return the list.
+
+    This applies to responses of operations such as CollectOffers, GetInvoiceEvents
+    or GetProviderActivityEvents. For other events return an empty list.
+    """
+
+    if (
+        isinstance(event, APIResponse)
+        and event.status_code == 200
+        and event.content.lstrip().startswith("[")
+    ):
+        body = event.json
+        if all(isinstance(e, dict) and "eventType" in e for e in body):
+            return body
+
+    return []
+
+
+def get_response_event_types(event: APIEvent) -> List[str]:
+    """Return the types of yagna API events included in the response `event`."""
+
+    return [e["eventType"] for e in get_response_events(event)]
+
+
 def get_activity_id_from_create_response(event: APIEvent) -> Optional[str]:
     """Look for the CreateActivity event to return the ActivityID.
 
@@ -229,12 +451,8 @@ def get_activity_id_from_create_response(event: APIEvent) -> Optional[str]:
     included in the response. Otherwise return `None`.
     """
 
-    if (
-        isinstance(event, APIResponse)
-        and event.request.method == "POST"
-        and event.request.path == "/activity-api/v1/activity"
-    ):
-        return event.http_response.text.strip()[1:-1]
+    if _match_operation(event, APIResponse, Operation.CREATE_ACTIVITY):
+        return event.content.strip()[1:-1]
 
     return None
 
@@ -245,11 +463,7 @@ def get_activity_id_from_delete_response(event: APIEvent) -> Optional[str]:
     Otherwise return `None`.
     """
 
-    if (
-        isinstance(event, APIRequest)
-        and event.method == "DELETE"
-        and event.path.startswith("/activity-api/v1/activity/")
-    ):
-        return event.path.rsplit("/", 1)[-1]
+    if _match_operation(event, APIRequest, Operation.DESTROY_ACTIVITY):
+        return event.path_params["activity_id"]
 
     return None
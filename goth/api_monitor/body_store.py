@@ -0,0 +1,104 @@
+"""Storage for bodies of HTTP messages registered as API events."""
+
+import logging
+from pathlib import Path
+import tempfile
+import threading
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_INLINE_BODY_SIZE = 64 * 1024  # in bytes
+
+
+class SpilledBody(NamedTuple):
+    """Reference to a message body kept in a `BodyStore` file."""
+
+    store: "BodyStore"
+    offset: int
+    length: int
+
+    def load(self) -> bytes:
+        """Read the body from the store's file."""
+        return self.store.read(self.offset, self.length)
+
+
+Body = Union[bytes, SpilledBody]
+"""A message body, either kept in memory or spilled to a file."""
+
+
+class BodyStore:
+    """Keeps message bodies larger than `max_inline_size` in an append-only file.
+
+    Smaller bodies are kept in memory. If no path is given, a temporary file is used.
+    Bodies can be stored from the proxy thread and loaded from any other thread.
+    """
+
+    max_inline_size: int
+    """Size of the largest body kept in memory, in bytes."""
+
+    path: Optional[Path]
+    """Path to the file with spilled bodies, `None` for a temporary file."""
+
+    _closed: bool
+    _file: Optional[BinaryIO]
+    _lock: threading.Lock
+    _size: int
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_inline_size: int = DEFAULT_MAX_INLINE_BODY_SIZE,
+    ):
+        self.max_inline_size = max_inline_size
+        self.path = path
+        self._closed = False
+        self._file = None
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def store(self, body: bytes) -> Body:
+        """Return `body` if it's small enough, otherwise spill it to the file.
+
+        After the store is closed all bodies are kept in memory.
+        """
+
+        if len(body) <= self.max_inline_size:
+            return body
+
+        with self._lock:
+            if self._closed:
+                return body
+            if not self._file:
+                if self.path:
+                    self._file = self.path.open("w+b")
+                else:
+                    self._file = tempfile.TemporaryFile()
+            self._file.seek(self._size)
+            self._file.write(body)
+            self._file.flush()
+            offset = self._size
+            self._size += len(body)
+
+        return SpilledBody(self, offset, len(body))
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Read `length` bytes from the file, starting at `offset`."""
+
+        with self._lock:
+            if not self._file:
+                raise ValueError("Body store is closed")
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def close(self) -> None:
+        """Close the file, spilled bodies cannot be loaded after this call."""
+
+        with self._lock:
+            self._closed = True
+            if self._file:
+                self._file.close()
+                self._file = None
+                logger.debug(
+                    "Closed body store. path=%s, size=%d", self.path, self._size
+                )
@@ -0,0 +1,313 @@
+"""Recorder which streams proxied API calls to a HAR or JSON Lines archive.
+
+Entries are built on the proxy's thread or event loop, while encoding, compression
+and file writes are done by a background writer thread. HAR archives can be loaded
+into standard HAR viewers once the recorder is stopped; JSON Lines archives contain
+one HAR entry per line and can be read while the test is running.
+"""
+import base64
+from datetime import datetime, timezone
+from enum import Enum
+import gzip
+import json
+import logging
+from pathlib import Path
+import queue
+import threading
+from typing import Any, Dict, IO, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from mitmproxy.http import HTTPFlow
+
+from goth.api_monitor.router_addon import CALLEE_HEADER, CALLER_HEADER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BODY_SIZE = 64 * 1024  # in bytes
+HAR_CREATOR = {"name": "goth", "version": ""}
+HAR_VERSION = "1.2"
+
+
+class ArchiveFormat(Enum):
+    """Formats of archives written by `HarRecorder`."""
+
+    HAR = "har"
+    """A single HAR document, finalized when the recorder stops."""
+
+    JSONL = "jsonl"
+    """One HAR entry per line."""
+
+
+class HarRecorder:
+    """Writes HAR entries to an archive file using a background writer thread."""
+
+    path: Path
+    """Path to the archive file."""
+
+    format: ArchiveFormat
+    """Format of the archive."""
+
+    max_body_size: Optional[int]
+    """Bodies longer than this number of bytes are truncated, `None` for no limit."""
+
+    compress: bool
+    """If set, the archive is compressed with gzip and `.gz` is added to its path."""
+
+    _queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]"
+    _writer_thread: Optional[threading.Thread]
+
+    def __init__(
+        self,
+        path: Path,
+        format: ArchiveFormat = ArchiveFormat.HAR,
+        max_body_size: Optional[int] = DEFAULT_MAX_BODY_SIZE,
+        compress: bool = False,
+    ):
+        self.path = path.with_name(path.name + ".gz") if compress else path
+        self.format = format
+        self.max_body_size = max_body_size
+        self.compress = compress
+        self._queue = queue.SimpleQueue()
+        self._writer_thread = None
+
+    def start(self) -> None:
+        """Start the writer thread."""
+
+        self._writer_thread = threading.Thread(
+            target=self._write_entries, name="HarRecorderThread", daemon=True
+        )
+        self._writer_thread.start()
+
+    def stop(self) -> None:
+        """Write pending entries, finalize the archive and stop the writer thread."""
+
+        if self._writer_thread:
+            self._queue.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+            logger.info("API calls recorded to %s", self.path)
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Schedule writing an entry built by `build_entry()`.
+
+        Can be called from any thread.
+        """
+        self._queue.put(entry)
+
+    def _open(self) -> IO[str]:
+        if self.compress:
+            return gzip.open(self.path, "wt", encoding="utf-8")
+        return self.path.open("w", encoding="utf-8")
+
+    def _write_entries(self) -> None:
+        """Run by the writer thread."""
+
+        with self._open() as out:
+            if self.format == ArchiveFormat.HAR:
+                # Entries are streamed, so the enclosing document is written by hand
+                log = {"version": HAR_VERSION, "creator": HAR_CREATOR}
+                out.write(json.dumps({"log": log})[:-2] + ', "entries": [\n')
+            separator = ""
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                try:
+                    line = json.dumps(self._encode_entry(entry))
+                except Exception:
+                    logger.exception("Cannot encode HAR entry")
+                    continue
+                if self.format == ArchiveFormat.HAR:
+                    out.write(separator)
+                    separator = ",\n"
+                    out.write(line)
+                else:
+                    out.write(line + "\n")
+                    out.flush()
+            if self.format == ArchiveFormat.HAR:
+                out.write("\n]}}\n")
+
+    def _encode_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace raw bodies in `entry` with HAR content objects."""
+
+        request = entry["request"]
+        body = request.pop("_body")
+        if body:
+            request["postData"] = {
+                "mimeType": _header_value(request["headers"], "content-type"),
+                **self._encode_body(body),
+            }
+        request["bodySize"] = len(body)
+
+        response = entry["response"]
+        body = response.pop("_body")
+        response["content"] = {
+            "size": len(body),
+            "mimeType": _header_value(response["headers"], "content-type"),
+            **self._encode_body(body),
+        }
+        response["bodySize"] = len(body) if response["status"] else -1
+        return entry
+
+    def _encode_body(self, body: bytes) -> Dict[str, Any]:
+        encoded: Dict[str, Any] = {}
+        if self.max_body_size is not None and len(body) > self.max_body_size:
+            body = body[: self.max_body_size]
+            encoded["comment"] = "truncated"
+        try:
+            encoded["text"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            encoded["text"] = base64.b64encode(body).decode("ascii")
+            encoded["encoding"] = "base64"
+        return encoded
+
+
+def _header_value(headers: List[Dict[str, str]], name: str) -> str:
+    return next((h["value"] for h in headers if h["name"].lower() == name), "")
+
+
+def _ms(start: Optional[float], end: Optional[float]) -> float:
+    """Return the time between `start` and `end` in milliseconds, or -1 if unknown."""
+    if not start or not end or end < start:
+        return -1
+    return round((end - start) * 1000, 3)
+
+
+def build_entry(
+    started: float,
+    method: str,
+    url: str,
+    request_headers: Iterable[Tuple[str, str]],
+    request_body: bytes,
+    timings: Dict[str, float],
+    status: int = 0,
+    reason: str = "",
+    response_headers: Iterable[Tuple[str, str]] = (),
+    response_body: bytes = b"",
+    http_version: str = "HTTP/1.1",
+    error: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build a HAR entry for an API call.
+
+    `timings` should contain the HAR timing phases (`connect`, `send`, `wait`,
+    `receive`) in milliseconds, with -1 for phases that do not apply. `status` 0
+    means that no response was received, in which case `error` should be given.
+    Raw bodies are encoded later, by the recorder's writer thread.
+    """
+
+    headers = [{"name": k, "value": v} for k, v in request_headers]
+    entry: Dict[str, Any] = {
+        "startedDateTime": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "time": sum(t for t in timings.values() if t > 0),
+        "request": {
+            "method": method,
+            "url": url,
+            "httpVersion": http_version,
+            "cookies": [],
+            "headers": headers,
+            "queryString": [
+                {"name": k, "value": v}
+                for k, v in parse_qsl(urlsplit(url).query, keep_blank_values=True)
+            ],
+            "headersSize": -1,
+            "_body": request_body,
+        },
+        "response": {
+            "status": status,
+            "statusText": reason,
+            "httpVersion": http_version,
+            "cookies": [],
+            "headers": [{"name": k, "value": v} for k, v in response_headers],
+            "redirectURL": "",
+            "headersSize": -1,
+            "_body": response_body,
+        },
+        "cache": {},
+        "timings": {"blocked": -1, "dns": -1, "ssl": -1, **timings},
+        "_caller": _header_value(headers, CALLER_HEADER.lower()),
+        "_callee": _header_value(headers, CALLEE_HEADER.lower()),
+    }
+    if error:
+        entry["_error"] = error
+    return entry
+
+
+class HarRecorderAddon:
+    """Add-on for mitmproxy which passes completed flows to a `HarRecorder`.
+
+    The `response` hook is called before the body of a streamed response is sent,
+    so streamed flows are recorded by `MonitorAddon` calling `streamed_response()`
+    once the whole body is passed through.
+    """
+
+    _recorder: HarRecorder
+
+    def __init__(self, recorder: HarRecorder):
+        self._recorder = recorder
+
+    def response(self, flow: HTTPFlow) -> None:
+        """Record a request with its response, unless the response is streamed."""
+        if flow.response and flow.response.stream:
+            return
+        self._record(flow)
+
+    def streamed_response(
+        self, flow: HTTPFlow, body: bytes, timestamp_end: float
+    ) -> None:
+        """Record a request with its streamed response, once `body` is passed through.
+
+        `body` should be decoded according to the `content-encoding` header.
+        """
+        self._record(flow, response_body=body, timestamp_end=timestamp_end)
+
+    def error(self, flow: HTTPFlow) -> None:
+        """Record a request which failed."""
+        self._record(flow, flow.error.msg if flow.error else "unknown error")
+
+    def _record(
+        self,
+        flow: HTTPFlow,
+        error: Optional[str] = None,
+        response_body: Optional[bytes] = None,
+        timestamp_end: Optional[float] = None,
+    ) -> None:
+        req = flow.request
+        resp = flow.response
+        server_conn = flow.server_conn
+        if resp:
+            if response_body is None:
+                response_body = resp.get_content(strict=False) or b""
+            if timestamp_end is None:
+                timestamp_end = resp.timestamp_end
+
+        # Only count the connection setup if the connection was opened for this flow
+        connect = -1.0
+        if (
+            server_conn
+            and server_conn.timestamp_start
+            and server_conn.timestamp_start >= req.timestamp_start
+        ):
+            connect = _ms(server_conn.timestamp_start, server_conn.timestamp_tcp_setup)
+
+        timings = {
+            "connect": connect,
+            "send": _ms(req.timestamp_start, req.timestamp_end),
+            "wait": _ms(req.timestamp_end, resp.timestamp_start) if resp else -1,
+            "receive": _ms(resp.timestamp_start, timestamp_end) if resp else -1,
+        }
+        self._recorder.record(
+            build_entry(
+                started=req.timestamp_start,
+                method=req.method,
+                url=req.url,
+                request_headers=req.headers.items(multi=True),
+                request_body=req.get_content(strict=False) or b"",
+                timings=timings,
+                status=resp.status_code if resp else 0,
+                reason=resp.reason if resp else "",
+                response_headers=resp.headers.items(multi=True) if resp else (),
+                response_body=response_body or b"",
+                http_version=req.http_version,
+                error=error,
+            )
+        )
@@ -0,0 +1,245 @@
+"""Latency statistics for API calls, collected per operation, caller and callee."""
+
+from dataclasses import dataclass, field
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from goth.api_monitor.api_events import APIError, APIEvent, APIRequest, APIResponse
+from goth.api_monitor.routes import Operation
+
+logger = logging.getLogger(__name__)
+
+REPORT_JSON_FILE = "api-latency.json"
+REPORT_MARKDOWN_FILE = "api-latency.md"
+REPORTED_PERCENTILES = (50, 95, 99)
+
+SUB_BUCKET_BITS = 7
+"""Number of bits for the linear sub-buckets of `LatencyHistogram`.
+
+The relative error of recorded values is less than `2 ** -SUB_BUCKET_BITS`.
+"""
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+class LatencyHistogram:
+    """A streaming histogram of latencies with HDR-style log-linear buckets.
+
+    Values are recorded in microseconds. Values below `2 ** SUB_BUCKET_BITS` are
+    counted exactly, larger values in buckets which double in width with each
+    power of two, so memory use depends only on the range of recorded values.
+    """
+
+    count: int
+    max_us: int
+    min_us: int
+    sum_us: int
+    _buckets: Dict[int, int]
+
+    def __init__(self):
+        self.count = 0
+        self.max_us = 0
+        self.min_us = 0
+        self.sum_us = 0
+        self._buckets = {}
+
+    @staticmethod
+    def _bucket_index(value: int) -> int:
+        if value < _SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * _SUB_BUCKETS + (value >> shift) - _SUB_BUCKETS
+
+    @staticmethod
+    def _bucket_range(index: int) -> Tuple[int, int]:
+        if index < _SUB_BUCKETS:
+            return index, index
+        shift = index // _SUB_BUCKETS - 1
+        low = (index % _SUB_BUCKETS + _SUB_BUCKETS) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        """Record a latency given in seconds."""
+
+        value = max(0, round(seconds * 1_000_000))
+        index = self._bucket_index(value)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.min_us = min(self.min_us, value) if self.count else value
+        self.max_us = max(self.max_us, value)
+        self.sum_us += value
+        self.count += 1
+
+    def percentile_ms(self, percentile: float) -> float:
+        """Return the latency at the given percentile, in milliseconds."""
+
+        if not self.count:
+            return 0.0
+        rank = max(1, round(percentile / 100 * self.count))
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                low, high = self._bucket_range(index)
+                value = min(max((low + high) / 2, self.min_us), self.max_us)
+                return round(value / 1000, 3)
+        return round(self.max_us / 1000, 3)
+
+
+StatsKey = Tuple[str, str, str]
+"""Operation name, caller and callee."""
+
+
+@dataclass
+class OperationStats:
+    """Statistics of API calls with the same operation, caller and callee."""
+
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    """Time from the start of the request until the end of the response."""
+
+    errors: int = 0
+    """Number of calls which failed without a response or with a 5xx status."""
+
+    request_bytes: int = 0
+    response_bytes: int = 0
+
+    def to_dict(self) -> dict:
+        """Return a dict with the summary of these statistics."""
+
+        count = self.latency.count
+        summary: dict = {"count": count}
+        for p in REPORTED_PERCENTILES:
+            summary[f"p{p}_ms"] = self.latency.percentile_ms(p)
+        summary["max_ms"] = round(self.latency.max_us / 1000, 3)
+        summary["mean_ms"] = (
+            round(self.latency.sum_us / count / 1000, 3) if count else 0.0
+        )
+        summary["errors"] = self.errors
+        summary["error_rate"] = round(self.errors / count, 4) if count else 0.0
+        summary["request_bytes"] = self.request_bytes
+        summary["response_bytes"] = self.response_bytes
+        return summary
+
+
+class ApiLatencyStats:
+    """Collects `OperationStats` from API events, keyed by operation and nodes.
+
+    Events should be added from a single thread: the proxy's thread or event loop.
+    """
+
+    _stats: Dict[StatsKey, OperationStats]
+
+    def __init__(self):
+        self._stats = {}
+
+    def _get(self, request: APIRequest) -> OperationStats:
+        operation = request.operation
+        name = operation.name if operation != Operation.UNKNOWN else request.method
+        key = (name, request.caller or "", request.callee or "")
+        stats = self._stats.get(key)
+        if not stats:
+            stats = self._stats[key] = OperationStats()
+        return stats
+
+    def add_event(self, event: APIEvent) -> None:
+        """Update the statistics with a response or an error event."""
+
+        if isinstance(event, APIResponse):
+            stats = self._get(event.request)
+            stats.latency.record(event.timestamp_end - event.request.timestamp)
+            stats.request_bytes += event.request.body_size
+            stats.response_bytes += event.body_size
+            if event.status_code >= 500:
+                stats.errors += 1
+        elif isinstance(event, APIError):
+            stats = self._get(event.request)
+            stats.latency.record(event.timestamp - event.request.timestamp)
+            stats.request_bytes += event.request.body_size
+            stats.errors += 1
+
+    def summary(self) -> Dict[StatsKey, dict]:
+        """Return summaries of the statistics for all keys."""
+        return {key: self._stats[key].to_dict() for key in sorted(self._stats)}
+
+    def write_report(self, log_dir: Path) -> None:
+        """Write the report in JSON and Markdown formats to `log_dir`."""
+
+        summary = self.summary()
+        entries = [
+            {"operation": op, "caller": caller, "callee": callee, **stats}
+            for (op, caller, callee), stats in summary.items()
+        ]
+        with (log_dir / REPORT_JSON_FILE).open("w") as f:
+            json.dump({"operations": entries}, f, indent=2)
+        (log_dir / REPORT_MARKDOWN_FILE).write_text(_markdown_report(summary))
+        logger.info("API latency report written to %s", log_dir / REPORT_JSON_FILE)
+
+
+def _markdown_report(summary: Mapping[StatsKey, dict]) -> str:
+    percentiles = " | ".join(f"p{p} ms" for p in REPORTED_PERCENTILES)
+    lines = [
+        f"| operation | caller | callee | count | {percentiles} "
+        "| errors | req bytes | resp bytes |",
+        "|---" * (8 + len(REPORTED_PERCENTILES)) + "|",
+    ]
+    for (op, caller, callee), s in summary.items():
+        values = " | ".join(str(s[f"p{p}_ms"]) for p in REPORTED_PERCENTILES)
+        lines.append(
+            f"| {op} | {caller} | {callee} | {s['count']} | {values} "
+            f"| {s['errors']} | {s['request_bytes']} | {s['response_bytes']} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def load_report(path: Path) -> Dict[StatsKey, dict]:
+    """Load a JSON report written by `ApiLatencyStats.write_report()`.
+
+    `path` may be the report file or the log directory containing it.
+    """
+
+    if path.is_dir():
+        path = path / REPORT_JSON_FILE
+    with path.open() as f:
+        entries = json.load(f)["operations"]
+    return {(e["operation"], e["caller"], e["callee"]): e for e in entries}
+
+
+def compare_reports(
+    base: Mapping[StatsKey, dict],
+    new: Mapping[StatsKey, dict],
+    percentile: int = 95,
+    threshold: float = 0.2,
+) -> Tuple[List[str], List[StatsKey]]:
+    """Compare latencies of two runs at the given percentile.
+
+    Return the lines of a Markdown table with the comparison and the keys for which
+    the latency in `new` is higher than in `base` by more than `threshold`
+    (a fraction of the base value).
+    """
+
+    column = f"p{percentile}_ms"
+    lines = [
+        f"| operation | caller | callee | base {column} | new {column} | change |",
+        "|---|---|---|---|---|---|",
+    ]
+    regressions: List[StatsKey] = []
+    for key in sorted(set(base) | set(new)):
+        base_value: Optional[float] = base[key][column] if key in base else None
+        new_value: Optional[float] = new[key][column] if key in new else None
+        change = ""
+        if base_value and new_value is not None:
+            ratio = new_value / base_value - 1
+            change = f"{ratio:+.1%}"
+            if ratio > threshold:
+                regressions.append(key)
+                change += " (regression)"
+        lines.append(
+            f"| {' | '.join(key)} | {_or_dash(base_value)} | {_or_dash(new_value)} "
+            f"| {change or '-'} |"
+        )
+    return lines, regressions
+
+
+def _or_dash(value: Optional[float]) -> str:
+    return "-" if value is None else str(value)
@@ -3,17 +3,32 @@
 Verifies that a sequence of calls satisfies given properties.
 """
 from __future__ import annotations
+import asyncio
+import functools
 import logging
-from typing import Dict, Optional
+import time
+from typing import AbstractSet, Dict, Iterable, Iterator, Mapping, Optional
 
-from mitmproxy.http import HTTPFlow, HTTPRequest
+from mitmproxy.http import HTTPFlow, HTTPResponse
+from mitmproxy.net.http import encoding
 
 from goth.api_monitor.api_events import (
     APIEvent,
     APIRequest,
     APIResponse,
     APIError,
+    APIShaping,
 )
+from goth.api_monitor.body_store import BodyStore
+from goth.api_monitor.har_recorder import HarRecorderAddon
+from goth.api_monitor.latency import ApiLatencyStats
+from goth.api_monitor.pending_requests import (
+    DEFAULT_REQUEST_TIMEOUT,
+    EXPIRY_CHECK_INTERVAL,
+    PendingRequests,
+)
+from goth.api_monitor.routes import Operation, STREAMED_OPERATIONS
+from goth.api_monitor.shaping import TrafficShaper
 from goth.assertions.monitor import EventMonitor
 
 
@@ -21,15 +36,46 @@ class MonitorAddon:
     """This add-on keeps track of API requests and responses."""
 
     _monitor: EventMonitor[APIEvent]
-    _pending_requests: Dict[HTTPRequest, APIRequest]
+    _body_store: Optional[BodyStore]
+    _latency_stats: Optional[ApiLatencyStats]
+    _shaper: Optional[TrafficShaper]
+
+    _har_addon: Optional[HarRecorderAddon]
+    """Add-on recording API calls, to which streamed responses are passed."""
+
+    _streamed_operations: AbstractSet[Operation]
+    """Operations for which response bodies are passed to the client as they arrive"""
+
+    pending_requests: PendingRequests[str]
+    """Requests waiting for a response or an error, keyed by flow ID."""
+
+    _shaping: Dict[str, APIShaping]
+    """Shaping of the pending requests, keyed by flow ID."""
+
     _num_requests: int
     _logger: logging.Logger
 
-    def __init__(self, monitor: Optional[EventMonitor[APIEvent]] = None):
+    def __init__(
+        self,
+        monitor: Optional[EventMonitor[APIEvent]] = None,
+        body_store: Optional[BodyStore] = None,
+        latency_stats: Optional[ApiLatencyStats] = None,
+        streamed_operations: AbstractSet[Operation] = STREAMED_OPERATIONS,
+        shaper: Optional[TrafficShaper] = None,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        operation_timeouts: Optional[Mapping[Operation, float]] = None,
+        har_addon: Optional[HarRecorderAddon] = None,
+    ):
         self._monitor = monitor or EventMonitor()
         if not self._monitor.is_running():
             self._monitor.start()
-        self._pending_requests = {}
+        self._body_store = body_store
+        self._latency_stats = latency_stats
+        self._streamed_operations = streamed_operations
+        self._shaper = shaper
+        self._har_addon = har_addon
+        self.pending_requests = PendingRequests(request_timeout, operation_timeouts)
+        self._shaping = {}
         self._num_requests = 0
         self._logger = logging.getLogger(__name__)
 
@@ -37,36 +83,175 @@ class MonitorAddon:
         """Log an API event and add it to the monitor."""
 
         self._logger.debug("%s", event)
+        if self._latency_stats:
+            self._latency_stats.add_event(event)
         self._monitor.add_event_sync(event)
 
     def request(self, flow: HTTPFlow) -> None:
         """Register a request."""
 
         self._num_requests += 1
-        request = APIRequest(self._num_requests, flow.request)
-        self._pending_requests[flow.request] = request
+        request = APIRequest.from_http(
+            self._num_requests, flow.request, self._body_store
+        )
+        self._expire_pending_requests()
         self._register_event(request)
+        if flow.error:
+            # The flow was killed by an add-on called earlier, e.g. `RouterAddon`
+            self._register_event(APIError.from_flow_error(request, flow.error))
+            return
+        self.pending_requests.add(flow.id, request)
+
+        shaping = self._shaper.decide(request) if self._shaper else None
+        if shaping:
+            self._shaping[flow.id] = shaping
+            self._register_event(shaping)
+            if shaping.failure_status:
+                # Setting the response here prevents forwarding the request
+                flow.response = HTTPResponse.make(shaping.failure_status)
+            self._delay(flow, shaping.delay + shaping.transfer_time(request.body_size))
+
+    def running(self) -> None:
+        """Start checking for expired requests periodically."""
+        asyncio.ensure_future(self._check_expired_requests())
+
+    def done(self) -> None:
+        """Log the statistics of pending requests."""
+
+        self._logger.info(
+            "API requests in flight: %d, max in flight: %d, expired: %d",
+            len(self.pending_requests),
+            self.pending_requests.max_in_flight,
+            self.pending_requests.num_expired,
+        )
+
+    async def _check_expired_requests(self) -> None:
+        while True:
+            await asyncio.sleep(EXPIRY_CHECK_INTERVAL)
+            self._expire_pending_requests()
+
+    def _expire_pending_requests(self) -> None:
+        """Register timeout errors for requests which got no response in time."""
+
+        now = time.time()
+        for flow_id, request in self.pending_requests.expire(now):
+            self._shaping.pop(flow_id, None)
+            message = f"timeout: no response after {now - request.timestamp:.1f}s"
+            self._logger.warning("Request expired: %s, %s", request, message)
+            self._register_event(APIError(request, message, now))
+
+    @staticmethod
+    def _delay(flow: HTTPFlow, delay: float) -> None:
+        """Suspend processing of `flow` for `delay` seconds."""
+
+        if delay > 0:
+            flow.intercept()
+            # Hooks are called in the event loop of mitmproxy's master
+            asyncio.get_event_loop().call_later(delay, flow.resume)
+
+    def responseheaders(self, flow: HTTPFlow) -> None:
+        """Enable streaming of the response body for long-polling operations."""
+
+        request = self.pending_requests.get(flow.id)
+        if request and request.operation in self._streamed_operations:
+            assert flow.response is not None
+            # Hooks are called in the event loop of mitmproxy's master, to which
+            # `_stream_body()` hands the registration of the response
+            loop = asyncio.get_event_loop()
+            shaping = self._shaping.pop(flow.id, None)
+            flow.response.stream = functools.partial(
+                self._stream_body, flow, loop, shaping
+            )
+
+    def _stream_body(
+        self,
+        flow: HTTPFlow,
+        loop: asyncio.AbstractEventLoop,
+        shaping: Optional[APIShaping],
+        chunks: Iterable[bytes],
+    ) -> Iterator[bytes]:
+        """Pass the chunks of a response body through, buffering the body.
+
+        Called by mitmproxy after the `response` hook, while the body is being sent.
+        This runs in the flow's connection thread, so the response is registered
+        by `_streamed_response()` called in the master's event loop.
+        """
+
+        body = []
+        for chunk in chunks:
+            body.append(chunk)
+            if shaping:
+                time.sleep(shaping.transfer_time(len(chunk)))
+            yield chunk
+
+        loop.call_soon_threadsafe(
+            self._streamed_response, flow, b"".join(body), time.time()
+        )
+
+    def _streamed_response(
+        self, flow: HTTPFlow, content: bytes, timestamp_end: float
+    ) -> None:
+        """Register a response whose body was passed through by `_stream_body()`."""
+
+        assert flow.response is not None
+        content_encoding = flow.response.headers.get("content-encoding")
+        if content_encoding:
+            try:
+                content = encoding.decode(content, content_encoding)
+            except ValueError:
+                self._logger.warning(
+                    "Cannot decode response body. encoding=%s", content_encoding
+                )
+        if self._har_addon:
+            self._har_addon.streamed_response(flow, content, timestamp_end)
+
+        request = self.pending_requests.pop(flow.id)
+        if request:
+            response = APIResponse(
+                request,
+                flow.response.status_code,
+                body=content,
+                timestamp=flow.response.timestamp_start,
+                timestamp_end=timestamp_end,
+                body_store=self._body_store,
+                streamed=True,
+            )
+            self._register_event(response)
+        else:
+            self._logger.error(
+                "Received response for unregistered or expired request: %s", flow
+            )
 
     def response(self, flow: HTTPFlow) -> None:
         """Register a response."""
 
-        request = self._pending_requests.get(flow.request)
+        if flow.response and flow.response.stream:
+            # Registered by `_stream_body()` once the whole body is passed through
+            return
+
+        request = self.pending_requests.pop(flow.id)
         if request:
             assert flow.response is not None
-            response = APIResponse(request, flow.response)
-            del self._pending_requests[flow.request]
+            response = APIResponse.from_http(request, flow.response, self._body_store)
             self._register_event(response)
+            shaping = self._shaping.pop(flow.id, None)
+            if shaping and not shaping.failure_status:
+                self._delay(flow, shaping.transfer_time(response.body_size))
         else:
-            self._logger.error("Received response for unregistered request: %s", flow)
+            self._logger.error(
+                "Received response for unregistered or expired request: %s", flow
+            )
 
     def error(self, flow: HTTPFlow) -> None:
         """Register an error."""
 
-        request = self._pending_requests.get(flow.request)
+        self._shaping.pop(flow.id, None)
+        request = self.pending_requests.pop(flow.id)
         if request:
             assert flow.error is not None
-            error = APIError(request, flow.error, flow.response)
-            del self._pending_requests[flow.request]
+            error = APIError.from_flow_error(request, flow.error)
             self._register_event(error)
         else:
-            self._logger.error("Received error for unregistered request: %s", flow)
+            self._logger.error(
+                "Received error for unregistered or expired request: %s", flow
+            )
@@ -0,0 +1,122 @@
+"""Tracking of API requests waiting for a response, with timeouts."""
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Generic, Hashable, List, Mapping, Optional, Tuple, TypeVar
+
+from goth.api_monitor.api_events import APIRequest
+from goth.api_monitor.routes import Operation
+
+DEFAULT_REQUEST_TIMEOUT = 300.0  # in seconds
+EXPIRY_CHECK_INTERVAL = 1.0  # in seconds
+
+K = TypeVar("K", bound=Hashable)
+
+
+class PendingRequests(Generic[K]):
+    """Requests waiting for a response or an error, ordered by their deadlines.
+
+    Deadlines are kept in a heap, so expired requests are found without scanning
+    all pending requests. Heap entries of completed requests are removed lazily,
+    the heap is rebuilt when they outnumber the pending requests.
+
+    All methods are thread-safe, so that a request may complete in another thread
+    than the one checking for expired requests.
+    """
+
+    default_timeout: float
+    """Time after which a request without a response expires, in seconds."""
+
+    timeouts: Mapping[Operation, float]
+    """Timeouts for specific operations, overriding `default_timeout`."""
+
+    max_in_flight: int
+    """Maximum number of requests pending at the same time."""
+
+    num_expired: int
+    """Number of requests which expired so far."""
+
+    _requests: Dict[K, Tuple[float, APIRequest]]
+    """Pending requests with their deadlines."""
+
+    _deadlines: List[Tuple[float, int, K]]
+    """Heap of deadlines with a sequence number and the key of the request."""
+
+    _sequence: "itertools.count[int]"
+
+    _lock: threading.Lock
+    """Guards `_requests` and `_deadlines`."""
+
+    def __init__(
+        self,
+        default_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        timeouts: Optional[Mapping[Operation, float]] = None,
+    ):
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.max_in_flight = 0
+        self.num_expired = 0
+        self._requests = {}
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of requests in flight."""
+        return len(self._requests)
+
+    def add(self, key: K, request: APIRequest) -> None:
+        """Add a request, with the deadline computed from its operation."""
+
+        timeout = self.timeouts.get(request.operation, self.default_timeout)
+        deadline = request.timestamp + timeout
+        with self._lock:
+            self._requests[key] = (deadline, request)
+            heapq.heappush(self._deadlines, (deadline, next(self._sequence), key))
+            self.max_in_flight = max(self.max_in_flight, len(self._requests))
+            if len(self._deadlines) > 2 * len(self._requests) + 64:
+                self._compact()
+
+    def get(self, key: K) -> Optional[APIRequest]:
+        """Return the pending request with the given key."""
+
+        with self._lock:
+            entry = self._requests.get(key)
+        return entry[1] if entry else None
+
+    def pop(self, key: K) -> Optional[APIRequest]:
+        """Remove and return the pending request with the given key."""
+
+        with self._lock:
+            entry = self._requests.pop(key, None)
+        return entry[1] if entry else None
+
+    def expire(self, now: Optional[float] = None) -> List[Tuple[K, APIRequest]]:
+        """Remove and return the requests whose deadlines passed."""
+
+        now = now if now is not None else time.time()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, _, key = heapq.heappop(self._deadlines)
+                entry = self._requests.get(key)
+                # The key may have been reused for a request with a later deadline
+                if entry and entry[0] == deadline:
+                    del self._requests[key]
+                    expired.append((key, entry[1]))
+            self.num_expired += len(expired)
+        return expired
+
+    def _compact(self) -> None:
+        """Rebuild the heap, leaving only the entries of pending requests.
+
+        Must be called with `_lock` held.
+        """
+
+        self._deadlines = [
+            entry
+            for entry in self._deadlines
+            if entry[2] in self._requests and self._requests[entry[2]][0] == entry[0]
+        ]
+        heapq.heapify(self._deadlines)
@@ -0,0 +1,369 @@
+"""Reverse proxy for API calls running in the caller's asyncio event loop.
+
+This is a lightweight alternative to running mitmproxy with `RouterAddon` and
+`MonitorAddon` in a separate thread: the routing rules and the API events are the
+same, but requests are forwarded with `aiohttp` and events are added to the monitor
+directly, without passing them between threads.
+
+Responses to long-polling operations (see `routes.STREAMED_OPERATIONS`) are passed
+to the client chunk by chunk, as they arrive from the daemon.
+"""
+import abc
+import asyncio
+import logging
+import time
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Tuple
+import zlib
+
+import aiohttp
+from aiohttp import web, web_runner
+
+from goth.api_monitor.api_events import (
+    APIError,
+    APIEvent,
+    APIRequest,
+    APIResponse,
+    APIShaping,
+)
+from goth.api_monitor.body_store import BodyStore
+from goth.api_monitor.har_recorder import build_entry, HarRecorder
+from goth.api_monitor.latency import ApiLatencyStats
+from goth.api_monitor.router_addon import (
+    CALLEE_HEADER,
+    CALLER_HEADER,
+    RoutingTable,
+)
+from goth.api_monitor.routes import Operation, STREAMED_OPERATIONS
+from goth.api_monitor.shaping import TrafficShaper
+from goth.assertions.monitor import EventMonitor
+
+logger = logging.getLogger(__name__)
+
+# Headers which apply to a single connection and are not forwarded by the proxy.
+# `Content-Length` is set again for the forwarded message by `aiohttp`.
+HOP_BY_HOP_HEADERS = frozenset(
+    name.lower()
+    for name in (
+        "Connection",
+        "Content-Length",
+        "Host",
+        "Keep-Alive",
+        "Proxy-Authenticate",
+        "Proxy-Authorization",
+        "TE",
+        "Trailer",
+        "Transfer-Encoding",
+        "Upgrade",
+    )
+)
+
+
+def _forwarded_headers(headers: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    return [(k, v) for k, v in headers if k.lower() not in HOP_BY_HOP_HEADERS]
+
+
+class ReverseProxyBase(abc.ABC):
+    """An `aiohttp` server which routes API calls and creates API events for them.
+
+    Connections to the yagna daemons are kept alive and reused between requests.
+    Subclasses decide what to do with the API events and HAR entries.
+    """
+
+    _routing_table: RoutingTable
+    _body_store: Optional[BodyStore]
+
+    _streamed_operations: AbstractSet[Operation]
+    """Operations for which response bodies are passed to the client as they arrive"""
+
+    _recording: bool
+    """Whether HAR entries are built and passed to `_record_entry()`."""
+
+    _shaper: Optional[TrafficShaper]
+
+    _num_requests: int
+    _runner: Optional[web_runner.ServerRunner]
+    _session: Optional[aiohttp.ClientSession]
+
+    def __init__(
+        self,
+        routing_table: RoutingTable,
+        body_store: Optional[BodyStore] = None,
+        streamed_operations: AbstractSet[Operation] = STREAMED_OPERATIONS,
+        recording: bool = False,
+        shaper: Optional[TrafficShaper] = None,
+    ):
+        self._routing_table = routing_table
+        self._body_store = body_store
+        self._streamed_operations = streamed_operations
+        self._recording = recording
+        self._shaper = shaper
+        self._num_requests = 0
+        self._runner = None
+        self._session = None
+
+    async def start(
+        self, host: Optional[str], port: int, reuse_port: bool = False
+    ) -> None:
+        """Start listening for requests on the given address.
+
+        With `reuse_port` set, several processes can listen on the same port and
+        the kernel distributes connections between them.
+        """
+
+        # No limit on the number of connections since many of the API calls
+        # are long-polling requests; timeouts are left to the API clients.
+        connector = aiohttp.TCPConnector(limit=0)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None),
+            auto_decompress=False,
+            skip_auto_headers=("User-Agent", "Accept", "Accept-Encoding"),
+        )
+        self._runner = web_runner.ServerRunner(web.Server(self._handle_request))
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port, reuse_port=reuse_port or None)
+        await site.start()
+        logger.info("Reverse proxy listening on %s:%d", host or "*", port)
+
+    async def stop(self) -> None:
+        """Stop the server and close the connections to yagna daemons."""
+
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+        logger.info("Reverse proxy stopped")
+
+    @abc.abstractmethod
+    async def _register_event(self, event: APIEvent) -> None:
+        """Handle an API event, in the order of events for the same connection."""
+
+    def _record_entry(self, entry: Dict[str, Any]) -> None:
+        """Handle a HAR entry built by `build_entry()`, if recording is enabled."""
+
+    async def _handle_request(self, request: web.BaseRequest) -> web.StreamResponse:
+        """Route the request, forward it and register the related API events."""
+
+        timestamp_start = time.time()
+        body = await request.content.read()
+        timestamp_end = time.time()
+
+        self._num_requests += 1
+        try:
+            route = self._routing_table.route(request.headers)
+        except (KeyError, ValueError) as ex:
+            logger.error(
+                "Invalid request: %s %s, error: %s",
+                request.method,
+                request.path_qs,
+                ex.args[0],
+            )
+            api_request = APIRequest(
+                self._num_requests,
+                request.method,
+                request.raw_path,
+                body=body,
+                timestamp=timestamp_start,
+                body_store=self._body_store,
+            )
+            await self._register_event(api_request)
+            await self._register_event(APIError(api_request, str(ex)))
+            return web.Response(status=502)
+
+        api_request = APIRequest(
+            self._num_requests,
+            request.method,
+            request.raw_path,
+            caller=route.caller,
+            callee=route.callee,
+            body=body,
+            timestamp=timestamp_start,
+            body_store=self._body_store,
+        )
+        await self._register_event(api_request)
+
+        shaping = self._shaper.decide(api_request) if self._shaper else None
+        if shaping:
+            await self._register_event(shaping)
+            await asyncio.sleep(shaping.delay + shaping.transfer_time(len(body)))
+            if shaping.failure_status:
+                await self._register_event(
+                    APIResponse(api_request, shaping.failure_status)
+                )
+                return web.Response(status=shaping.failure_status)
+
+        headers = _forwarded_headers(request.headers.items())
+        headers += [(CALLER_HEADER, route.caller), (CALLEE_HEADER, route.callee)]
+        url = f"http://{route.host}:{route.port}{request.raw_path}"
+
+        assert self._session
+        streamed = api_request.operation in self._streamed_operations
+        client_response: Optional[web.StreamResponse] = None
+        try:
+            async with self._session.request(
+                request.method,
+                url,
+                headers=headers,
+                data=body,
+                allow_redirects=False,
+            ) as upstream:
+                response_start = time.time()
+                if streamed:
+                    client_response = web.StreamResponse(
+                        status=upstream.status,
+                        reason=upstream.reason,
+                        headers=_forwarded_headers(upstream.headers.items()),
+                    )
+                    response_body = await self._stream_body(
+                        request, upstream, client_response, shaping
+                    )
+                else:
+                    response_body = await upstream.read()
+        except (aiohttp.ClientError, ConnectionResetError) as ex:
+            logger.warning("Error forwarding request: %s, error: %r", api_request, ex)
+            await self._register_event(APIError(api_request, str(ex)))
+            if self._recording:
+                self._record_entry(
+                    build_entry(
+                        timestamp_start,
+                        request.method,
+                        url,
+                        headers,
+                        body,
+                        {"connect": -1, "send": -1, "wait": -1, "receive": -1},
+                        error=str(ex),
+                    )
+                )
+            if client_response is not None and client_response.prepared:
+                # The status line was already sent, the client sees a broken body
+                return client_response
+            return web.Response(status=502)
+
+        response_end = time.time()
+        decoded_body = self._decoded_body(upstream, response_body)
+        api_response = APIResponse(
+            api_request,
+            upstream.status,
+            body=decoded_body,
+            timestamp=response_start,
+            timestamp_end=response_end,
+            body_store=self._body_store,
+            streamed=streamed,
+        )
+        await self._register_event(api_response)
+
+        if self._recording:
+            timings = {
+                "connect": -1,
+                "send": round((timestamp_end - timestamp_start) * 1000, 3),
+                "wait": round((response_start - timestamp_end) * 1000, 3),
+                "receive": round((response_end - response_start) * 1000, 3),
+            }
+            self._record_entry(
+                build_entry(
+                    timestamp_start,
+                    request.method,
+                    url,
+                    headers,
+                    body,
+                    timings,
+                    status=upstream.status,
+                    reason=upstream.reason or "",
+                    response_headers=upstream.headers.items(),
+                    response_body=decoded_body,
+                    http_version="HTTP/%d.%d" % request.version,
+                )
+            )
+
+        if client_response is not None:
+            return client_response
+        if shaping:
+            await asyncio.sleep(shaping.transfer_time(len(response_body)))
+        return web.Response(
+            status=upstream.status,
+            reason=upstream.reason,
+            headers=_forwarded_headers(upstream.headers.items()),
+            body=response_body,
+        )
+
+    @staticmethod
+    async def _stream_body(
+        request: web.BaseRequest,
+        upstream: aiohttp.ClientResponse,
+        client_response: web.StreamResponse,
+        shaping: Optional[APIShaping] = None,
+    ) -> bytes:
+        """Pass the body of `upstream` to the client as it arrives.
+
+        Return the whole body, for the API event.
+        """
+
+        await client_response.prepare(request)
+        chunks = []
+        async for chunk in upstream.content.iter_any():
+            chunks.append(chunk)
+            if shaping:
+                await asyncio.sleep(shaping.transfer_time(len(chunk)))
+            await client_response.write(chunk)
+        await client_response.write_eof()
+        return b"".join(chunks)
+
+    @staticmethod
+    def _decoded_body(response: aiohttp.ClientResponse, body: bytes) -> bytes:
+        """Decode `body` if it's compressed, for the API event."""
+
+        encoding = response.headers.get("Content-Encoding", "identity").lower()
+        if encoding in ("gzip", "deflate"):
+            try:
+                # 47 lets zlib detect both gzip and zlib (deflate) headers
+                return zlib.decompress(body, 47)
+            except zlib.error:
+                logger.warning("Cannot decode response body. encoding=%s", encoding)
+        return body
+
+
+class ReverseProxyServer(ReverseProxyBase):
+    """A reverse proxy which adds API events directly to an `EventMonitor`."""
+
+    monitor: EventMonitor[APIEvent]
+    """Monitor to which the API events are added."""
+
+    _recorder: Optional[HarRecorder]
+    _latency_stats: Optional[ApiLatencyStats]
+
+    def __init__(
+        self,
+        monitor: EventMonitor[APIEvent],
+        routing_table: RoutingTable,
+        body_store: Optional[BodyStore] = None,
+        recorder: Optional[HarRecorder] = None,
+        latency_stats: Optional[ApiLatencyStats] = None,
+        streamed_operations: AbstractSet[Operation] = STREAMED_OPERATIONS,
+        shaper: Optional[TrafficShaper] = None,
+    ):
+        super().__init__(
+            routing_table,
+            body_store,
+            streamed_operations,
+            recorder is not None,
+            shaper,
+        )
+        self.monitor = monitor
+        self._recorder = recorder
+        self._latency_stats = latency_stats
+
+    async def _register_event(self, event: APIEvent) -> None:
+        """Log an API event and add it to the monitor."""
+
+        logger.debug("%s", event)
+        if self._latency_stats:
+            self._latency_stats.add_event(event)
+        await self.monitor.add_event(event)
+
+    def _record_entry(self, entry: Dict[str, Any]) -> None:
+        """Pass a HAR entry to the recorder."""
+
+        if self._recorder:
+            self._recorder.record(entry)
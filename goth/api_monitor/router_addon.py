@@ -4,9 +4,11 @@ Also, adds caller and callee information to request headers.
 """
 
 import logging
-from typing import Mapping
+import threading
+from typing import Callable, List, Mapping, NamedTuple, Optional, Tuple
 
 from mitmproxy.http import HTTPFlow
+
 from goth.address import (
     HOST_REST_PORT_END,
     HOST_REST_PORT_START,
@@ -14,10 +16,145 @@ from goth.address import (
 )
 
 
+logger = logging.getLogger(__name__)
+
 CALLER_HEADER = "X-Caller"
 CALLEE_HEADER = "X-Callee"
 
 
+class Route(NamedTuple):
+    """Destination and node names of a routed API call."""
+
+    host: str
+    port: int
+    caller: str
+    callee: str
+
+
+def route_request(
+    headers: Mapping[str, str],
+    node_names: Mapping[str, str],
+    ports: Mapping[str, dict],
+) -> Route:
+    """Find the destination of a request based on headers set by the proxy container.
+
+    Raises `KeyError` if a required header or mapping entry is missing
+    and `ValueError` if the server port is invalid.
+    """
+
+    server_port = int(headers["X-Server-Port"])
+    remote_addr = headers["X-Remote-Addr"]
+    node_name = node_names[remote_addr]
+
+    if server_port == YAGNA_REST_PORT:
+        # It's a provider agent calling a yagna daemon
+        # Since we assume that the provider agent runs on the same container
+        # as the provider daemon, we route this request to that container's
+        # host-mapped daemon port
+        port = ports[remote_addr][server_port]
+
+    elif HOST_REST_PORT_START <= server_port <= HOST_REST_PORT_END:
+        # It's a requestor agent calling a yagna daemon.
+        # We use localhost as the address together with the original port,
+        # since each daemon has its API port mapped to a port on the host
+        # chosen from the specified range.
+        port = server_port
+
+    else:
+        raise ValueError(f"Invalid server port: {server_port}")
+
+    return Route("127.0.0.1", port, f"{node_name}:agent", f"{node_name}:daemon")
+
+
+RoutingListener = Callable[[str, Optional[str], Optional[dict]], None]
+"""Called with the IP address, node name and port mapping of each registered node.
+
+The name and the port mapping are `None` for unregistered nodes.
+"""
+
+
+class RoutingTable:
+    """Node names and port mappings of the nodes to which API calls are routed.
+
+    Nodes may be registered and unregistered from any thread while proxies use the
+    table. Updates replace both mappings at once, so routing always uses a
+    consistent snapshot without locking.
+    """
+
+    _lock: threading.Lock
+    _listeners: List[RoutingListener]
+
+    _snapshot: Tuple[Mapping[str, str], Mapping[str, dict]]
+    """Mapping of IP addresses to node names and mapping of IP addresses to their
+    port mappings."""
+
+    def __init__(
+        self,
+        node_names: Optional[Mapping[str, str]] = None,
+        ports: Optional[Mapping[str, dict]] = None,
+    ):
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._snapshot = (dict(node_names or {}), dict(ports or {}))
+
+    @property
+    def node_names(self) -> Mapping[str, str]:
+        """Return the mapping of IP addresses to node names."""
+        return self._snapshot[0]
+
+    @property
+    def ports(self) -> Mapping[str, dict]:
+        """Return the mapping of IP addresses to their port mappings."""
+        return self._snapshot[1]
+
+    def add_listener(self, listener: RoutingListener) -> None:
+        """Add a function to be called on each update of the table."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: RoutingListener) -> None:
+        """Remove a function added with `add_listener()`."""
+        self._listeners.remove(listener)
+
+    def register(
+        self, ip_address: str, node_name: str, ports: Optional[dict] = None
+    ) -> None:
+        """Add or replace the node with the given IP address."""
+
+        with self._lock:
+            node_names, all_ports = self._snapshot
+            node_names = {**node_names, ip_address: node_name}
+            all_ports = {**all_ports, ip_address: ports or {}}
+            self._snapshot = (node_names, all_ports)
+            for listener in self._listeners:
+                listener(ip_address, node_name, ports or {})
+        logger.debug(
+            "Registered node for routing. name=%s, ip=%s, ports=%s",
+            node_name,
+            ip_address,
+            ports,
+        )
+
+    def unregister(self, ip_address: str) -> None:
+        """Remove the node with the given IP address, if it's registered."""
+
+        with self._lock:
+            node_names, all_ports = self._snapshot
+            if ip_address not in node_names:
+                return
+            node_names = {k: v for k, v in node_names.items() if k != ip_address}
+            all_ports = {k: v for k, v in all_ports.items() if k != ip_address}
+            self._snapshot = (node_names, all_ports)
+            for listener in self._listeners:
+                listener(ip_address, None, None)
+        logger.debug("Unregistered node from routing. ip=%s", ip_address)
+
+    def route(self, headers: Mapping[str, str]) -> Route:
+        """Find the destination of a request, see `route_request()`."""
+
+        node_names, ports = self._snapshot
+        return route_request(headers, node_names, ports)
+
+
 class RouterAddon:
     """Add-on for mitmproxy to set request headers and route calls.
 
@@ -29,17 +166,11 @@ class RouterAddon:
     """
 
     _logger: logging.Logger
+    _routing_table: RoutingTable
 
-    _node_names: Mapping[str, str]
-    """Mapping of IP addresses to node names"""
-
-    _ports: Mapping[str, dict]
-    """Mapping of IP addresses to their port mappings"""
-
-    def __init__(self, node_names: Mapping[str, str], ports: Mapping[str, dict]):
+    def __init__(self, routing_table: RoutingTable):
         self._logger = logging.getLogger(__name__)
-        self._node_names = node_names
-        self._ports = ports
+        self._routing_table = routing_table
 
     # pylint: disable = no-self-use
     def request(self, flow: HTTPFlow) -> None:
@@ -49,42 +180,19 @@ class RouterAddon:
         self._logger.debug("incoming request %s, headers: %s", req, req.headers)
 
         try:
-            server_addr = req.headers["X-Server-Addr"]
-            server_port = int(req.headers["X-Server-Port"])
-            remote_addr = req.headers["X-Remote-Addr"]
-            node_name = self._node_names[remote_addr]
-
-            if server_port == YAGNA_REST_PORT:
-                # It's a provider agent calling a yagna daemon
-                # Since we assume that the provider agent runs on the same container
-                # as the provider daemon, we route this request to that container's
-                # host-mapped daemon port
-                req.host = "127.0.0.1"
-                req.port = self._ports[remote_addr][server_port]
-                req.headers[CALLER_HEADER] = f"{node_name}:agent"
-                req.headers[CALLEE_HEADER] = f"{node_name}:daemon"
-
-            elif HOST_REST_PORT_START <= server_port <= HOST_REST_PORT_END:
-                # It's a requestor agent calling a yagna daemon.
-                # We use localhost as the address together with the original port,
-                # since each daemon has its API port mapped to a port on the host
-                # chosen from the specified range.
-                req.host = "127.0.0.1"
-                req.port = server_port
-                req.headers[CALLER_HEADER] = f"{node_name}:agent"
-                req.headers[CALLEE_HEADER] = f"{node_name}:daemon"
-
-            else:
-                flow.kill()
-                raise ValueError(f"Invalid server port: {server_port}")
+            route = self._routing_table.route(req.headers)
+            req.host = route.host
+            req.port = route.port
+            req.headers[CALLER_HEADER] = route.caller
+            req.headers[CALLEE_HEADER] = route.callee
 
             self._logger.debug(
-                "Request from %s for %s:%d/%s routed to %s at %s:%d",
+                "Request from %s for %s:%s/%s routed to %s at %s:%d",
                 # request caller:
                 req.headers[CALLER_HEADER],
                 # original host, port and path:
-                server_addr,
-                server_port,
+                req.headers["X-Server-Addr"],
+                req.headers["X-Server-Port"],
                 req.path,
                 # request recipient:
                 req.headers[CALLEE_HEADER],
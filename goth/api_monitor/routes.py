@@ -0,0 +1,390 @@
+"""Route table for classifying yagna REST API calls by operation."""
+
+from enum import IntEnum
+from typing import AbstractSet, Dict, List, Sequence, Tuple
+
+
+class Operation(IntEnum):
+    """Operations of the yagna REST API, as identified by the route table."""
+
+    UNKNOWN = 0
+
+    # Market API
+    SUBSCRIBE_OFFER = 100
+    GET_OFFERS = 101
+    UNSUBSCRIBE_OFFER = 102
+    COLLECT_DEMANDS = 103
+    COUNTER_PROPOSAL_OFFER = 104
+    GET_PROPOSAL_DEMAND = 105
+    REJECT_PROPOSAL_DEMAND = 106
+    APPROVE_AGREEMENT = 107
+    REJECT_AGREEMENT = 108
+    SUBSCRIBE_DEMAND = 110
+    GET_DEMANDS = 111
+    UNSUBSCRIBE_DEMAND = 112
+    COLLECT_OFFERS = 113
+    COUNTER_PROPOSAL_DEMAND = 114
+    GET_PROPOSAL_OFFER = 115
+    REJECT_PROPOSAL_OFFER = 116
+    CREATE_AGREEMENT = 117
+    CONFIRM_AGREEMENT = 118
+    WAIT_FOR_APPROVAL = 119
+    CANCEL_AGREEMENT = 120
+    GET_AGREEMENT = 121
+    TERMINATE_AGREEMENT = 122
+    COLLECT_AGREEMENT_EVENTS = 123
+
+    # Activity API
+    CREATE_ACTIVITY = 200
+    DESTROY_ACTIVITY = 201
+    EXEC = 202
+    GET_EXEC_BATCH_RESULTS = 203
+    CALL_ENCRYPTED = 204
+    GET_ACTIVITY_STATE = 205
+    SET_ACTIVITY_STATE = 206
+    GET_ACTIVITY_USAGE = 207
+    GET_RUNNING_COMMAND = 208
+    GET_ACTIVITY_AGREEMENT = 209
+    COLLECT_ACTIVITY_EVENTS = 210
+
+    # Payment API
+    ISSUE_DEBIT_NOTE = 300
+    SEND_DEBIT_NOTE = 301
+    CANCEL_DEBIT_NOTE = 302
+    ACCEPT_DEBIT_NOTE = 303
+    REJECT_DEBIT_NOTE = 304
+    GET_DEBIT_NOTES = 305
+    GET_DEBIT_NOTE = 306
+    GET_DEBIT_NOTE_EVENTS = 307
+    GET_PAYMENTS_FOR_DEBIT_NOTE = 308
+    ISSUE_INVOICE = 310
+    SEND_INVOICE = 311
+    CANCEL_INVOICE = 312
+    ACCEPT_INVOICE = 313
+    REJECT_INVOICE = 314
+    GET_INVOICES = 315
+    GET_INVOICE = 316
+    GET_INVOICE_EVENTS = 317
+    GET_PAYMENTS_FOR_INVOICE = 318
+    CREATE_ALLOCATION = 320
+    GET_ALLOCATIONS = 321
+    GET_ALLOCATION = 322
+    AMEND_ALLOCATION = 323
+    RELEASE_ALLOCATION = 324
+    GET_PAYMENTS = 330
+    GET_PAYMENT = 331
+    GET_ACCOUNTS = 332
+    GET_DEMAND_DECORATIONS = 333
+
+
+STREAMED_OPERATIONS: AbstractSet[Operation] = frozenset(
+    {
+        Operation.COLLECT_OFFERS,
+        Operation.COLLECT_DEMANDS,
+        Operation.COLLECT_AGREEMENT_EVENTS,
+        Operation.WAIT_FOR_APPROVAL,
+        Operation.GET_EXEC_BATCH_RESULTS,
+        Operation.COLLECT_ACTIVITY_EVENTS,
+        Operation.GET_DEBIT_NOTE_EVENTS,
+        Operation.GET_INVOICE_EVENTS,
+    }
+)
+"""Long-polling and streaming operations, for which proxies pass responses through.
+
+For responses to these operations the proxy sends each chunk of the body to the
+client as soon as it arrives, instead of buffering the whole body first.
+"""
+
+MARKET_API = "/market-api/v1"
+ACTIVITY_API = "/activity-api/v1"
+PAYMENT_API = "/payment-api/v1"
+
+PAYMENT_ROLE_SEGMENTS = ("provider", "requestor")
+"""Path segments which may follow `PAYMENT_API` in older versions of the API.
+
+Paths are classified the same way with or without these segments, e.g.
+`/payment-api/v1/provider/invoices` is classified as `/payment-api/v1/invoices`.
+"""
+
+ROUTES: Sequence[Tuple[Operation, str, str]] = [
+    # Market API, provider side
+    (Operation.SUBSCRIBE_OFFER, "POST", f"{MARKET_API}/offers"),
+    (Operation.GET_OFFERS, "GET", f"{MARKET_API}/offers"),
+    (Operation.UNSUBSCRIBE_OFFER, "DELETE", f"{MARKET_API}/offers/{{subscription_id}}"),
+    (
+        Operation.COLLECT_DEMANDS,
+        "GET",
+        f"{MARKET_API}/offers/{{subscription_id}}/events",
+    ),
+    (
+        Operation.COUNTER_PROPOSAL_OFFER,
+        "POST",
+        f"{MARKET_API}/offers/{{subscription_id}}/proposals/{{proposal_id}}",
+    ),
+    (
+        Operation.GET_PROPOSAL_DEMAND,
+        "GET",
+        f"{MARKET_API}/offers/{{subscription_id}}/proposals/{{proposal_id}}",
+    ),
+    (
+        Operation.REJECT_PROPOSAL_DEMAND,
+        "POST",
+        f"{MARKET_API}/offers/{{subscription_id}}/proposals/{{proposal_id}}/reject",
+    ),
+    (
+        Operation.APPROVE_AGREEMENT,
+        "POST",
+        f"{MARKET_API}/agreements/{{agreement_id}}/approve",
+    ),
+    (
+        Operation.REJECT_AGREEMENT,
+        "POST",
+        f"{MARKET_API}/agreements/{{agreement_id}}/reject",
+    ),
+    # Market API, requestor side
+    (Operation.SUBSCRIBE_DEMAND, "POST", f"{MARKET_API}/demands"),
+    (Operation.GET_DEMANDS, "GET", f"{MARKET_API}/demands"),
+    (
+        Operation.UNSUBSCRIBE_DEMAND,
+        "DELETE",
+        f"{MARKET_API}/demands/{{subscription_id}}",
+    ),
+    (
+        Operation.COLLECT_OFFERS,
+        "GET",
+        f"{MARKET_API}/demands/{{subscription_id}}/events",
+    ),
+    (
+        Operation.COUNTER_PROPOSAL_DEMAND,
+        "POST",
+        f"{MARKET_API}/demands/{{subscription_id}}/proposals/{{proposal_id}}",
+    ),
+    (
+        Operation.GET_PROPOSAL_OFFER,
+        "GET",
+        f"{MARKET_API}/demands/{{subscription_id}}/proposals/{{proposal_id}}",
+    ),
+    (
+        Operation.REJECT_PROPOSAL_OFFER,
+        "POST",
+        f"{MARKET_API}/demands/{{subscription_id}}/proposals/{{proposal_id}}/reject",
+    ),
+    (Operation.CREATE_AGREEMENT, "POST", f"{MARKET_API}/agreements"),
+    (
+        Operation.CONFIRM_AGREEMENT,
+        "POST",
+        f"{MARKET_API}/agreements/{{agreement_id}}/confirm",
+    ),
+    (
+        Operation.WAIT_FOR_APPROVAL,
+        "POST",
+        f"{MARKET_API}/agreements/{{agreement_id}}/wait",
+    ),
+    (
+        Operation.CANCEL_AGREEMENT,
+        "POST",
+        f"{MARKET_API}/agreements/{{agreement_id}}/cancel",
+    ),
+    # Market API, both sides
+    (Operation.GET_AGREEMENT, "GET", f"{MARKET_API}/agreements/{{agreement_id}}"),
+    (
+        Operation.TERMINATE_AGREEMENT,
+        "POST",
+        f"{MARKET_API}/agreements/{{agreement_id}}/terminate",
+    ),
+    (Operation.COLLECT_AGREEMENT_EVENTS, "GET", f"{MARKET_API}/agreementEvents"),
+    # Activity API
+    (Operation.CREATE_ACTIVITY, "POST", f"{ACTIVITY_API}/activity"),
+    (
+        Operation.DESTROY_ACTIVITY,
+        "DELETE",
+        f"{ACTIVITY_API}/activity/{{activity_id}}",
+    ),
+    (Operation.EXEC, "POST", f"{ACTIVITY_API}/activity/{{activity_id}}/exec"),
+    (
+        Operation.GET_EXEC_BATCH_RESULTS,
+        "GET",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/exec/{{batch_id}}",
+    ),
+    (
+        Operation.CALL_ENCRYPTED,
+        "POST",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/encrypted",
+    ),
+    (
+        Operation.GET_ACTIVITY_STATE,
+        "GET",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/state",
+    ),
+    (
+        Operation.SET_ACTIVITY_STATE,
+        "PUT",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/state",
+    ),
+    (
+        Operation.GET_ACTIVITY_USAGE,
+        "GET",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/usage",
+    ),
+    (
+        Operation.GET_RUNNING_COMMAND,
+        "GET",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/command",
+    ),
+    (
+        Operation.GET_ACTIVITY_AGREEMENT,
+        "GET",
+        f"{ACTIVITY_API}/activity/{{activity_id}}/agreement",
+    ),
+    (Operation.COLLECT_ACTIVITY_EVENTS, "GET", f"{ACTIVITY_API}/events"),
+    # Payment API, debit notes
+    (Operation.ISSUE_DEBIT_NOTE, "POST", f"{PAYMENT_API}/debitNotes"),
+    (
+        Operation.SEND_DEBIT_NOTE,
+        "POST",
+        f"{PAYMENT_API}/debitNotes/{{debit_note_id}}/send",
+    ),
+    (
+        Operation.CANCEL_DEBIT_NOTE,
+        "POST",
+        f"{PAYMENT_API}/debitNotes/{{debit_note_id}}/cancel",
+    ),
+    (
+        Operation.ACCEPT_DEBIT_NOTE,
+        "POST",
+        f"{PAYMENT_API}/debitNotes/{{debit_note_id}}/accept",
+    ),
+    (
+        Operation.REJECT_DEBIT_NOTE,
+        "POST",
+        f"{PAYMENT_API}/debitNotes/{{debit_note_id}}/reject",
+    ),
+    (Operation.GET_DEBIT_NOTES, "GET", f"{PAYMENT_API}/debitNotes"),
+    (Operation.GET_DEBIT_NOTE, "GET", f"{PAYMENT_API}/debitNotes/{{debit_note_id}}"),
+    (Operation.GET_DEBIT_NOTE_EVENTS, "GET", f"{PAYMENT_API}/debitNoteEvents"),
+    (
+        Operation.GET_PAYMENTS_FOR_DEBIT_NOTE,
+        "GET",
+        f"{PAYMENT_API}/debitNotes/{{debit_note_id}}/payments",
+    ),
+    # Payment API, invoices
+    (Operation.ISSUE_INVOICE, "POST", f"{PAYMENT_API}/invoices"),
+    (Operation.SEND_INVOICE, "POST", f"{PAYMENT_API}/invoices/{{invoice_id}}/send"),
+    (
+        Operation.CANCEL_INVOICE,
+        "POST",
+        f"{PAYMENT_API}/invoices/{{invoice_id}}/cancel",
+    ),
+    (
+        Operation.ACCEPT_INVOICE,
+        "POST",
+        f"{PAYMENT_API}/invoices/{{invoice_id}}/accept",
+    ),
+    (
+        Operation.REJECT_INVOICE,
+        "POST",
+        f"{PAYMENT_API}/invoices/{{invoice_id}}/reject",
+    ),
+    (Operation.GET_INVOICES, "GET", f"{PAYMENT_API}/invoices"),
+    (Operation.GET_INVOICE, "GET", f"{PAYMENT_API}/invoices/{{invoice_id}}"),
+    (Operation.GET_INVOICE_EVENTS, "GET", f"{PAYMENT_API}/invoiceEvents"),
+    (
+        Operation.GET_PAYMENTS_FOR_INVOICE,
+        "GET",
+        f"{PAYMENT_API}/invoices/{{invoice_id}}/payments",
+    ),
+    # Payment API, allocations
+    (Operation.CREATE_ALLOCATION, "POST", f"{PAYMENT_API}/allocations"),
+    (Operation.GET_ALLOCATIONS, "GET", f"{PAYMENT_API}/allocations"),
+    (Operation.GET_ALLOCATION, "GET", f"{PAYMENT_API}/allocations/{{allocation_id}}"),
+    (
+        Operation.AMEND_ALLOCATION,
+        "PUT",
+        f"{PAYMENT_API}/allocations/{{allocation_id}}",
+    ),
+    (
+        Operation.RELEASE_ALLOCATION,
+        "DELETE",
+        f"{PAYMENT_API}/allocations/{{allocation_id}}",
+    ),
+    # Payment API, other
+    (Operation.GET_PAYMENTS, "GET", f"{PAYMENT_API}/payments"),
+    (Operation.GET_PAYMENT, "GET", f"{PAYMENT_API}/payments/{{payment_id}}"),
+    (Operation.GET_ACCOUNTS, "GET", f"{PAYMENT_API}/accounts"),
+    (Operation.GET_ACCOUNTS, "GET", f"{PAYMENT_API}/providerAccounts"),
+    (Operation.GET_ACCOUNTS, "GET", f"{PAYMENT_API}/requestorAccounts"),
+    (Operation.GET_DEMAND_DECORATIONS, "GET", f"{PAYMENT_API}/demandDecorations"),
+]
+"""Routes of the yagna REST API: operations with their HTTP methods and paths.
+
+Path segments enclosed in braces are parameters extracted on classification.
+"""
+
+_PAYMENT_API_SEGMENTS = PAYMENT_API.strip("/").split("/")
+
+_Segment = Tuple[bool, str]
+"""A path template segment: a flag telling whether it's a parameter, and its text.
+
+For parameters, the text is the name of the parameter.
+"""
+
+
+def _split_path(path: str) -> List[str]:
+    """Split `path` into segments, dropping the query string and the payment role."""
+
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    if (
+        len(segments) > 2
+        and segments[:2] == _PAYMENT_API_SEGMENTS
+        and segments[2] in PAYMENT_ROLE_SEGMENTS
+    ):
+        del segments[2]
+    return segments
+
+
+class RouteClassifier:
+    """Classifies API calls by their method and path using a precompiled route table.
+
+    Routes are indexed by the HTTP method and the number of path segments, so
+    classifying a path only compares its segments with a few candidate routes.
+    """
+
+    _index: Dict[Tuple[str, int], List[Tuple[Operation, Sequence[_Segment]]]]
+
+    def __init__(self, routes: Sequence[Tuple[Operation, str, str]] = ROUTES):
+        self._index = {}
+        for operation, method, template in routes:
+            segments = [
+                (True, s[1:-1]) if s.startswith("{") else (False, s)
+                for s in template.strip("/").split("/")
+            ]
+            key = (method.upper(), len(segments))
+            self._index.setdefault(key, []).append((operation, segments))
+
+    def classify(self, method: str, path: str) -> Tuple[Operation, Dict[str, str]]:
+        """Return the operation for a call and the parameters extracted from `path`.
+
+        If the call does not match any route, return `Operation.UNKNOWN` and
+        an empty dict.
+        """
+
+        segments = _split_path(path)
+        for operation, route in self._index.get((method.upper(), len(segments)), ()):
+            params: Dict[str, str] = {}
+            for (is_param, text), segment in zip(route, segments):
+                if is_param:
+                    params[text] = segment
+                elif text != segment:
+                    break
+            else:
+                return operation, params
+
+        return Operation.UNKNOWN, {}
+
+
+_default_classifier = RouteClassifier()
+
+
+def classify_request(method: str, path: str) -> Tuple[Operation, Dict[str, str]]:
+    """Classify an API call using the default route table, see `RouteClassifier`."""
+    return _default_classifier.classify(method, path)
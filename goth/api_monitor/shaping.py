@@ -0,0 +1,186 @@
+"""Shaping of API calls passing through the proxy: latency, bandwidth and failures.
+
+Shaping rules select API calls by caller, callee and operation. A test can add and
+remove rules at any time, e.g. with `runner.proxy.shaper.add_rule(...)`; the new
+rules apply to requests made from then on. Each shaping decision is added to the
+monitor as an `APIShaping` event, following the request it applies to.
+"""
+from dataclasses import dataclass
+from enum import Enum
+from fnmatch import fnmatchcase
+import logging
+import random
+import threading
+from typing import AbstractSet, Callable, Iterable, List, Optional, Tuple
+
+from goth.api_monitor.api_events import APIRequest, APIShaping
+from goth.api_monitor.routes import Operation
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyDistribution(Enum):
+    """Distributions of the delays added by a `ShapingRule`."""
+
+    NORMAL = "normal"
+    """Normal distribution, with `jitter` as the standard deviation."""
+
+    UNIFORM = "uniform"
+    """Uniform distribution between `latency - jitter` and `latency + jitter`."""
+
+    EXPONENTIAL = "exponential"
+    """Exponential distribution of the delay in excess of `latency - jitter`.
+
+    The mean of the delay is `latency`, `jitter` is both the standard deviation
+    and the maximum amount by which the delay is lower than `latency`.
+    """
+
+
+@dataclass(frozen=True)
+class ShapingRule:
+    """Shaping of API calls matching the given callers, callees and operations."""
+
+    caller: str = "*"
+    """Shell-style pattern for the caller, e.g. `provider-*:agent`."""
+
+    callee: str = "*"
+    """Shell-style pattern for the callee, e.g. `requestor:daemon`."""
+
+    operations: Optional[AbstractSet[Operation]] = None
+    """Operations to which this rule applies, `None` for all operations."""
+
+    latency: float = 0.0
+    """Mean delay added to each request, in seconds."""
+
+    jitter: float = 0.0
+    """Variation of the delay, in seconds, as defined by `distribution`."""
+
+    distribution: LatencyDistribution = LatencyDistribution.NORMAL
+
+    bandwidth: Optional[int] = None
+    """Limit for the transfer rate of request and response bodies, in bytes/s."""
+
+    failure_rate: float = 0.0
+    """Probability that a request is not forwarded and fails instead."""
+
+    failure_status: int = 503
+    """Status of the responses sent for failed requests."""
+
+    def matches(self, request: APIRequest) -> bool:
+        """Check if this rule applies to `request`."""
+
+        return (
+            (self.operations is None or request.operation in self.operations)
+            and fnmatchcase(request.caller or "", self.caller)
+            and fnmatchcase(request.callee or "", self.callee)
+        )
+
+
+ShapingListener = Callable[[Tuple[ShapingRule, ...]], None]
+"""Called with the current rules of a `TrafficShaper` each time they change."""
+
+
+class TrafficShaper:
+    """Decides how to shape API calls, using the most recently added matching rule.
+
+    Rules may be changed from any thread while the proxy is running. Random values
+    come from a generator with the given seed, to make experiments reproducible.
+    """
+
+    seed: Optional[int]
+    """Seed of the random generator, `None` for a random seed."""
+
+    _listeners: List[ShapingListener]
+    _lock: threading.Lock
+    _random: random.Random
+
+    _rules: Tuple[ShapingRule, ...]
+    """Current rules, replaced as a whole when rules are added or removed."""
+
+    def __init__(self, rules: Iterable[ShapingRule] = (), seed: Optional[int] = None):
+        self.seed = seed
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._rules = tuple(rules)
+
+    @property
+    def rules(self) -> Tuple[ShapingRule, ...]:
+        """Return the current rules, in the order in which they were added."""
+        return self._rules
+
+    def add_listener(self, listener: ShapingListener) -> None:
+        """Add a function to be called on each change of the rules."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ShapingListener) -> None:
+        """Remove a function added with `add_listener()`."""
+        self._listeners.remove(listener)
+
+    def _set_rules(self, rules: Tuple[ShapingRule, ...]) -> None:
+        """Replace the rules and notify the listeners, called with the lock held."""
+
+        self._rules = rules
+        for listener in self._listeners:
+            listener(rules)
+
+    def add_rule(self, rule: ShapingRule) -> ShapingRule:
+        """Add a rule, which takes precedence over the existing rules."""
+
+        with self._lock:
+            self._set_rules(self._rules + (rule,))
+        logger.info("Added shaping rule: %s", rule)
+        return rule
+
+    def remove_rule(self, rule: ShapingRule) -> None:
+        """Remove a rule added previously."""
+
+        with self._lock:
+            rules = list(self._rules)
+            rules.remove(rule)
+            self._set_rules(tuple(rules))
+        logger.info("Removed shaping rule: %s", rule)
+
+    def clear_rules(self) -> None:
+        """Remove all rules."""
+
+        with self._lock:
+            self._set_rules(())
+
+    def replace_rules(self, rules: Iterable[ShapingRule]) -> None:
+        """Replace all rules, e.g. with the rules of another shaper."""
+
+        with self._lock:
+            self._set_rules(tuple(rules))
+
+    def decide(self, request: APIRequest) -> Optional[APIShaping]:
+        """Return the shaping for `request`, or `None` if no rule applies to it."""
+
+        rule = next((r for r in reversed(self._rules) if r.matches(request)), None)
+        if not rule:
+            return None
+
+        with self._lock:
+            delay = self._delay(rule)
+            failed = rule.failure_rate > 0 and self._random.random() < rule.failure_rate
+        return APIShaping(
+            request,
+            delay,
+            rule.bandwidth,
+            rule.failure_status if failed else None,
+        )
+
+    def _delay(self, rule: ShapingRule) -> float:
+        if not rule.jitter:
+            return rule.latency
+        if rule.distribution == LatencyDistribution.UNIFORM:
+            delay = self._random.uniform(
+                rule.latency - rule.jitter, rule.latency + rule.jitter
+            )
+        elif rule.distribution == LatencyDistribution.EXPONENTIAL:
+            delay = (
+                rule.latency - rule.jitter + self._random.expovariate(1 / rule.jitter)
+            )
+        else:
+            delay = self._random.gauss(rule.latency, rule.jitter)
+        return max(0.0, delay)
@@ -0,0 +1,470 @@
+"""Reverse proxy sharded between several worker processes.
+
+Each worker process runs a `ReverseProxyBase` server listening on the same port with
+`SO_REUSEPORT`, so the kernel distributes agents' connections between the workers.
+Workers route and forward the API calls and send compact API events to the main
+process over a single queue. There the events are turned back into `APIEvent`
+objects, numbered and added to the `EventMonitor`.
+
+Events from a single worker arrive in the order in which they were sent, and all
+requests made over a single connection are handled by the same worker, so the
+order of events is preserved per connection.
+
+Updates of the routing table and of the traffic shaping rules made in the main
+process are forwarded to the workers, each of which shapes the calls it handles.
+"""
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.context import SpawnProcess
+from multiprocessing.synchronize import Event as ProcessEvent
+import threading
+from typing import AbstractSet, Any, Dict, List, Mapping, Optional, Tuple
+
+from goth.api_monitor.api_events import (
+    APIError,
+    APIEvent,
+    APIRequest,
+    APIResponse,
+    APIShaping,
+)
+from goth.api_monitor.body_store import BodyStore
+from goth.api_monitor.har_recorder import HarRecorder
+from goth.api_monitor.latency import ApiLatencyStats
+from goth.api_monitor.reverse_proxy import ReverseProxyBase
+from goth.api_monitor.router_addon import RoutingTable
+from goth.api_monitor.routes import Operation, STREAMED_OPERATIONS
+from goth.api_monitor.shaping import ShapingRule, TrafficShaper
+from goth.assertions.monitor import EventMonitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKER_START_TIMEOUT = 30.0  # in seconds
+DEFAULT_WORKER_STOP_TIMEOUT = 10.0  # in seconds
+
+# Kinds of messages sent by the workers to the main process
+MSG_READY = "ready"
+MSG_REQUEST = "request"
+MSG_RESPONSE = "response"
+MSG_ERROR = "error"
+MSG_SHAPING = "shaping"
+MSG_ENTRY = "entry"
+
+Message = Tuple[Any, ...]
+"""A message sent by a worker: the worker ID, the message kind and its fields."""
+
+RoutingUpdate = Tuple[str, Optional[str], Optional[dict]]
+"""An update of the routing table sent to workers, see `RoutingListener`."""
+
+ShapingUpdate = Tuple[ShapingRule, ...]
+"""The shaping rules sent to workers after each change, see `ShapingListener`."""
+
+
+class _WorkerProxy(ReverseProxyBase):
+    """Reverse proxy run by a worker process, sending events to the main process.
+
+    Bodies are sent inline, the main process puts them in its `BodyStore`.
+    """
+
+    _queue: "multiprocessing.Queue[Optional[Message]]"
+    _worker_id: int
+
+    def __init__(
+        self,
+        worker_id: int,
+        queue: "multiprocessing.Queue[Optional[Message]]",
+        routing_table: RoutingTable,
+        streamed_operations: AbstractSet[Operation],
+        recording: bool,
+        shaper: Optional[TrafficShaper],
+    ):
+        super().__init__(
+            routing_table,
+            streamed_operations=streamed_operations,
+            recording=recording,
+            shaper=shaper,
+        )
+        self._worker_id = worker_id
+        self._queue = queue
+
+    async def _register_event(self, event: APIEvent) -> None:
+        """Send the fields of an API event to the main process."""
+
+        if isinstance(event, APIRequest):
+            message: Message = (
+                MSG_REQUEST,
+                event.number,
+                event.method,
+                event.path,
+                event.caller,
+                event.callee,
+                event.body,
+                event.timestamp,
+            )
+        elif isinstance(event, APIResponse):
+            message = (
+                MSG_RESPONSE,
+                event.request.number,
+                event.status_code,
+                event.body,
+                event.timestamp,
+                event.timestamp_end,
+                event.streamed,
+            )
+        elif isinstance(event, APIError):
+            message = (MSG_ERROR, event.request.number, event.message, event.timestamp)
+        elif isinstance(event, APIShaping):
+            message = (
+                MSG_SHAPING,
+                event.request.number,
+                event.delay,
+                event.bandwidth,
+                event.failure_status,
+                event.timestamp,
+            )
+        else:
+            raise TypeError(f"Unexpected API event: {event!r}")
+        self._queue.put((self._worker_id, *message))
+
+    def _record_entry(self, entry: Dict[str, Any]) -> None:
+        """Send a HAR entry to the main process."""
+        self._queue.put((self._worker_id, MSG_ENTRY, entry))
+
+
+def _apply_routing_updates(
+    updates: "multiprocessing.Queue[Optional[RoutingUpdate]]",
+    routing_table: RoutingTable,
+) -> None:
+    """Apply routing table updates sent by the main process, in a worker."""
+
+    while True:
+        update = updates.get()
+        if update is None:
+            break
+        ip_address, node_name, ports = update
+        if node_name is None:
+            routing_table.unregister(ip_address)
+        else:
+            routing_table.register(ip_address, node_name, ports)
+
+
+def _apply_shaping_updates(
+    updates: "multiprocessing.Queue[Optional[ShapingUpdate]]",
+    shaper: TrafficShaper,
+) -> None:
+    """Apply shaping rules sent by the main process, in a worker."""
+
+    while True:
+        rules = updates.get()
+        if rules is None:
+            break
+        shaper.replace_rules(rules)
+
+
+def _run_worker(
+    worker_id: int,
+    queue: "multiprocessing.Queue[Optional[Message]]",
+    updates: "multiprocessing.Queue[Optional[RoutingUpdate]]",
+    stop_event: ProcessEvent,
+    node_names: Mapping[str, str],
+    ports: Mapping[str, dict],
+    host: Optional[str],
+    port: int,
+    streamed_operations: AbstractSet[Operation],
+    recording: bool,
+    shaping_updates: "Optional[multiprocessing.Queue[Optional[ShapingUpdate]]]",
+    shaping_rules: ShapingUpdate,
+    shaping_seed: Optional[int],
+) -> None:
+    """Run a worker's proxy until `stop_event` is set. Entry point of workers.
+
+    The worker shapes API calls only if `shaping_updates` is given.
+    """
+
+    routing_table = RoutingTable(node_names, ports)
+    threading.Thread(
+        target=_apply_routing_updates,
+        args=(updates, routing_table),
+        name="RoutingUpdates",
+        daemon=True,
+    ).start()
+
+    shaper = None
+    if shaping_updates is not None:
+        shaper = TrafficShaper(shaping_rules, shaping_seed)
+        threading.Thread(
+            target=_apply_shaping_updates,
+            args=(shaping_updates, shaper),
+            name="ShapingUpdates",
+            daemon=True,
+        ).start()
+
+    async def _serve():
+        proxy = _WorkerProxy(
+            worker_id, queue, routing_table, streamed_operations, recording, shaper
+        )
+        await proxy.start(host, port, reuse_port=True)
+        queue.put((worker_id, MSG_READY))
+        await asyncio.get_running_loop().run_in_executor(None, stop_event.wait)
+        await proxy.stop()
+
+    asyncio.run(_serve())
+
+
+class ShardedProxyServer:
+    """Runs reverse proxies in worker processes and collects their API events."""
+
+    monitor: EventMonitor[APIEvent]
+    """Monitor to which the API events are added."""
+
+    num_workers: int
+
+    _routing_table: RoutingTable
+    _body_store: Optional[BodyStore]
+    _recorder: Optional[HarRecorder]
+    _latency_stats: Optional[ApiLatencyStats]
+    _streamed_operations: AbstractSet[Operation]
+
+    _shaper: Optional[TrafficShaper]
+    """Shaper whose rules are forwarded to the workers.
+
+    With a seed set, each worker uses the seed increased by its ID.
+    """
+
+    _pending_requests: Dict[Tuple[int, int], APIRequest]
+    """Requests waiting for a response or an error, keyed by worker ID and number."""
+
+    _num_requests: int
+    _queue: Optional["multiprocessing.Queue[Optional[Message]]"]
+    _reader_thread: Optional[threading.Thread]
+    _ready: Optional[threading.Semaphore]
+    _stop_event: Optional[ProcessEvent]
+
+    _updates: List["multiprocessing.Queue[Optional[RoutingUpdate]]"]
+    """Queues for sending routing table updates to each of the workers."""
+
+    _shaping_updates: List["multiprocessing.Queue[Optional[ShapingUpdate]]"]
+    """Queues for sending shaping rules to each of the workers."""
+
+    _workers: List[SpawnProcess]
+
+    def __init__(
+        self,
+        monitor: EventMonitor[APIEvent],
+        routing_table: RoutingTable,
+        num_workers: int,
+        body_store: Optional[BodyStore] = None,
+        recorder: Optional[HarRecorder] = None,
+        latency_stats: Optional[ApiLatencyStats] = None,
+        streamed_operations: AbstractSet[Operation] = STREAMED_OPERATIONS,
+        shaper: Optional[TrafficShaper] = None,
+    ):
+        self.monitor = monitor
+        self.num_workers = num_workers
+        self._routing_table = routing_table
+        self._body_store = body_store
+        self._recorder = recorder
+        self._latency_stats = latency_stats
+        self._streamed_operations = streamed_operations
+        self._shaper = shaper
+        self._pending_requests = {}
+        self._num_requests = 0
+        self._queue = None
+        self._reader_thread = None
+        self._ready = None
+        self._stop_event = None
+        self._updates = []
+        self._shaping_updates = []
+        self._workers = []
+
+    async def start(self, host: Optional[str], port: int) -> None:
+        """Start the workers and wait until all of them listen on the given port."""
+
+        # Workers are spawned rather than forked, since the main process
+        # runs other threads (mitmproxy's, the recorder's) and an event loop
+        context = multiprocessing.get_context("spawn")
+        self._queue = context.Queue()
+        self._stop_event = context.Event()
+        self._ready = threading.Semaphore(0)
+        self._reader_thread = threading.Thread(
+            target=self._read_messages, name="ShardedProxyReader", daemon=True
+        )
+        self._reader_thread.start()
+
+        # Updates made after the listener is added and before the snapshot is
+        # taken are applied twice, which is harmless
+        self._updates = [context.Queue() for _ in range(self.num_workers)]
+        self._routing_table.add_listener(self._send_routing_update)
+        node_names = dict(self._routing_table.node_names)
+        ports = dict(self._routing_table.ports)
+
+        # Rules are sent as a whole, so a change made before the snapshot is taken
+        # only makes the workers set the same rules again
+        shaping_rules: Tuple[ShapingRule, ...] = ()
+        if self._shaper:
+            self._shaping_updates = [context.Queue() for _ in range(self.num_workers)]
+            self._shaper.add_listener(self._send_shaping_update)
+            shaping_rules = self._shaper.rules
+
+        for worker_id in range(self.num_workers):
+            process = context.Process(
+                target=_run_worker,
+                args=(
+                    worker_id,
+                    self._queue,
+                    self._updates[worker_id],
+                    self._stop_event,
+                    node_names,
+                    ports,
+                    host,
+                    port,
+                    frozenset(self._streamed_operations),
+                    self._recorder is not None,
+                    self._shaping_updates[worker_id] if self._shaper else None,
+                    shaping_rules,
+                    self._worker_seed(worker_id),
+                ),
+                name=f"ProxyWorker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self._workers.append(process)
+
+        loop = asyncio.get_running_loop()
+        for _ in self._workers:
+            ready = await loop.run_in_executor(
+                None, self._ready.acquire, True, DEFAULT_WORKER_START_TIMEOUT
+            )
+            if not ready:
+                await self.stop()
+                raise RuntimeError("Proxy workers did not start in time")
+        logger.info(
+            "Sharded proxy listening on %s:%d, workers: %d",
+            host or "*",
+            port,
+            self.num_workers,
+        )
+
+    def _worker_seed(self, worker_id: int) -> Optional[int]:
+        if not self._shaper or self._shaper.seed is None:
+            return None
+        return self._shaper.seed + worker_id
+
+    def _send_routing_update(
+        self, ip_address: str, node_name: Optional[str], ports: Optional[dict]
+    ) -> None:
+        for updates in self._updates:
+            updates.put((ip_address, node_name, ports))
+
+    def _send_shaping_update(self, rules: Tuple[ShapingRule, ...]) -> None:
+        for updates in self._shaping_updates:
+            updates.put(rules)
+
+    async def stop(self) -> None:
+        """Stop the workers and wait until all of their events are registered."""
+
+        if self._updates:
+            self._routing_table.remove_listener(self._send_routing_update)
+            for updates in self._updates:
+                updates.put(None)
+            self._updates = []
+
+        if self._shaping_updates:
+            assert self._shaper
+            self._shaper.remove_listener(self._send_shaping_update)
+            for shaping_updates in self._shaping_updates:
+                shaping_updates.put(None)
+            self._shaping_updates = []
+
+        if self._stop_event:
+            self._stop_event.set()
+        await asyncio.get_running_loop().run_in_executor(None, self._join_workers)
+        if self._queue and self._reader_thread:
+            self._queue.put(None)
+            self._reader_thread.join()
+            self._reader_thread = None
+        logger.info("Sharded proxy stopped")
+
+    def _join_workers(self) -> None:
+        for process in self._workers:
+            process.join(DEFAULT_WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Proxy worker did not stop, terminating: %s", process)
+                process.terminate()
+                process.join()
+        self._workers = []
+
+    def _read_messages(self) -> None:
+        """Run by the reader thread, until `None` is received."""
+
+        assert self._queue and self._ready
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self._handle_message(message)
+            except Exception:
+                logger.exception("Cannot handle message from proxy worker")
+
+    def _handle_message(self, message: Message) -> None:
+        worker_id, kind, *fields = message
+
+        if kind == MSG_READY:
+            assert self._ready
+            self._ready.release()
+            return
+
+        if kind == MSG_ENTRY:
+            if self._recorder:
+                self._recorder.record(fields[0])
+            return
+
+        event: APIEvent
+        if kind == MSG_REQUEST:
+            number, method, path, caller, callee, body, timestamp = fields
+            self._num_requests += 1
+            event = APIRequest(
+                self._num_requests,
+                method,
+                path,
+                caller,
+                callee,
+                body,
+                timestamp,
+                self._body_store,
+            )
+            self._pending_requests[(worker_id, number)] = event
+        elif kind == MSG_SHAPING:
+            request = self._pending_requests.get((worker_id, fields[0]))
+            if not request:
+                logger.error("Received shaping for unregistered request: %s", message)
+                return
+            _, delay, bandwidth, failure_status, timestamp = fields
+            event = APIShaping(request, delay, bandwidth, failure_status, timestamp)
+        else:
+            request = self._pending_requests.pop((worker_id, fields[0]), None)
+            if not request:
+                logger.error(
+                    "Received %s for unregistered request: %s", kind, message[:3]
+                )
+                return
+            if kind == MSG_RESPONSE:
+                _, status_code, body, timestamp, timestamp_end, streamed = fields
+                event = APIResponse(
+                    request,
+                    status_code,
+                    body,
+                    timestamp,
+                    timestamp_end,
+                    self._body_store,
+                    streamed,
+                )
+            else:
+                _, error_message, timestamp = fields
+                event = APIError(request, error_message, timestamp)
+
+        logger.debug("%s", event)
+        if self._latency_stats:
+            self._latency_stats.add_event(event)
+        self.monitor.add_event_sync(event)
@@ -11,6 +11,13 @@ from goth.runner.container.compose import (
     YagnaBuildEnvironment,
 )
 from goth.runner.container.payment import PaymentIdPool
+from goth.runner.container.readiness import (
+    DEFAULT_READY_TIMEOUT,
+    HttpGetProbe,
+    LogPatternProbe,
+    ReadinessProbe,
+    TcpConnectProbe,
+)
 from goth.node import node_environment
 from goth.runner.probe import Probe, YagnaContainerConfig
 
@@ -51,6 +58,7 @@ class Configuration:
         use_proxy: bool,
         privileged_mode: bool,
         volumes: Optional[Dict[Path, Path]],
+        json_logs: bool = False,
         **kwargs,
     ) -> None:
         """Add configuration of a new requestor or provider node."""
@@ -70,6 +78,7 @@ class Configuration:
             subnet="goth",
             volumes=volumes,
             payment_id=self._id_pool.get_id(),
+            json_logs=json_logs,
             **kwargs,
         )
 
@@ -168,6 +177,11 @@ class _ConfigurationParser:
         log_patterns = self.get("compose-log-patterns")
         log_patterns.ensure_type(dict)
 
+        probes_config = self.get("compose-readiness-probes")
+        readiness_probes = (
+            probes_config.read_readiness_probes() if probes_config else {}
+        )
+
         build_env_config = self["build-environment"]
         # `build_env_config` may be `None` if no optional build parameters
         # (binary path, commit hash etc.) are specified in the config file
@@ -178,9 +192,39 @@ class _ConfigurationParser:
             build_env = YagnaBuildEnvironment(docker_dir)
 
         return ComposeConfig(
-            build_env, docker_dir / DEFAULT_COMPOSE_FILE, log_patterns.doc
+            build_env,
+            docker_dir / DEFAULT_COMPOSE_FILE,
+            log_patterns.doc,
+            readiness_probes,
         )
 
+    def read_readiness_probes(self) -> Dict[str, ReadinessProbe]:
+        """Read a mapping of service names to readiness probes from this document.
+
+        Each service is checked with either `log-pattern`, `tcp-port` or `http-port`
+        (with optional `http-path`); `host` and `timeout` are optional.
+        """
+        self.ensure_type(dict)
+        probes: Dict[str, ReadinessProbe] = {}
+        for service in self:
+            spec = self[service]
+            spec.ensure_type(dict)
+            timeout = spec.get("timeout", DEFAULT_READY_TIMEOUT)
+            host = spec.get("host")
+            if "log-pattern" in spec:
+                probes[service] = LogPatternProbe(spec["log-pattern"], timeout)
+            elif "tcp-port" in spec:
+                probes[service] = TcpConnectProbe(spec["tcp-port"], host, timeout)
+            elif "http-port" in spec:
+                path = spec.get("http-path", "/")
+                probes[service] = HttpGetProbe(spec["http-port"], path, host, timeout)
+            else:
+                raise ConfigurationParseError(
+                    f"Expected one of 'log-pattern', 'tcp-port' or 'http-port' "
+                    f"at {spec.key}"
+                )
+        return probes
+
     def read_build_env(self, docker_dir: Path) -> YagnaBuildEnvironment:
         """Read a `YagnaBuildEnvironment` instance from this parser's document."""
         self.ensure_type(dict)
@@ -235,20 +279,22 @@ def load_yaml(yaml_path: Union[Path, str]) -> Configuration:
             volumes = mounts.read_volumes_spec() if mounts else {}
 
             privileged_mode = node_type.get("privileged-mode", False)
+            json_logs = node_type.get("json-logs", False)
 
-            node_types[name] = (class_, volumes, privileged_mode)
+            node_types[name] = (class_, volumes, privileged_mode, json_logs)
 
         for node in network["nodes"]:
             name = node["name"]
             type_name = node["type"]
             use_proxy = node.get("use-proxy", False)
-            class_, volumes, privileged_mode = node_types[type_name]
+            class_, volumes, privileged_mode, json_logs = node_types[type_name]
             config.add_node(
                 class_,
                 name,
                 use_proxy=use_proxy,
                 privileged_mode=privileged_mode,
                 volumes=volumes,
+                json_logs=json_logs,
             )
 
     return config
@@ -20,6 +20,8 @@ from typing import (
 
 import docker
 
+from goth.api_monitor.body_store import BodyStore
+from goth.api_monitor.har_recorder import ArchiveFormat, HarRecorder
 from goth.runner.container.compose import (
     ComposeConfig,
     ComposeNetworkManager,
@@ -30,7 +32,7 @@ import goth.runner.container.payment as payment
 from goth.runner.exceptions import TestFailure, TemporalAssertionError
 from goth.runner.log import configure_logging_for_test, LogConfig
 from goth.runner.probe import Probe, create_probe, run_probe
-from goth.runner.proxy import Proxy, run_proxy
+from goth.runner.proxy import Proxy, ProxyEngine, run_proxy
 from goth.runner.step import step  # noqa: F401
 from goth.runner.web_server import WebServer, run_web_server
 
@@ -39,6 +41,8 @@ logger = logging.getLogger(__name__)
 
 ProbeType = TypeVar("ProbeType", bound=Probe)
 
+DEFAULT_MAX_CONCURRENT_PROBE_STARTS = 8
+
 
 class Runner:
     """Manages the nodes and runs the scenario on them."""
@@ -56,7 +60,19 @@ class Runner:
     """Probes used for the test run."""
 
     proxy: Optional[Proxy]
-    """An embedded instance of mitmproxy."""
+    """An embedded proxy server for API calls."""
+
+    proxy_engine: ProxyEngine
+    """Implementation of the proxy server to be used."""
+
+    proxy_workers: Optional[int]
+    """Number of worker processes for the sharded proxy, `None` for one per CPU."""
+
+    api_archive_format: Optional[ArchiveFormat]
+    """Format of the archive with all API calls made in the test, `None` to disable."""
+
+    max_concurrent_probe_starts: int
+    """Maximum number of probes started at the same time."""
 
     _test_failure_callback: Callable[[TestFailure], None]
     """A function to be called when `TestFailure` is caught during a test run."""
@@ -73,6 +89,9 @@ class Runner:
     _exit_stack: AsyncExitStack
     """A stack of `AsyncContextManager` instances to be closed on runner shutdown."""
 
+    _probe_stacks: Dict[Probe, AsyncExitStack]
+    """Exit stacks for removing and stopping each probe."""
+
     _topology: List[YagnaContainerConfig]
     """A list of configuration objects for the containers to be instantiated."""
 
@@ -89,6 +108,10 @@ class Runner:
         cancellation_callback: Optional[Callable[[], None]] = None,
         web_root_path: Optional[Path] = None,
         web_server_port: Optional[int] = None,
+        proxy_engine: ProxyEngine = ProxyEngine.MITMPROXY,
+        proxy_workers: Optional[int] = None,
+        api_archive_format: Optional[ArchiveFormat] = ArchiveFormat.HAR,
+        max_concurrent_probe_starts: int = DEFAULT_MAX_CONCURRENT_PROBE_STARTS,
     ):
         # Set up the logging directory for this runner
         self.test_name = test_name or self._current_pytest_test_name() or ""
@@ -98,7 +121,12 @@ class Runner:
         self.api_assertions_module = api_assertions_module
         self.probes = []
         self.proxy = None
+        self.proxy_engine = proxy_engine
+        self.proxy_workers = proxy_workers
+        self.api_archive_format = api_archive_format
+        self.max_concurrent_probe_starts = max_concurrent_probe_starts
         self._exit_stack = AsyncExitStack()
+        self._probe_stacks = {}
         self._cancellation_callback = cancellation_callback
         self._test_failure_callback = test_failure_callback
         self._compose_manager = ComposeNetworkManager(
@@ -148,13 +176,26 @@ class Runner:
         docker_client = docker.from_env()
 
         for config in self._topology:
-            log_config = config.log_config or LogConfig(config.name)
-            log_config.base_dir = scenario_dir
+            self.probes.append(self._create_probe(docker_client, config, scenario_dir))
 
-            probe = self._exit_stack.enter_context(
-                create_probe(self, docker_client, config, log_config)
-            )
-            self.probes.append(probe)
+    def _create_probe(
+        self,
+        docker_client: docker.DockerClient,
+        config: YagnaContainerConfig,
+        scenario_dir: Path,
+    ) -> Probe:
+        """Create a probe with its own exit stack, closed on runner shutdown."""
+
+        log_config = config.log_config or LogConfig(config.name)
+        log_config.base_dir = scenario_dir
+
+        probe_stack = AsyncExitStack()
+        self._exit_stack.push_async_exit(probe_stack)
+        probe = probe_stack.enter_context(
+            create_probe(self, docker_client, config, log_config)
+        )
+        self._probe_stacks[probe] = probe_stack
+        return probe
 
     def _current_pytest_test_name(self) -> Optional[str]:
         test_name = os.environ.get("PYTEST_CURRENT_TEST")
@@ -167,41 +208,112 @@ class Runner:
         return test_name
 
     async def _start_nodes(self):
-        node_names: Dict[str, str] = {}
-        ports: Dict[str, dict] = {}
-
-        # Start the probes' containers and obtain their IP addresses
-        for probe in self.probes:
-            ip_address = await self._exit_stack.enter_async_context(run_probe(probe))
-            node_names[ip_address] = probe.name
-            container_ports = probe.container.ports
-            ports[ip_address] = container_ports
-            logger.debug(
-                "Probe for %s started on IP: %s with port mapping: %s",
-                probe.name,
-                ip_address,
-                container_ports,
-            )
-
-        node_names[self.host_address] = "Pytest-Requestor-Agent"
-
         # Stopping the proxy triggers evaluation of assertions at "the end of events".
         # Install a callback to to check for assertion failures after the proxy stops.
         self._exit_stack.callback(self.check_assertion_errors)
 
-        # Start the proxy node. The containers should not make API calls
-        # up to this point.
+        # Start the proxy node first, the probes are added to its routing table
+        # as they start. The containers should not make API calls until then.
+        recorder = None
+        if self.api_archive_format:
+            recorder = HarRecorder(
+                self.log_dir / f"api.{self.api_archive_format.value}",
+                self.api_archive_format,
+            )
         self.proxy = Proxy(
-            node_names=node_names,
-            ports=ports,
+            node_names={self.host_address: "Pytest-Requestor-Agent"},
             assertions_module=self.api_assertions_module,
+            engine=self.proxy_engine,
+            body_store=BodyStore(self.log_dir / "proxy-bodies.bin"),
+            recorder=recorder,
+            num_workers=self.proxy_workers,
         )
+        # Write the API latency report once the proxy stops
+        self._exit_stack.callback(self.proxy.latency_stats.write_report, self.log_dir)
         await self._exit_stack.enter_async_context(run_proxy(self.proxy))
 
+        await self._start_probes(self.probes)
+
         # Collect all agent enabled probes and start them in parallel
         awaitables = [probe.start_agents() for probe in self.probes]
         await asyncio.gather(*awaitables)
 
+    async def _start_probes(self, probes: List[Probe]) -> None:
+        """Start probes concurrently, at most `max_concurrent_probe_starts` at a time.
+
+        Waits until all probes are started or have failed. All failures are logged
+        and the first one is raised. Probes are stopped when their exit stacks are
+        closed, regardless of whether they started successfully.
+        """
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_probe_starts)
+
+        async def _start(probe: Probe) -> None:
+            async with semaphore:
+                await self._start_probe(probe)
+
+        results = await asyncio.gather(
+            *(_start(probe) for probe in probes), return_exceptions=True
+        )
+        failures = [
+            (probe, result)
+            for probe, result in zip(probes, results)
+            if isinstance(result, BaseException)
+        ]
+        for probe, error in failures:
+            logger.error("Failed to start probe %s: %r", probe.name, error)
+        if failures:
+            raise failures[0][1]
+
+    async def _start_probe(self, probe: Probe) -> None:
+        """Start the probe's container and register it in the proxy's routing table.
+
+        The probe is stopped and unregistered when its exit stack is closed.
+        """
+
+        assert self.proxy
+        routing_table = self.proxy.routing_table
+        probe_stack = self._probe_stacks[probe]
+
+        # Unregister the node only after the probe stops, so that API calls
+        # made by its agents while stopping are still routed
+        registered_addresses: List[str] = []
+
+        def _unregister():
+            for ip_address in registered_addresses:
+                routing_table.unregister(ip_address)
+
+        probe_stack.callback(_unregister)
+        ip_address = await probe_stack.enter_async_context(run_probe(probe))
+        container_ports = probe.container.ports
+        routing_table.register(ip_address, probe.name, container_ports)
+        registered_addresses.append(ip_address)
+        logger.debug(
+            "Probe for %s started on IP: %s with port mapping: %s",
+            probe.name,
+            ip_address,
+            container_ports,
+        )
+
+    async def add_node(self, config: YagnaContainerConfig) -> Probe:
+        """Create and start a probe for a node joining the running network.
+
+        The node is added to the proxy's routing table and its agents are started.
+        """
+
+        probe = self._create_probe(docker.from_env(), config, self.log_dir)
+        self.probes.append(probe)
+        await self._start_probe(probe)
+        await probe.start_agents()
+        return probe
+
+    async def remove_node(self, probe: Probe) -> None:
+        """Stop and remove the probe of a node leaving the running network."""
+
+        probe_stack = self._probe_stacks.pop(probe)
+        self.probes.remove(probe)
+        await probe_stack.aclose()
+
     @property
     def host_address(self) -> str:
         """Return the host IP address in the docker network used by the containers.
@@ -1,5 +1,6 @@
 """Classes for running commands inside docker containers."""
 
+from goth.runner.cli.async_cli import AsyncYagnaDockerCli
 from goth.runner.cli.base import DockerJSONCommandRunner
 from goth.runner.cli.yagna_app_key_cmd import YagnaAppKeyMixin
 from goth.runner.cli.yagna_id_cmd import YagnaIdMixin
@@ -22,5 +23,9 @@ class Cli:
     yagna: YagnaDockerCli
     """A command-line interface for the `yagna` command."""
 
+    yagna_async: AsyncYagnaDockerCli
+    """The same interface as `yagna`, with commands run as coroutines."""
+
     def __init__(self, container: DockerContainer):
         self.yagna = YagnaDockerCli(container)
+        self.yagna_async = AsyncYagnaDockerCli(self.yagna)
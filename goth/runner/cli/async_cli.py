@@ -0,0 +1,156 @@
+"""Running `yagna` commands in a thread pool, without blocking the event loop."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from typing import (
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    TYPE_CHECKING,
+)
+
+from goth.runner.cli.yagna_app_key_cmd import AppKeyInfo
+from goth.runner.cli.yagna_id_cmd import Identity
+from goth.runner.cli.yagna_payment_cmd import (
+    DEFAULT_PAYMENT_DRIVER,
+    Driver,
+    PaymentStatus,
+)
+from goth.runner.container.payment import PaymentDriver
+
+if TYPE_CHECKING:
+    from goth.runner.cli import YagnaDockerCli
+
+DEFAULT_MAX_CLI_THREADS = 16
+
+T = TypeVar("T")
+
+_default_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_default_executor() -> ThreadPoolExecutor:
+    """Return the executor shared by all `AsyncYagnaDockerCli` instances."""
+
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ThreadPoolExecutor(
+            max_workers=DEFAULT_MAX_CLI_THREADS, thread_name_prefix="yagna-cli"
+        )
+    return _default_executor
+
+
+class AsyncYagnaDockerCli:
+    """Exposes the commands of a `YagnaDockerCli` as coroutines.
+
+    Each command runs `docker exec` in a thread pool, so that the event loop, and
+    with it the monitors and the proxy, keeps running while the command executes.
+    Commands called concurrently, e.g. for different probes, run in parallel.
+    """
+
+    cli: "YagnaDockerCli"
+    """The synchronous CLI used to run the commands."""
+
+    _executor: ThreadPoolExecutor
+
+    def __init__(
+        self, cli: "YagnaDockerCli", executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.cli = cli
+        self._executor = executor or _get_default_executor()
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_command(self, *cmd_args: str) -> Tuple[str, str]:
+        """Run the command with `cmd_args`, see `DockerCommandRunner.run_command`."""
+        return await self._run(self.cli.run_command, *cmd_args)
+
+    async def run_json_command(self, result_type: Type[T], *cmd_args: str) -> T:
+        """Run the command with `--json` flag and return the parsed output."""
+        return await self._run(self.cli.run_json_command, result_type, *cmd_args)
+
+    async def app_key_create(
+        self, name: str, role: str = "", alias_or_addr: str = "", data_dir: str = ""
+    ) -> str:
+        """Run `<cmd> app-key create <name>` and return the application key."""
+        return await self._run(
+            self.cli.app_key_create, name, role, alias_or_addr, data_dir
+        )
+
+    async def app_key_drop(
+        self, name: str, address: str = "", data_dir: str = ""
+    ) -> str:
+        """Run `<cmd> app-key drop <name>` and return the command's output."""
+        return await self._run(self.cli.app_key_drop, name, address, data_dir)
+
+    async def app_key_list(
+        self, address: str = "", data_dir: str = ""
+    ) -> Sequence[AppKeyInfo]:
+        """Run `<cmd> app-key list` and return the list of `AppKeyInfo`s."""
+        return await self._run(self.cli.app_key_list, address, data_dir)
+
+    async def id_create(
+        self, data_dir: str = "", alias: str = "", key_file: str = ""
+    ) -> Identity:
+        """Run `<cmd> id create` and return the created identity."""
+        return await self._run(self.cli.id_create, data_dir, alias, key_file)
+
+    async def id_show(
+        self, data_dir: str = "", alias_or_addr: str = ""
+    ) -> Optional[Identity]:
+        """Run `<cmd> id show` and return the identity, if any."""
+        return await self._run(self.cli.id_show, data_dir, alias_or_addr)
+
+    async def id_list(self, data_dir: str = "") -> Sequence[Identity]:
+        """Run `<cmd> id list` and return the identities."""
+        return await self._run(self.cli.id_list, data_dir)
+
+    async def id_update(
+        self, alias_or_addr: str, data_dir: str = "", set_default: bool = False
+    ) -> Identity:
+        """Run `<cmd> id update` and return the updated identity."""
+        return await self._run(self.cli.id_update, alias_or_addr, data_dir, set_default)
+
+    async def payment_fund(
+        self, payment_driver: PaymentDriver = DEFAULT_PAYMENT_DRIVER
+    ) -> None:
+        """Run `<cmd> payment fund`."""
+        await self._run(self.cli.payment_fund, payment_driver)
+
+    async def payment_init(
+        self,
+        sender_mode: bool = False,
+        receiver_mode: bool = False,
+        data_dir: str = "",
+        payment_driver: PaymentDriver = DEFAULT_PAYMENT_DRIVER,
+        address: Optional[str] = None,
+        network: Optional[str] = None,
+    ) -> None:
+        """Run `<cmd> payment init`."""
+        await self._run(
+            self.cli.payment_init,
+            sender_mode,
+            receiver_mode,
+            data_dir,
+            payment_driver,
+            address,
+            network,
+        )
+
+    async def payment_status(
+        self, data_dir: str = "", driver: PaymentDriver = DEFAULT_PAYMENT_DRIVER
+    ) -> PaymentStatus:
+        """Run `<cmd> payment status` and return the parsed `PaymentStatus`."""
+        return await self._run(self.cli.payment_status, data_dir, driver)
+
+    async def payment_drivers(self) -> Dict[str, Driver]:
+        """Run `<cmd> payment drivers` and return the drivers by name."""
+        return await self._run(self.cli.payment_drivers)
@@ -11,7 +11,7 @@ from docker.models.containers import Container
 from transitions import Machine
 
 from goth.runner.log import LogConfig
-from goth.runner.log_monitor import LogEventMonitor
+from goth.runner.log_monitor import LogEventMonitor, LogIngestionPolicy
 
 
 @dataclass
@@ -34,6 +34,20 @@ class DockerContainerConfig:
     privileged_mode: bool = False
     """If set, docker container will be run in privileged mode."""
 
+    log_ingestion_policy: Optional[LogIngestionPolicy] = None
+    """Optional policy deciding which log records are registered as events.
+
+    Applies to the logs of the container and of the agents running in it.
+    """
+
+    json_logs: bool = False
+    """If set, log lines holding JSON objects are parsed as structured records.
+
+    Applies to the logs of the container and of the agents running in it.
+    Goth doesn't configure the binaries to log in JSON format, this should be
+    set for nodes running builds which do so.
+    """
+
 
 class State(Enum):
     """Represents states that a Docker container may be in."""
@@ -65,6 +79,12 @@ class DockerContainer:
     image: str
     """Name of the image to be used for creating this container."""
 
+    log_ingestion_policy: Optional[LogIngestionPolicy]
+    """Policy deciding which log records are registered by this container's monitors."""
+
+    json_logs: bool
+    """Set iff this container's monitors parse JSON log lines as structured records."""
+
     logs: Optional[LogEventMonitor]
     """Log buffer for the logs from this container's `entrypoint`."""
 
@@ -117,6 +137,8 @@ class DockerContainer:
         name: str,
         log_config: Optional[LogConfig] = None,
         network: str = DEFAULT_NETWORK,
+        log_ingestion_policy: Optional[LogIngestionPolicy] = None,
+        json_logs: bool = False,
         **kwargs,
     ):
         self._client = client
@@ -126,9 +148,16 @@ class DockerContainer:
         self.name = name
         self.network = network
         self.log_config = log_config
+        self.log_ingestion_policy = log_ingestion_policy
+        self.json_logs = json_logs
         self.logs = None
         if self.log_config:
-            self.logs = LogEventMonitor(self.name, self.log_config)
+            self.logs = LogEventMonitor(
+                self.name,
+                self.log_config,
+                ingestion_policy=log_ingestion_policy,
+                json_records=json_logs,
+            )
 
         self._container = self._client.containers.create(
             self.image,
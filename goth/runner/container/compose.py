@@ -1,10 +1,12 @@
 """Module responsible for parsing the docker-compose.yml used in the tests."""
+import asyncio
 import contextlib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 import os
 from pathlib import Path
+import time
 from typing import ClassVar, Dict, Optional
 
 from docker import DockerClient
@@ -16,8 +18,13 @@ from goth.runner.container.build import (
     build_yagna_image,
     YagnaBuildEnvironment,
 )
+from goth.runner.container.readiness import (
+    ComposeService,
+    LogPatternProbe,
+    ReadinessProbe,
+)
 from goth.runner.container.utils import get_container_address
-from goth.runner.exceptions import ContainerNotFoundError
+from goth.runner.exceptions import ContainerNotFoundError, TimeoutError
 from goth.runner.log import LogConfig
 from goth.runner.log_monitor import LogEventMonitor
 from goth.runner.process import run_command
@@ -46,6 +53,22 @@ class ComposeConfig:
     the manager will wait for a log line to match the regex pattern (value).
     """
 
+    readiness_probes: Dict[str, ReadinessProbe] = field(default_factory=dict)
+    """Mapping between service names and probes used for their ready checks.
+
+    Entries in this dict take precedence over the entries in `log_patterns`.
+    """
+
+    @property
+    def ready_checks(self) -> Dict[str, ReadinessProbe]:
+        """Return readiness probes for all services that need to be checked."""
+        checks: Dict[str, ReadinessProbe] = {
+            name: LogPatternProbe(pattern, CONTAINER_READY_TIMEOUT)
+            for name, pattern in self.log_patterns.items()
+        }
+        checks.update(self.readiness_probes)
+        return checks
+
 
 class ComposeNetworkManager:
     """Class which manages a docker-compose network.
@@ -68,6 +91,9 @@ class ComposeNetworkManager:
     _log_monitors: Dict[str, LogEventMonitor]
     """Log monitors for containers running as part of docker-compose."""
 
+    _services: Dict[str, ComposeService]
+    """Services running as part of docker-compose, keyed by service name."""
+
     _network_gateway_address: str
     """IP address of the gateway for the docker network."""
 
@@ -81,6 +107,7 @@ class ComposeNetworkManager:
         self._docker_client = docker_client
         self._log_monitors = {}
         self._network_gateway_address = ""
+        self._services = {}
 
     async def start_network(self, log_dir: Path, force_build: bool = False) -> None:
         """Start the compose network based on this manager's compose file.
@@ -109,19 +136,58 @@ class ComposeNetworkManager:
         self._log_running_containers()
 
     async def _wait_for_containers(self) -> None:
-        logger.info("Waiting for compose containers to be ready")
-        for name, pattern in self.config.log_patterns.items():
-            monitor = self._log_monitors.get(name)
-            if not monitor:
+        """Run ready checks for all services concurrently, each with its own timeout.
+
+        Raises `TimeoutError` listing the services which did not become ready.
+        """
+        checks = self.config.ready_checks
+        logger.info(
+            "Waiting for compose containers to be ready. services=%s",
+            ", ".join(checks),
+        )
+        pending = set(checks)
+        start_time = time.monotonic()
+
+        async def _wait_for_service(name: str, probe: ReadinessProbe) -> None:
+            service = self._services.get(name)
+            if not service:
                 raise RuntimeError(f"No log monitor found for container: {name}")
 
-            logger.debug(
-                "Waiting for container to be ready. name=%s, log_pattern=%s",
+            logger.debug("Waiting for container to be ready. name=%s, %s", name, probe)
+            await asyncio.wait_for(probe.wait_until_ready(service), probe.timeout)
+            pending.discard(name)
+            logger.info(
+                "Compose service ready: %s (%.1f s), %d/%d ready%s",
                 name,
-                pattern,
+                time.monotonic() - start_time,
+                len(checks) - len(pending),
+                len(checks),
+                f", waiting for: {', '.join(sorted(pending))}" if pending else "",
             )
-            await monitor.wait_for_entry(pattern, timeout=CONTAINER_READY_TIMEOUT)
-        logger.info("Compose network ready")
+
+        results = await asyncio.gather(
+            *(_wait_for_service(name, probe) for name, probe in checks.items()),
+            return_exceptions=True,
+        )
+        failures = {
+            name: result
+            for name, result in zip(checks, results)
+            if isinstance(result, BaseException)
+        }
+        for name, error in failures.items():
+            logger.error("Compose service not ready. name=%s, error=%r", name, error)
+
+        timed_out = [
+            name
+            for name, error in failures.items()
+            if isinstance(error, asyncio.TimeoutError)
+        ]
+        for name, error in failures.items():
+            if name not in timed_out:
+                raise error
+        if timed_out:
+            raise TimeoutError(f"Compose services not ready: {', '.join(timed_out)}")
+        logger.info("Compose network ready in %.1f s", time.monotonic() - start_time)
 
     async def stop_network(self):
         """Stop the running compose network, removing its containers."""
@@ -172,17 +238,17 @@ class ComposeNetworkManager:
             )
 
     def _start_log_monitors(self, log_dir: Path) -> None:
+        # A single call to list all containers, matched to services by name below
+        containers = self._docker_client.containers.list()
+
         for service_name in self._get_compose_services():
             log_config = LogConfig(service_name)
             log_config.base_dir = log_dir
             monitor = LogEventMonitor(service_name, log_config)
 
-            containers = self._docker_client.containers.list(
-                filters={"name": service_name}
-            )
-            if not containers:
+            container = next((c for c in containers if service_name in c.name), None)
+            if not container:
                 raise ContainerNotFoundError(service_name)
-            container = containers[0]
 
             monitor.start(
                 container.logs(
@@ -190,6 +256,9 @@ class ComposeNetworkManager:
                 )
             )
             self._log_monitors[service_name] = monitor
+            self._services[service_name] = ComposeService(
+                service_name, container, monitor
+            )
 
 
 @contextlib.asynccontextmanager
@@ -0,0 +1,197 @@
+"""Readiness probes used to check if docker-compose services and nodes are ready."""
+
+import abc
+import asyncio
+from dataclasses import dataclass
+import logging
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+import aiohttp
+from docker.models.containers import Container
+
+from goth.runner.container import DockerContainer
+from goth.runner.log_monitor import LogEventMonitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READY_TIMEOUT = 60  # in seconds
+DEFAULT_RETRY_INTERVAL = 0.5  # in seconds
+DEFAULT_MIN_BACKOFF = 0.1  # in seconds
+DEFAULT_MAX_BACKOFF = 2.0  # in seconds
+
+T = TypeVar("T")
+
+
+async def retry_with_backoff(
+    check: Callable[[], Awaitable[T]],
+    description: str,
+    errors: Tuple[Type[Exception], ...] = (Exception,),
+    min_delay: float = DEFAULT_MIN_BACKOFF,
+    max_delay: float = DEFAULT_MAX_BACKOFF,
+) -> T:
+    """Call `check` until it doesn't raise any of `errors`, return its result.
+
+    The delay between attempts doubles from `min_delay` up to `max_delay`.
+    Timeouts are handled by the caller, so this function may retry indefinitely.
+    """
+
+    delay = min_delay
+    while True:
+        try:
+            return await check()
+        except errors as e:
+            logger.debug(
+                "Not ready: %s, retrying in %.1f s. error=%r", description, delay, e
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+@dataclass
+class ComposeService:
+    """A running docker-compose service, as seen by readiness probes."""
+
+    name: str
+    """Name of the service, as defined in docker-compose.yml."""
+
+    container: Container
+    """Container running the service."""
+
+    monitor: LogEventMonitor
+    """Monitor for the logs of the service's container."""
+
+    @property
+    def address(self) -> str:
+        """IP address of the service's container in the default docker network."""
+        networks = self.container.attrs["NetworkSettings"]["Networks"]
+        return networks[DockerContainer.DEFAULT_NETWORK]["IPAddress"]
+
+
+class ReadinessProbe(abc.ABC):
+    """Base class for checks performed to find out if a compose service is ready."""
+
+    timeout: float
+    """Time after which the service is considered not ready, in seconds."""
+
+    def __init__(self, timeout: float = DEFAULT_READY_TIMEOUT):
+        self.timeout = timeout
+
+    @abc.abstractmethod
+    async def wait_until_ready(self, service: ComposeService) -> None:
+        """Return once `service` is ready.
+
+        Timeouts are handled by the caller, so this method may wait indefinitely.
+        """
+
+
+class LogPatternProbe(ReadinessProbe):
+    """Waits for a line matching a regex pattern in the service's logs."""
+
+    pattern: str
+
+    def __init__(self, pattern: str, timeout: float = DEFAULT_READY_TIMEOUT):
+        super().__init__(timeout)
+        self.pattern = pattern
+
+    async def wait_until_ready(self, service: ComposeService) -> None:
+        """Wait until a line matching `self.pattern` appears in the logs."""
+        await service.monitor.wait_for_entry(self.pattern)
+
+    def __str__(self) -> str:
+        return f"log_pattern={self.pattern}"
+
+
+class TcpConnectProbe(ReadinessProbe):
+    """Attempts to open a TCP connection to the service until it succeeds.
+
+    If `host` is not set, the container's address in the docker network is used,
+    which is only reachable from the host machine on Linux.
+    """
+
+    host: Optional[str]
+    port: int
+    retry_interval: float
+
+    def __init__(
+        self,
+        port: int,
+        host: Optional[str] = None,
+        timeout: float = DEFAULT_READY_TIMEOUT,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+    ):
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+        self.retry_interval = retry_interval
+
+    async def wait_until_ready(self, service: ComposeService) -> None:
+        """Retry connecting to the service's port until a connection is made."""
+        host = self.host or service.address
+        while True:
+            try:
+                _reader, writer = await asyncio.open_connection(host, self.port)
+                writer.close()
+                return
+            except OSError as e:
+                logger.debug(
+                    "Cannot connect to %s. host=%s, port=%d, error=%r",
+                    service.name,
+                    host,
+                    self.port,
+                    e,
+                )
+            await asyncio.sleep(self.retry_interval)
+
+    def __str__(self) -> str:
+        return f"tcp_connect={self.host or '<container>'}:{self.port}"
+
+
+class HttpGetProbe(ReadinessProbe):
+    """Sends HTTP GET requests to the service until it responds with a non-5xx code.
+
+    If `host` is not set, the container's address in the docker network is used,
+    which is only reachable from the host machine on Linux.
+    """
+
+    host: Optional[str]
+    path: str
+    port: int
+    retry_interval: float
+
+    def __init__(
+        self,
+        port: int,
+        path: str = "/",
+        host: Optional[str] = None,
+        timeout: float = DEFAULT_READY_TIMEOUT,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+    ):
+        super().__init__(timeout)
+        self.host = host
+        self.path = path
+        self.port = port
+        self.retry_interval = retry_interval
+
+    async def wait_until_ready(self, service: ComposeService) -> None:
+        """Retry sending a GET request until the service responds."""
+        url = f"http://{self.host or service.address}:{self.port}{self.path}"
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.get(url) as response:
+                        if response.status < 500:
+                            return
+                        logger.debug(
+                            "Service %s not ready. url=%s, status=%d",
+                            service.name,
+                            url,
+                            response.status,
+                        )
+                except aiohttp.ClientError as e:
+                    logger.debug(
+                        "Service %s not ready. url=%s, error=%r", service.name, url, e
+                    )
+                await asyncio.sleep(self.retry_interval)
+
+    def __str__(self) -> str:
+        return f"http_get={self.host or '<container>'}:{self.port}{self.path}"
@@ -13,6 +13,7 @@ from goth.runner.container import DockerContainer, DockerContainerConfig
 import goth.runner.container.payment as payment
 import goth.runner.container.utils as utils
 from goth.runner.log import LogConfig
+from goth.runner.log_monitor import LogIngestionPolicy
 
 if TYPE_CHECKING:
     from goth.runner.probe import Probe  # noqa: F401
@@ -47,9 +48,18 @@ class YagnaContainerConfig(DockerContainerConfig):
         environment: Optional[Dict[str, str]] = None,
         privileged_mode: bool = False,
         payment_id: Optional[payment.PaymentId] = None,
+        log_ingestion_policy: Optional[LogIngestionPolicy] = None,
+        json_logs: bool = False,
         **probe_properties,
     ):
-        super().__init__(name, volumes or {}, log_config, privileged_mode)
+        super().__init__(
+            name,
+            volumes or {},
+            log_config,
+            privileged_mode,
+            log_ingestion_policy,
+            json_logs,
+        )
         self.probe_type = probe_type
         self.probe_properties = probe_properties or {}
         self.environment = environment or {}
@@ -92,6 +102,8 @@ class YagnaContainer(DockerContainer):
             ports=self.ports,
             volumes=self._prepare_volumes(config),
             privileged=config.privileged_mode,
+            log_ingestion_policy=config.log_ingestion_policy,
+            json_logs=config.json_logs,
             **kwargs,
         )
 
@@ -1,12 +1,15 @@
 """Classes and utilities to use a Monitor for log events."""
 
 import asyncio
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from enum import Enum
+import json
 import logging
 import re
+import threading
 import time
-from typing import Iterator, Optional, Sequence
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
 
 from func_timeout.StoppableThread import StoppableThread
 
@@ -16,6 +19,8 @@ from goth.runner.log import LogConfig
 
 logger = logging.getLogger(__name__)
 
+RECORD_FLUSH_INTERVAL = 0.1  # in seconds
+
 
 class LogLevel(Enum):
     """Enum representing the rust log levels."""
@@ -26,6 +31,14 @@ class LogLevel(Enum):
     DEBUG = 4
     TRACE = 5
 
+    @staticmethod
+    def parse(name: Any) -> Optional["LogLevel"]:
+        """Return the level named `name` (case-insensitive), or `None` if unknown."""
+        name = str(name).upper()
+        if name == "WARNING":
+            return LogLevel.WARN
+        return LogLevel.__members__.get(name)
+
 
 # Pattern to match log lines from the `yagna` binary
 pattern = re.compile(
@@ -33,6 +46,108 @@ pattern = re.compile(
 )
 
 
+@dataclass
+class LogIngestionPolicy:
+    """Policy deciding which log records are registered by a `LogEventMonitor`.
+
+    Records which are not registered as events are still written to the log file.
+    Lines which do not match the yagna log line `pattern` are always registered.
+    """
+
+    min_level: LogLevel = LogLevel.TRACE
+    """The least severe level of records to be registered."""
+
+    module_levels: Dict[str, LogLevel] = field(default_factory=dict)
+    """Overrides of `min_level` for modules with names starting with the given prefix.
+
+    If more than one prefix matches a module name, the longest one is used,
+    e.g. `{"ya_market": LogLevel.DEBUG, "ya_market::matcher": LogLevel.INFO}`.
+    """
+
+    sample_rate: float = 1.0
+    """Fraction of records below `sample_below` level to be registered.
+
+    Records are sampled evenly, e.g. for `0.25` every fourth record is registered.
+    """
+
+    sample_below: LogLevel = LogLevel.INFO
+    """Records at this level or more severe are never sampled out."""
+
+    _module_cache: Dict[str, LogLevel] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def level_for(self, module: str) -> LogLevel:
+        """Return the least severe level of records registered for `module`."""
+
+        level = self._module_cache.get(module)
+        if level is None:
+            prefixes = [p for p in self.module_levels if module.startswith(p)]
+            if prefixes:
+                level = self.module_levels[max(prefixes, key=len)]
+            else:
+                level = self.min_level
+            self._module_cache[module] = level
+        return level
+
+    def is_sampled(self, level: LogLevel) -> bool:
+        """Return `True` iff records at `level` are subject to sampling."""
+        return self.sample_rate < 1.0 and level.value > self.sample_below.value
+
+
+# Keys of JSON log records holding the message, level, module and timestamp.
+# Both `tracing-subscriber` and `env_logger`-style JSON records are supported.
+JSON_MESSAGE_KEYS = ("message", "msg")
+JSON_LEVEL_KEYS = ("level",)
+JSON_MODULE_KEYS = ("target", "module_path", "module")
+JSON_TIMESTAMP_KEYS = ("timestamp", "ts", "time")
+
+
+def parse_json_record(line: str) -> Optional[Dict[str, Any]]:
+    """Parse `line` as a JSON log record; return `None` if it's not a JSON object."""
+
+    if not line.startswith("{"):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _pop_first(record: Dict[str, Any], keys: Tuple[str, ...]) -> Any:
+    """Remove the first of `keys` present in `record` and return its value."""
+
+    for key in keys:
+        if key in record:
+            return record.pop(key)
+    return None
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """Parse a timestamp from a JSON log record as seconds since the epoch."""
+
+    if isinstance(value, (int, float)):
+        # Values in milliseconds, as used by some loggers
+        return value / 1000 if value > 1e11 else float(value)
+    if not isinstance(value, str):
+        return None
+    try:
+        text = value.replace("Z", "+00:00")
+        # `fromisoformat` in Python 3.8 requires exactly six fractional digits
+        head, dot, tail = text.partition(".")
+        if dot:
+            digits = len(tail) - len(tail.lstrip("0123456789"))
+            tail = tail[:digits][:6].ljust(6, "0") + tail[digits:]
+            text = f"{head}.{tail}"
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
 class LogEvent:
     """An event representing a log line, used for asserting messages."""
 
@@ -41,6 +156,7 @@ class LogEvent:
         self._level = None
         self._module = None
         self._message = log_message
+        self._fields = {}
         match = pattern.match(log_message)
         if match:
             result = match.groupdict()
@@ -59,6 +175,39 @@ class LogEvent:
         if not self._timestamp:
             self._timestamp = time.time()
 
+    @classmethod
+    def from_json(cls, line: str, record: Dict[str, Any]) -> "LogEvent":
+        """Create an event from `line` containing a JSON log `record`.
+
+        `record` should be the result of `parse_json_record(line)`, it may be
+        modified by this method.
+        """
+
+        event = cls.__new__(cls)
+        # `tracing-subscriber` puts the message and custom fields in a nested object
+        nested = record.pop("fields", None)
+        if isinstance(nested, dict):
+            record.update(nested)
+        message = _pop_first(record, JSON_MESSAGE_KEYS)
+        level = _pop_first(record, JSON_LEVEL_KEYS)
+        module = _pop_first(record, JSON_MODULE_KEYS)
+        timestamp = _parse_timestamp(_pop_first(record, JSON_TIMESTAMP_KEYS))
+
+        event._message = str(message) if message is not None else line
+        event._level = LogLevel.parse(level) if level is not None else None
+        event._module = str(module) if module is not None else None
+        event._timestamp = timestamp or time.time()
+        event._fields = record
+        return event
+
+    @property
+    def fields(self) -> Dict[str, Any]:
+        """Key-value fields of a structured (JSON) log record.
+
+        Will be empty for plain text log lines.
+        """
+        return self._fields
+
     @property
     def timestamp(self) -> float:
         """Time of the log message.
@@ -71,7 +220,7 @@ class LogEvent:
     def level(self) -> Optional[LogLevel]:
         """Level reported on the log message.
 
-        Will be empty for multi line logs.
+        Will be empty for lines that do not match the yagna log line pattern.
         """
         return self._level
 
@@ -79,15 +228,23 @@ class LogEvent:
     def module(self) -> Optional[str]:
         """Source module of this log message.
 
-        Will be empty for multi line logs.
+        Will be empty for lines that do not match the yagna log line pattern.
         """
         return self._module
 
     @property
     def message(self) -> str:
-        """Text of the log message."""
+        """Text of the log message.
+
+        For multi-line records this includes the continuation lines,
+        separated by the new line character.
+        """
         return self._message
 
+    def append_line(self, line: str) -> None:
+        """Append a continuation line (e.g. a backtrace frame) to this record."""
+        self._message = f"{self._message}\n{line}"
+
     def __repr__(self):
         return (
             f"<LogEvent time={self.timestamp:0.0f}, level={self.level},"
@@ -118,6 +275,9 @@ def _create_file_logger(config: LogConfig) -> logging.Logger:
 class PatternMatchingEventMonitor(EventMonitor[E]):
     """An `EventMonitor` that can wait for events that match regex patterns."""
 
+    pattern_flags: int = 0
+    """Flags used when compiling patterns passed to `wait_for_pattern()`."""
+
     def event_str(self, event: E) -> str:
         """Return the string associated with `event` on which to perform matching."""
         return str(event)
@@ -132,7 +292,7 @@ class PatternMatchingEventMonitor(EventMonitor[E]):
         being true iff `event_str(e)` matches `pattern`, for any event `e`.
         """
 
-        regex = re.compile(pattern)
+        regex = re.compile(pattern, self.pattern_flags)
         event = await self.wait_for_event(
             lambda e: regex.match(self.event_str(e)) is not None, timeout
         )
@@ -146,13 +306,64 @@ class LogEventMonitor(PatternMatchingEventMonitor[LogEvent]):
     Consecutive values are interpreted as lines by splitting them on the new line
     character.
     Internally it uses a thread to read the stream and add lines to the buffer.
+
+    Lines matching the yagna log line `pattern` start new records, lines which
+    do not match it (e.g. frames of a Rust backtrace) are appended to the preceding
+    record. A record is registered as an event once the next record starts or after
+    no lines arrive for `flush_interval` seconds. Setting `flush_interval` to `None`
+    disables record assembly, in which case each line becomes a separate event.
+
+    If `json_records` is set, lines holding JSON objects are parsed as structured
+    records, see `LogEvent.from_json()`. It should only be set for logs emitted
+    in JSON format, otherwise a JSON payload logged on a line of its own would
+    split a multi-line record.
+
+    An optional `ingestion_policy` may be used to register only some of the records,
+    e.g. to skip DEBUG and TRACE records. All lines are written to the log file
+    regardless of the policy.
     """
 
+    pattern_flags = re.MULTILINE
+
     _buffer_task: Optional[StoppableThread]
     _file_logger: logging.Logger
     _in_stream: Iterator[bytes]
 
-    def __init__(self, name: str, log_config: Optional[LogConfig] = None):
+    _flush_interval: Optional[float]
+    """Idle time after which a pending record is registered, in seconds."""
+
+    _flush_scheduled: bool
+    """Set iff there is a pending call to `_flush_idle_record()`."""
+
+    _ingestion_policy: Optional[LogIngestionPolicy]
+    """Policy deciding which records are registered as events."""
+
+    _json_records: bool
+    """Set iff lines holding JSON objects are parsed as structured records."""
+
+    _last_line_time: float
+    """Monotonic time at which the last line was added to the pending record."""
+
+    _pending_record: Optional[LogEvent]
+    """A record which may still get continuation lines appended to it."""
+
+    _record_lock: threading.Lock
+    """Lock guarding the pending record and the related attributes."""
+
+    _sampled_records: int
+    """Number of records subject to sampling seen so far."""
+
+    _skip_record: bool
+    """Set iff the current record is not registered due to the ingestion policy."""
+
+    def __init__(
+        self,
+        name: str,
+        log_config: Optional[LogConfig] = None,
+        flush_interval: Optional[float] = RECORD_FLUSH_INTERVAL,
+        ingestion_policy: Optional[LogIngestionPolicy] = None,
+        json_records: bool = False,
+    ):
         super().__init__(name)
         if log_config:
             self._file_logger = _create_file_logger(log_config)
@@ -160,6 +371,15 @@ class LogEventMonitor(PatternMatchingEventMonitor[LogEvent]):
             self._file_logger = logging.getLogger(name)
         self._buffer_task = None
         self._loop = asyncio.get_event_loop()
+        self._flush_interval = flush_interval
+        self._flush_scheduled = False
+        self._ingestion_policy = ingestion_policy
+        self._json_records = json_records
+        self._last_line_time = 0.0
+        self._pending_record = None
+        self._record_lock = threading.Lock()
+        self._sampled_records = 0
+        self._skip_record = False
 
     def event_str(self, event: LogEvent) -> str:
         """Return the string associated with `event` on which to perform matching."""
@@ -180,12 +400,18 @@ class LogEventMonitor(PatternMatchingEventMonitor[LogEvent]):
         """Stop the monitor."""
         if self._buffer_task:
             self._buffer_task.stop(StopThreadException)
+        self._flush_record()
+        # Let the scheduled `add_event_sync()` calls register their events
+        # before the end of events is signalled
+        await asyncio.sleep(0)
         await super().stop()
 
     def update_stream(self, in_stream: Iterator[bytes]):
         """Update the stream when restarting a container."""
         if self._buffer_task:
             self._buffer_task.stop(StopThreadException)
+        self._flush_record()
+        self._skip_record = False
         self._in_stream = in_stream
         self._buffer_task = StoppableThread(target=self._buffer_input, daemon=True)
         self._buffer_task.start()
@@ -196,13 +422,108 @@ class LogEventMonitor(PatternMatchingEventMonitor[LogEvent]):
                 chunk = chunk.decode()
                 for line in chunk.splitlines():
                     self._file_logger.info(line)
-
-                    event = LogEvent(line)
-                    self.add_event_sync(event)
+                    self._add_line(line)
 
         except StopThreadException:
             return
 
+    def _add_line(self, line: str) -> None:
+        """Start a new record with `line` or append `line` to the pending record."""
+
+        event: Optional[LogEvent] = None
+        record = parse_json_record(line) if self._json_records else None
+        if record is not None:
+            event = LogEvent.from_json(line, record)
+            starts_record = True
+            self._skip_record = not self._should_register(event.level, event.module)
+        else:
+            match = pattern.match(line)
+            starts_record = match is not None
+            if match:
+                self._skip_record = not self._should_register(
+                    LogLevel.parse(match.group("level")),
+                    match.group("module").strip(),
+                )
+
+        if not starts_record and self._skip_record:
+            # A continuation line of a record that is not registered
+            return
+
+        if self._flush_interval is None:
+            if not self._skip_record:
+                self.add_event_sync(event or LogEvent(line))
+            return
+
+        with self._record_lock:
+            if not starts_record and self._pending_record:
+                self._pending_record.append_line(line)
+            else:
+                if self._pending_record:
+                    self.add_event_sync(self._pending_record)
+                    self._pending_record = None
+                if self._skip_record:
+                    return
+                event = event or LogEvent(line)
+                if not starts_record:
+                    # Lines outside of any record (e.g. from non-yagna containers)
+                    # are registered right away
+                    self.add_event_sync(event)
+                    return
+                self._pending_record = event
+
+            self._last_line_time = time.monotonic()
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                self._event_loop.call_soon_threadsafe(self._flush_idle_record)
+
+    def _should_register(
+        self, level: Optional[LogLevel], module: Optional[str]
+    ) -> bool:
+        """Check if the ingestion policy allows a record with `level` and `module`."""
+
+        policy = self._ingestion_policy
+        if not policy or level is None:
+            return True
+        if level.value > policy.level_for(module or "").value:
+            return False
+
+        if policy.is_sampled(level):
+            # Register a record each time the number of sampled records
+            # multiplied by `sample_rate` reaches the next integer
+            self._sampled_records += 1
+            n = self._sampled_records
+            return int(n * policy.sample_rate) > int((n - 1) * policy.sample_rate)
+
+        return True
+
+    def _flush_idle_record(self) -> None:
+        """Register the pending record if no lines were added to it recently.
+
+        Otherwise reschedule this call for when the record becomes idle.
+        Called in the monitor's event loop.
+        """
+
+        assert self._flush_interval is not None
+        with self._record_lock:
+            idle_time = time.monotonic() - self._last_line_time
+            if self._pending_record and idle_time < self._flush_interval:
+                self._event_loop.call_later(
+                    self._flush_interval - idle_time, self._flush_idle_record
+                )
+                return
+            self._flush_scheduled = False
+            if self._pending_record and self.is_running():
+                self.add_event_sync(self._pending_record)
+            self._pending_record = None
+
+    def _flush_record(self) -> None:
+        """Register the pending record, if any, regardless of its idle time."""
+
+        with self._record_lock:
+            if self._pending_record and self.is_running():
+                self.add_event_sync(self._pending_record)
+            self._pending_record = None
+
     async def wait_for_entry(
         self, pattern: str, timeout: Optional[float] = None
     ) -> LogEvent:
@@ -223,3 +544,25 @@ class LogEventMonitor(PatternMatchingEventMonitor[LogEvent]):
             event.message,
         )
         return event
+
+    async def wait_for_fields(
+        self, fields: Dict[str, Any], timeout: Optional[float] = None
+    ) -> LogEvent:
+        """Search log for a structured record with all of the given `fields`.
+
+        A record matches if, for each key in `fields`, its `fields` attribute
+        contains an equal value under the same key, e.g. `{"agreement_id": id}`.
+        Only records ingested in JSON format have fields, see `LogEvent.from_json()`.
+
+        The semantics of subsequent calls and `timeout` is as in `wait_for_entry()`.
+        """
+        expected = fields.items()
+        event = await self.wait_for_event(
+            lambda e: e.fields.items() >= expected, timeout
+        )
+        logger.debug(
+            "Log assertion completed with a match. fields=%s, match=%s",
+            fields,
+            event.message,
+        )
+        return event
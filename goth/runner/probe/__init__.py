@@ -7,36 +7,52 @@ import contextlib
 import copy
 import logging
 from pathlib import Path
+import time
 from typing import (
     AsyncIterator,
+    Callable,
     Dict,
     Iterator,
     List,
     Optional,
+    Sequence,
     Tuple,
     TYPE_CHECKING,
 )
 
+import aiohttp
 from docker import DockerClient
+from ya_market import Demand, Proposal
 
 from goth.address import (
     YAGNA_BUS_URL,
+    YAGNA_REST_PORT,
     YAGNA_REST_URL,
 )
 
 from goth import gftp
 from goth.node import DEFAULT_SUBNET
 from goth.runner import process
-from goth.runner.cli import Cli, YagnaDockerCli
+from goth.runner.cli import AsyncYagnaDockerCli, Cli, YagnaDockerCli
+from goth.runner.container.readiness import DEFAULT_READY_TIMEOUT, retry_with_backoff
 from goth.runner.container.utils import get_container_address
 from goth.runner.container.yagna import (
     YagnaContainer,
     YagnaContainerConfig,
     PAYMENT_MOUNT_PATH,
 )
-from goth.runner.exceptions import KeyAlreadyExistsError, TemporalAssertionError
+from goth.runner.exceptions import (
+    CommandError,
+    KeyAlreadyExistsError,
+    TemporalAssertionError,
+)
 from goth.runner.log import LogConfig, monitored_logger
 from goth.runner.log_monitor import PatternMatchingEventMonitor
+from goth.runner.probe.activities import (
+    DEFAULT_ACTIVITY_TIMEOUT,
+    DEFAULT_MAX_CONCURRENT_ACTIVITIES,
+    ParallelActivities,
+)
 from goth.runner.probe.agent import AgentComponent, ProviderAgentComponent
 from goth.runner.probe.mixin import (
     ActivityApiMixin,
@@ -44,7 +60,12 @@ from goth.runner.probe.mixin import (
     PaymentApiMixin,
     ProviderLogMixin,
 )
-from goth.runner.probe.rest_client import RestApiComponent
+from goth.runner.probe.negotiation import (
+    DEFAULT_MAX_CONCURRENT_NEGOTIATIONS,
+    negotiate_agreements,
+    NegotiatedAgreement,
+)
+from goth.runner.probe.rest_client import HttpPoolConfig, RestApiComponent
 
 
 if TYPE_CHECKING:
@@ -52,6 +73,11 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+GSB_CONNECTED_PATTERN = ".*connected with server: ya-sb-router.*"
+"""Pattern of the log line after which the daemon can handle GSB messages."""
+
+REST_CHECK_TIMEOUT = aiohttp.ClientTimeout(total=2)
+
 
 class ProbeLoggingAdapter(logging.LoggerAdapter):
     """Adds probe name information to log messages."""
@@ -73,18 +99,33 @@ class Probe(abc.ABC):
     api: RestApiComponent
     """Component with clients for all three yagna REST APIs."""
 
+    http_pool_config: HttpPoolConfig = HttpPoolConfig()
+    """Settings of the HTTP connection pool used by the API clients.
+
+    Can be changed for a single probe using `probe_properties` in its config.
+    """
+
     runner: "Runner"
     """A runner that created this probe."""
 
     cli: YagnaDockerCli
     """A module which enables calling the Yagna CLI on the daemon being tested."""
 
+    async_cli: AsyncYagnaDockerCli
+    """Same as `cli`, but running the commands without blocking the event loop."""
+
     container: YagnaContainer
     """A module which handles the lifecycle of the daemon's Docker container."""
 
     ip_address: Optional[str] = None
     """An IP address of the daemon's container in the Docker network."""
 
+    _address: Optional[str] = None
+    """Cached address of the default identity, `None` if not known yet."""
+
+    _app_key: Optional[str] = None
+    """Cached application key, `None` if not known yet."""
+
     _agents: "OrderedDict[str, AgentComponent]"
     """Collection of agent components that will be started as part of this probe.
 
@@ -119,7 +160,9 @@ class Probe(abc.ABC):
         )
         config = self._setup_gftp_proxy(config)
         self.container = YagnaContainer(client, config, log_config)
-        self.cli = Cli(self.container).yagna
+        cli = Cli(self.container)
+        self.cli = cli.yagna
+        self.async_cli = cli.yagna_async
         self._yagna_config = config
 
     def __str__(self):
@@ -132,15 +175,34 @@ class Probe(abc.ABC):
 
     @property
     def address(self) -> Optional[str]:
-        """Return address from id marked as default."""
-        identity = self.cli.id_show()
-        return identity.address if identity else None
+        """Return address from id marked as default.
+
+        The address is cached, `yagna id show` is only run if it's not known yet.
+        """
+        if self._address is None:
+            identity = self.cli.id_show()
+            self._address = identity.address if identity else None
+        return self._address
 
     @property
     def app_key(self) -> Optional[str]:
-        """Return first app key on the list."""
-        keys = self.cli.app_key_list()
-        return keys[0].key if keys else None
+        """Return the app key created for this probe, or the first key on the list.
+
+        The key is cached, `yagna app-key list` is only run if it's not known yet.
+        """
+        if self._app_key is None:
+            keys = self.cli.app_key_list()
+            self._app_key = keys[0].key if keys else None
+        return self._app_key
+
+    def clear_identity_cache(self, *_args, **_kwargs) -> None:
+        """Forget the cached address and app key.
+
+        Called when the container is started or restarted. Tests which change
+        the default identity or app keys using `cli` should call it too.
+        """
+        self._address = None
+        self._app_key = None
 
     @property
     def name(self) -> str:
@@ -175,12 +237,18 @@ class Probe(abc.ABC):
         """Start the probe."""
 
         await self._start_container()
-        self.api = RestApiComponent(self)
+        self.api = RestApiComponent(self, self.http_pool_config)
 
     async def start_agents(self):
-        """Start all of the probe's agents."""
-        for agent in self.agents:
-            await agent.start()
+        """Start all of the probe's agents, concurrently."""
+        await asyncio.gather(*(agent.start() for agent in self.agents))
+
+    async def wait_for_agents_ready(self, timeout: Optional[float] = None) -> None:
+        """Wait until all of the probe's agents are ready, see `start_agents()`."""
+        await asyncio.wait_for(
+            asyncio.gather(*(agent.wait_until_ready() for agent in self.agents)),
+            timeout,
+        )
 
     async def stop(self):
         """
@@ -191,6 +259,8 @@ class Probe(abc.ABC):
         self._logger.info("Stopping probe")
         for agent in self.agents:
             await agent.stop()
+        if hasattr(self, "api"):
+            await self.api.close()
         if self.container.logs:
             await self.container.logs.stop()
 
@@ -207,15 +277,18 @@ class Probe(abc.ABC):
         Performs all necessary steps to make the daemon ready for testing
         (e.g. creating the default app key).
         """
+        # The daemon may come up with a different identity after a restart
+        self.container.machine.on_enter_running(self.clear_identity_cache)
         self.container.start()
 
         # Wait until the daemon is ready to create an app key.
         self._logger.info("Waiting for connection to ya-sb-router")
         if self.container.logs:
-            await self.container.logs.wait_for_entry(
-                ".*connected with server: ya-sb-router.*", timeout=30
-            )
+            await self.container.logs.wait_for_entry(GSB_CONNECTED_PATTERN, timeout=30)
         await self.create_app_key()
+        if self._address is None:
+            identity = await self.async_cli.id_show()
+            self._address = identity.address if identity else None
 
         self._logger.info("Waiting for yagna REST API to be listening")
         if self.container.logs:
@@ -246,35 +319,77 @@ class Probe(abc.ABC):
             key_file: str = str(PAYMENT_MOUNT_PATH / key_name)
             self._logger.debug("create_id(alias=%s, key_file=%s", key_name, key_file)
             try:
-                db_id = self.cli.id_create(alias=key_name, key_file=key_file)
+                db_id = await self.async_cli.id_create(
+                    alias=key_name, key_file=key_file
+                )
                 address = db_id.address
                 self._logger.debug("create_id. alias=%s, address=%s", db_id, address)
             except KeyAlreadyExistsError as e:
                 logger.critical("Id already exists : (%r)", e)
                 raise
-            db_id = self.cli.id_update(address, set_default=True)
+            db_id = await self.async_cli.id_update(address, set_default=True)
             self._logger.debug("update_id. result=%r", db_id)
-            self.container.restart()
-            await asyncio.sleep(5)
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.container.restart
+            )
+            await self.wait_until_ready()
         try:
-            key = self.cli.app_key_create(key_name)
+            key = await self.async_cli.app_key_create(key_name)
             self._logger.debug("create_app_key. key_name=%s, key=%s", key_name, key)
         except KeyAlreadyExistsError:
-            app_key = next(
-                filter(lambda k: k.name == key_name, self.cli.app_key_list())
-            )
+            keys = await self.async_cli.app_key_list()
+            app_key = next(filter(lambda k: k.name == key_name, keys))
             key = app_key.key
+        self._app_key = key
+        if address:
+            self._address = address
         return key
 
+    async def wait_until_ready(self, timeout: float = DEFAULT_READY_TIMEOUT) -> None:
+        """Wait until the daemon is ready after its container was (re)started.
+
+        Waits for the daemon to log its connection to ya-sb-router, then checks
+        that it handles CLI commands over GSB and that its REST API responds.
+        The REST API is reached on localhost, through the container's port mapping,
+        as container addresses are reachable from the host only on Linux.
+        The checks are retried with exponential backoff. Raise
+        `asyncio.TimeoutError` if the daemon is not ready within `timeout` seconds.
+        """
+
+        async def _cli_ready() -> None:
+            await self.async_cli.id_show()
+
+        async def _rest_api_ready() -> None:
+            url = f"http://127.0.0.1:{self.container.ports[YAGNA_REST_PORT]}/"
+            async with aiohttp.ClientSession(timeout=REST_CHECK_TIMEOUT) as session:
+                async with session.get(url) as response:
+                    if response.status >= 500:
+                        raise RuntimeError(f"REST API status: {response.status}")
+
+        async def _wait() -> None:
+            if self.container.logs:
+                await self.container.logs.wait_for_entry(GSB_CONNECTED_PATTERN)
+            await retry_with_backoff(_cli_ready, "yagna CLI", (CommandError,))
+            await retry_with_backoff(
+                _rest_api_ready,
+                "yagna REST API",
+                (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError),
+            )
+
+        start_time = time.monotonic()
+        await asyncio.wait_for(_wait(), timeout)
+        self._logger.info("Daemon ready after %.1f s", time.monotonic() - start_time)
+
     def set_agent_env_vars(self, env: Dict[str, str]) -> None:
         """Add vars needed to talk to the daemon in this probe's container to `env`."""
 
-        if not self.app_key:
+        app_key = self.app_key
+        if not app_key:
             raise AttributeError("Yagna application key is not set yet")
         path_var = env.get("PATH")
         env.update(
             {
-                "YAGNA_APPKEY": self.app_key,
+                "YAGNA_APPKEY": app_key,
                 "YAGNA_API_URL": YAGNA_REST_URL.substitute(host=self.ip_address),
                 "GSB_URL": YAGNA_BUS_URL.substitute(host=self.ip_address),
                 "PATH": f"{self._gftp_script_dir}:{path_var}",
@@ -380,11 +495,52 @@ async def run_probe(probe: Probe) -> AsyncIterator[str]:
 class RequestorProbe(ActivityApiMixin, MarketApiMixin, PaymentApiMixin, Probe):
     """A probe subclass with activity API steps and requestor payment init."""
 
+    def run_activities(
+        self,
+        agreements: Sequence[Tuple[str, "ProviderProbe"]],
+        exe_script: str,
+        num_results: int,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_ACTIVITIES,
+        timeout: float = DEFAULT_ACTIVITY_TIMEOUT,
+    ) -> ParallelActivities:
+        """Prepare running `exe_script` concurrently for each of `agreements`.
+
+        `agreements` are pairs of agreement ID and provider probe. Use `results()`
+        of the returned object to stream command results as they are produced,
+        or `run()` to wait until all activities are complete.
+        """
+        return ParallelActivities(
+            self, agreements, exe_script, num_results, max_concurrency, timeout
+        )
+
+    async def negotiate_agreements(
+        self,
+        subscription_id: str,
+        demand: Demand,
+        providers: Sequence["ProviderProbe"],
+        proposal_filter: Callable[[Proposal], bool] = lambda p: True,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_NEGOTIATIONS,
+    ) -> List[NegotiatedAgreement]:
+        """Negotiate an agreement with each of `providers`, concurrently.
+
+        Proposals for all negotiations are collected from a single stream of
+        `collect_offers` events. Return the agreements, with per-provider timing,
+        in the order of `providers`.
+        """
+        return await negotiate_agreements(
+            self,
+            subscription_id,
+            demand,
+            providers,
+            proposal_filter,
+            max_concurrency,
+        )
+
     async def _start_container(self) -> None:
         await super()._start_container()
 
-        self.cli.payment_fund()
-        self.cli.payment_init(sender_mode=True)
+        await self.async_cli.payment_fund()
+        await self.async_cli.payment_init(sender_mode=True)
 
 
 class ProviderProbe(MarketApiMixin, PaymentApiMixin, ProviderLogMixin, Probe):
@@ -0,0 +1,205 @@
+"""Running activities for many agreements concurrently, streaming their results."""
+
+import asyncio
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import (
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from ya_activity import ExeScriptCommandResult
+
+from goth.runner.probe.polling import Poller
+
+if TYPE_CHECKING:
+    from goth.runner.probe import ProviderProbe, RequestorProbe
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_ACTIVITIES = 8
+DEFAULT_ACTIVITY_TIMEOUT = 300.0  # in seconds
+
+
+@dataclass
+class ActivityRun:
+    """An activity run for an agreement, with its results and timing."""
+
+    agreement_id: str
+
+    provider: "ProviderProbe"
+
+    activity_id: Optional[str] = None
+
+    results: List[ExeScriptCommandResult] = field(default_factory=list)
+    """Results of the commands executed so far."""
+
+    phase_times: Dict[str, float] = field(default_factory=dict)
+    """Duration of each phase of the run in seconds, in order of phases.
+
+    The phases are: `create`, `first_result`, `complete` and `destroy`.
+    """
+
+    @property
+    def duration(self) -> float:
+        """Return the time the run took so far, in seconds."""
+        return sum(self.phase_times.values())
+
+
+class ParallelActivities:
+    """Runs an exe script in an activity for each of the given agreements.
+
+    At most `max_concurrency` activities run at the same time. Results of the
+    commands are available as an async stream, as soon as they are produced.
+    Each agreement should be made with a different provider, since the steps
+    waiting for exe-unit logs can't tell activities on a single provider apart.
+    """
+
+    runs: List[ActivityRun]
+    """Activity runs, in the order of agreements."""
+
+    exe_script: str
+    """The exe script in JSON format."""
+
+    num_results: int
+    """Number of results after which an activity is complete."""
+
+    max_concurrency: int
+
+    timeout: float
+    """Time limit for executing the exe script in an activity, in seconds."""
+
+    _requestor: "RequestorProbe"
+
+    def __init__(
+        self,
+        requestor: "RequestorProbe",
+        agreements: Sequence[Tuple[str, "ProviderProbe"]],
+        exe_script: str,
+        num_results: int,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_ACTIVITIES,
+        timeout: float = DEFAULT_ACTIVITY_TIMEOUT,
+    ):
+        self._requestor = requestor
+        self.runs = [ActivityRun(a, p) for a, p in agreements]
+        self.exe_script = exe_script
+        self.num_results = num_results
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+    async def results(
+        self,
+    ) -> AsyncIterator[Tuple[ActivityRun, ExeScriptCommandResult]]:
+        """Run the activities, yielding the results of commands as they arrive.
+
+        If any of the runs fails, the other runs are cancelled and the error
+        is raised.
+        """
+
+        queue: "asyncio.Queue" = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [
+            asyncio.ensure_future(self._run(run, semaphore, queue)) for run in self.runs
+        ]
+        for task in tasks:
+            task.add_done_callback(queue.put_nowait)
+
+        try:
+            num_finished = 0
+            while num_finished < len(tasks):
+                item = await queue.get()
+                if isinstance(item, asyncio.Future):
+                    # Raise the error if the run failed
+                    item.result()
+                    num_finished += 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self) -> List[ActivityRun]:
+        """Run the activities until all of them are complete, return the runs."""
+
+        async for _ in self.results():
+            pass
+        return self.runs
+
+    async def _run(
+        self, run: ActivityRun, semaphore: asyncio.Semaphore, queue: asyncio.Queue
+    ) -> None:
+        async with semaphore:
+            start_time = time.monotonic()
+
+            def _phase_finished(phase: str) -> None:
+                nonlocal start_time
+                now = time.monotonic()
+                run.phase_times[phase] = now - start_time
+                start_time = now
+
+            logger.info("Running activity on %s", run.provider.name)
+            activity_id = await self._requestor.create_activity(run.agreement_id)
+            run.activity_id = activity_id
+            await run.provider.wait_for_exeunit_started()
+            _phase_finished("create")
+
+            batch_id = await self._requestor.call_exec(activity_id, self.exe_script)
+            async for result in self._stream_results(activity_id, batch_id):
+                run.results.append(result)
+                if len(run.results) == 1:
+                    _phase_finished("first_result")
+                queue.put_nowait((run, result))
+            _phase_finished("complete")
+
+            await self._requestor.destroy_activity(activity_id)
+            await run.provider.wait_for_exeunit_finished()
+            _phase_finished("destroy")
+
+        logger.info(
+            "Activity on %s finished in %.1f s. id=%s",
+            run.provider.name,
+            run.duration,
+            activity_id,
+        )
+
+    async def _stream_results(
+        self, activity_id: str, batch_id: str
+    ) -> AsyncIterator[ExeScriptCommandResult]:
+        """Yield the results of a batch, long-polling for each next command."""
+
+        results: List[ExeScriptCommandResult] = []
+        poller = Poller()
+        deadline = time.monotonic() + self.timeout
+        control = self._requestor.api.activity.control
+
+        while len(results) < self.num_results:
+            num_previous = len(results)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(
+                    f"Activity {activity_id} did not complete in {self.timeout} s"
+                )
+            results = await asyncio.wait_for(
+                poller.poll(
+                    lambda timeout: control.get_exec_batch_results(
+                        activity_id,
+                        batch_id,
+                        command_index=num_previous,
+                        timeout=timeout,
+                    ),
+                    results,
+                    lambda new_results: len(new_results) > num_previous,
+                ),
+                remaining,
+            )
+            for result in results[num_previous:]:
+                yield result
+            if results and results[-1].is_batch_finished:
+                break
@@ -1,8 +1,15 @@
 """Module for agent components to be used with `Probe` objects."""
 import abc
+import asyncio
+import functools
 import logging
-from typing import Optional, TYPE_CHECKING
+import re
+import shlex
+from typing import List, Optional, TYPE_CHECKING
 
+from goth.assertions import EventStream
+from goth.assertions.assertions import Assertion
+from goth.runner.exceptions import CommandError
 from goth.runner.log import LogConfig
 from goth.runner.log_monitor import LogEvent, LogEventMonitor
 from goth.runner.probe.component import ProbeComponent
@@ -42,6 +49,13 @@ class AgentComponent(ProbeComponent, abc.ABC):
     async def start(self, *args, **kwargs):
         """Start the agent binary and initialize the internal log monitor."""
 
+    async def wait_until_ready(self, timeout: Optional[float] = None) -> None:
+        """Wait until the agent is ready for use after `start()`.
+
+        Agents that report readiness in their logs override this method,
+        by default an agent is ready as soon as it is started.
+        """
+
     async def stop(self, *args, **kwargs):
         """Stop the agent binary and its log monitor."""
         if self.log_monitor:
@@ -54,7 +68,12 @@ class AgentComponent(ProbeComponent, abc.ABC):
         if probe.container.log_config:
             log_config.base_dir = probe.container.log_config.base_dir
 
-        self.log_monitor = LogEventMonitor(self.name, log_config)
+        self.log_monitor = LogEventMonitor(
+            self.name,
+            log_config,
+            ingestion_policy=probe.container.log_ingestion_policy,
+            json_records=probe.container.json_logs,
+        )
 
     async def wait_for_log(
         self, pattern: str, timeout: Optional[float] = None
@@ -67,29 +86,100 @@ class AgentComponent(ProbeComponent, abc.ABC):
 class ProviderAgentComponent(AgentComponent):
     """Probe component which runs `ya-provider` in the probe's container."""
 
+    READY_PATTERN = "Subscribed offer"
+    """Pattern of the log line after which the provider agent is ready."""
+
     agent_preset: Optional[str]
     """Name of the preset to be used when placing a market offer."""
 
     subnet: str
     """Name of the subnet to which the provider agent connects."""
 
+    _ready: Optional[Assertion]
+    """Assertion satisfied once the agent logs a line matching `READY_PATTERN`."""
+
     def __init__(self, probe: "Probe", subnet: str, agent_preset: Optional[str] = None):
         super().__init__(probe, f"{probe.name}_ya-provider")
         self.agent_preset = agent_preset
         self.subnet = subnet
+        self._ready = None
+
+    def _config_commands(self) -> List[str]:
+        commands = []
+        if self.agent_preset:
+            commands.append(f"ya-provider preset activate {self.agent_preset}")
+        commands.append(f"ya-provider config set --subnet {self.subnet}")
+        return commands
 
     async def start(self):
-        """Start the provider agent and attach to its log stream."""
+        """Start the provider agent and attach to its log stream.
+
+        The configuration commands are run in a single `docker exec` and neither
+        exec blocks the event loop, so that agents of many probes start in parallel.
+        """
         await super().start()
         probe = self.probe
         probe._logger.info("Starting ya-provider")
+        loop = asyncio.get_running_loop()
 
-        if self.agent_preset:
-            probe.container.exec_run(f"ya-provider preset activate {self.agent_preset}")
-        probe.container.exec_run(f"ya-provider config set --subnet {self.subnet}")
-
-        log_stream = probe.container.exec_run(
-            f"ya-provider run" f" --app-key {probe.app_key} --node-name {probe.name}",
-            stream=True,
+        # The exit code is that of the first failed command, if any
+        script = " && ".join(self._config_commands())
+        result = await loop.run_in_executor(
+            None, probe.container.exec_run, f"sh -c {shlex.quote(script)}"
+        )
+        if result.exit_code != 0:
+            raise CommandError(
+                f"Configuring ya-provider failed. exit_code={result.exit_code}, "
+                f"output={result.output!r}"
+            )
+
+        log_stream = await loop.run_in_executor(
+            None,
+            functools.partial(
+                probe.container.exec_run,
+                f"ya-provider run"
+                f" --app-key {probe.app_key} --node-name {probe.name}",
+                stream=True,
+            ),
+        )
+        # Added before the monitor starts, so no log line can be missed. Unlike
+        # `wait_for_log()` this doesn't move past the matching line in the logs.
+        self._ready = self.log_monitor.add_assertion(
+            _first_matching_entry(self.READY_PATTERN, self.log_monitor.pattern_flags),
+            name=f"{self.name} ready",
+            log_level=logging.DEBUG,
         )
         self.log_monitor.start(log_stream.output)
+
+    async def wait_until_ready(self, timeout: Optional[float] = None) -> None:
+        """Wait until the provider agent subscribes to its offer.
+
+        Can be awaited any number of times, also after the agent got ready or after
+        a previous wait timed out.
+        """
+        if not self._ready:
+            raise RuntimeError(f"{self.name} not started")
+        # Shielded, since cancelling the assertion on timeout would mark it failed
+        entry = await asyncio.wait_for(
+            asyncio.shield(self._ready.wait_for_result()), timeout
+        )
+        if entry is None:
+            raise RuntimeError(f"{self.name} stopped before it got ready")
+
+
+def _first_matching_entry(pattern: str, flags: int = 0):
+    """Return an assertion function returning the first entry matching `pattern`.
+
+    The assertion returns `None` if the logs end with no matching entry: an agent
+    that never got ready should fail the step waiting for it, not the whole test.
+    """
+
+    regex = re.compile(pattern, flags)
+
+    async def _assertion(stream: EventStream[LogEvent]) -> Optional[LogEvent]:
+        async for event in stream:
+            if regex.match(event.message):
+                return event
+        return None
+
+    return _assertion
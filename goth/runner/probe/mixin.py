@@ -2,9 +2,12 @@
 
 import asyncio
 from datetime import datetime, timedelta
+from decimal import Decimal
 import logging
+import time
 from typing import (
     Callable,
+    Dict,
     Iterable,
     List,
     Optional,
@@ -16,9 +19,16 @@ from typing import (
 
 from ya_activity import ExeScriptCommandResult, ExeScriptRequest
 from ya_market import AgreementProposal, Demand, DemandOfferBase, Proposal
-from ya_payment import Acceptance, Allocation, Invoice
+from ya_payment import (
+    Acceptance,
+    Allocation,
+    DebitNote,
+    Invoice,
+    InvoiceReceivedEvent,
+)
 
 from goth.node import DEFAULT_SUBNET
+from goth.runner.probe.polling import Poller
 from goth.runner.step import step
 
 if TYPE_CHECKING:
@@ -28,6 +38,29 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_CONCURRENT_ACCEPTANCES = 8
+
+
+def total_amount_due(
+    invoices: Sequence[Invoice], debit_notes: Sequence[DebitNote]
+) -> Decimal:
+    """Return the total amount due for the given invoices and debit notes.
+
+    The amount of a debit note is cumulative for its activity, so only the highest
+    one for each activity counts. An invoice covers the whole agreement, including
+    its debit notes, so debit notes of invoiced agreements are not counted.
+    """
+
+    invoiced = {inv.agreement_id for inv in invoices}
+    activity_amounts: Dict[str, Decimal] = {}
+    for note in debit_notes:
+        if note.agreement_id not in invoiced:
+            amount = Decimal(note.total_amount_due)
+            previous = activity_amounts.get(note.activity_id, amount)
+            activity_amounts[note.activity_id] = max(previous, amount)
+    amounts = [Decimal(inv.amount) for inv in invoices]
+    return sum(amounts, Decimal(0)) + sum(activity_amounts.values(), Decimal(0))
+
 
 class ProbeProtocol(Protocol):
     """Protocol class representing the probe interface in mixins.
@@ -72,12 +105,21 @@ class ActivityApiMixin:
         """Call collect_results on the activity api."""
 
         results: List[ExeScriptCommandResult] = []
+        poller = Poller()
 
         while len(results) < num_results:
-            results = await self.api.activity.control.get_exec_batch_results(
-                activity_id, batch_id
+            # The server holds the call until the last command finishes
+            num_previous = len(results)
+            results = await poller.poll(
+                lambda timeout: self.api.activity.control.get_exec_batch_results(
+                    activity_id,
+                    batch_id,
+                    command_index=num_results - 1,
+                    timeout=timeout,
+                ),
+                results,
+                lambda new_results: len(new_results) > num_previous,
             )
-            await asyncio.sleep(1.0)
         return results
 
     @step()
@@ -190,14 +232,20 @@ class MarketApiMixin:
     ) -> List[Proposal]:
         """Call collect_offers on the market api.
 
-        Polls collect_offers continously until an offer from each of the given
+        Long-polls collect_offers until an offer from each of the given
         providers is received. Returns a list of the collected proposals.
         """
         proposals: List[Proposal] = []
         provider_ids = {p.address for p in providers}
+        poller = Poller()
 
         while len(proposals) < len(provider_ids):
-            collected_offers = await self.api.market.collect_offers(subscription_id)
+            collected_offers = await poller.poll(
+                lambda timeout: self.api.market.collect_offers(
+                    subscription_id, timeout=timeout
+                ),
+                [],
+            )
             if collected_offers:
                 logger.debug(
                     "collect_offers(%s). collected_offers=%r",
@@ -226,14 +274,28 @@ class PaymentApiMixin:
 
     @step()
     async def gather_invoices(self: ProbeProtocol, agreement_id: str) -> List[Invoice]:
-        """Call gather_invoice on the payment api."""
+        """Wait for invoices for the given agreement using the payment api.
+
+        Long-polls invoice events, fetching only the invoices which were received.
+        """
 
         invoices: List[Invoice] = []
+        after_timestamp: Optional[datetime] = None
+        poller = Poller()
 
         while not invoices:
-            await asyncio.sleep(2.0)
-            invoices = await self.api.payment.get_invoices()
-            invoices = [inv for inv in invoices if inv.agreement_id == agreement_id]
+            events = await poller.poll(
+                lambda timeout: self.api.payment.get_invoice_events(
+                    timeout=timeout, after_timestamp=after_timestamp
+                ),
+                [],
+            )
+            for event in events:
+                after_timestamp = event.event_date
+                if isinstance(event, InvoiceReceivedEvent):
+                    invoice = await self.api.payment.get_invoice(event.invoice_id)
+                    if invoice.agreement_id == agreement_id:
+                        invoices.append(invoice)
 
         return invoices
 
@@ -261,6 +323,86 @@ class PaymentApiMixin:
             await self.api.payment.accept_invoice(invoice_event.invoice_id, acceptance)
             logger.debug("Accepted invoice. id=%s", invoice_event.invoice_id)
 
+    @step(default_timeout=60)
+    async def settle_invoices(
+        self: ProbeProtocol,
+        invoices: Iterable[Invoice],
+        debit_notes: Iterable[DebitNote] = (),
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_ACCEPTANCES,
+    ) -> Dict[str, float]:
+        """Accept invoices and debit notes using a single allocation.
+
+        The allocation is sized to the total amount due, see `total_amount_due()`.
+        Documents are accepted concurrently, at most `max_concurrency` at a time.
+        Once all acceptances complete, or if the step is cancelled, the allocation is
+        released, so that the amount not spent on accepted documents is freed.
+        If any acceptance fails, the error is raised. Return the acceptance latency
+        of each document in seconds, by its ID.
+        """
+
+        invoices = list(invoices)
+        debit_notes = list(debit_notes)
+        total_amount = total_amount_due(invoices, debit_notes)
+        allocation = Allocation(
+            allocation_id="",
+            total_amount=str(total_amount),
+            spent_amount=0,
+            remaining_amount=0,
+            make_deposit=True,
+        )
+        allocation_result = await self.api.payment.create_allocation(allocation)
+        allocation_id = allocation_result.allocation_id
+        logger.debug(
+            "Created allocation. id=%s, amount=%s", allocation_id, total_amount
+        )
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        latencies: Dict[str, float] = {}
+
+        async def _accept(doc_id: str, amount: str, accept) -> None:
+            acceptance = Acceptance(
+                total_amount_accepted=amount, allocation_id=allocation_id
+            )
+            async with semaphore:
+                start_time = time.monotonic()
+                await accept(doc_id, acceptance)
+                latencies[doc_id] = time.monotonic() - start_time
+            logger.debug("Accepted %s. latency=%.3f s", doc_id, latencies[doc_id])
+
+        try:
+            results = await asyncio.gather(
+                *(
+                    _accept(inv.invoice_id, inv.amount, self.api.payment.accept_invoice)
+                    for inv in invoices
+                ),
+                *(
+                    _accept(
+                        note.debit_note_id,
+                        note.total_amount_due,
+                        self.api.payment.accept_debit_note,
+                    )
+                    for note in debit_notes
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            # Released also if the step times out or is cancelled, otherwise
+            # the deposit made for the allocation would stay reserved
+            await asyncio.shield(self.api.payment.release_allocation(allocation_id))
+            logger.debug("Released allocation. id=%s", allocation_id)
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.error(
+                "Failed to accept %d of %d documents. allocation_id=%s",
+                len(errors),
+                len(results),
+                allocation_id,
+            )
+            raise errors[0]
+
+        return latencies
+
 
 class ProviderProbeProtocol(ProbeProtocol, Protocol):
     """Protocol class representing `ProviderProbe` class.
@@ -279,7 +421,7 @@ class ProviderLogMixin:
     @step()
     async def wait_for_offer_subscribed(self: ProviderProbeProtocol):
         """Wait until the provider agent subscribes to the offer."""
-        await self.provider_agent.wait_for_log("Subscribed offer")
+        await self.provider_agent.wait_until_ready()
 
     @step()
     async def wait_for_proposal_accepted(self: ProviderProbeProtocol):
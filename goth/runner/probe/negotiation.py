@@ -0,0 +1,197 @@
+"""Negotiating agreements between a requestor and many providers concurrently."""
+
+import asyncio
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import Callable, Dict, List, Sequence, TYPE_CHECKING
+
+from ya_market import Demand, Proposal, ProposalEvent
+
+from goth.runner.probe.polling import Poller
+
+if TYPE_CHECKING:
+    from goth.runner.probe import ProviderProbe, RequestorProbe
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_NEGOTIATIONS = 8
+DEFAULT_PROPOSAL_TIMEOUT = 10.0  # in seconds
+
+
+@dataclass
+class NegotiatedAgreement:
+    """An agreement negotiated with a provider, with the timing of the negotiation."""
+
+    agreement_id: str
+
+    provider: "ProviderProbe"
+
+    phase_times: Dict[str, float] = field(default_factory=dict)
+    """Duration of each phase of the negotiation in seconds, in order of phases.
+
+    Waiting for the provider's initial proposal is not included.
+    """
+
+    @property
+    def duration(self) -> float:
+        """Return the time the negotiation took, in seconds."""
+        return sum(self.phase_times.values())
+
+
+class ProposalDispatcher:
+    """Reads proposals from a single `collect_offers` stream and dispatches them.
+
+    Initial proposals are dispatched by issuer, only the first proposal from each
+    issuer accepted by `proposal_filter` is used. Proposals sent in response to
+    counter-proposals are dispatched by `prev_proposal_id`. Proposals which arrive
+    before anyone waits for them are kept until they are requested.
+    """
+
+    _requestor: "RequestorProbe"
+    _subscription_id: str
+    _proposal_filter: Callable[[Proposal], bool]
+
+    _initial: Dict[str, "asyncio.Future[Proposal]"]
+    """Initial proposals, by issuer ID."""
+
+    _responses: Dict[str, "asyncio.Future[Proposal]"]
+    """Proposals sent in response to counter-proposals, by previous proposal ID."""
+
+    def __init__(
+        self,
+        requestor: "RequestorProbe",
+        subscription_id: str,
+        proposal_filter: Callable[[Proposal], bool] = lambda p: True,
+    ):
+        self._requestor = requestor
+        self._subscription_id = subscription_id
+        self._proposal_filter = proposal_filter
+        self._initial = {}
+        self._responses = {}
+
+    async def run(self) -> None:
+        """Collect and dispatch proposals until cancelled."""
+
+        poller = Poller()
+        while True:
+            offers = await poller.poll(
+                lambda timeout: self._requestor.api.market.collect_offers(
+                    self._subscription_id, timeout=timeout
+                ),
+                [],
+            )
+            for event in offers:
+                if isinstance(event, ProposalEvent):
+                    self._dispatch(event.proposal)
+
+    def _future(
+        self, futures: Dict[str, "asyncio.Future[Proposal]"], key: str
+    ) -> "asyncio.Future[Proposal]":
+        if key not in futures:
+            futures[key] = asyncio.get_running_loop().create_future()
+        return futures[key]
+
+    def _dispatch(self, proposal: Proposal) -> None:
+        logger.debug(
+            "Dispatching proposal. id=%s, issuer=%s, prev_proposal_id=%s",
+            proposal.proposal_id,
+            proposal.issuer_id,
+            proposal.prev_proposal_id,
+        )
+        if proposal.prev_proposal_id:
+            response = self._future(self._responses, proposal.prev_proposal_id)
+            if not response.done():
+                response.set_result(proposal)
+        initial = self._future(self._initial, proposal.issuer_id)
+        if not initial.done() and self._proposal_filter(proposal):
+            initial.set_result(proposal)
+
+    async def initial_proposal(self, issuer_id: str, timeout: float) -> Proposal:
+        """Wait for the first proposal from `issuer_id`."""
+        future = self._future(self._initial, issuer_id)
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    async def response(self, proposal_id: str, timeout: float) -> Proposal:
+        """Wait for the proposal sent in response to `proposal_id`."""
+        future = self._future(self._responses, proposal_id)
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+
+async def negotiate_agreements(
+    requestor: "RequestorProbe",
+    subscription_id: str,
+    demand: Demand,
+    providers: Sequence["ProviderProbe"],
+    proposal_filter: Callable[[Proposal], bool] = lambda p: True,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_NEGOTIATIONS,
+    proposal_timeout: float = DEFAULT_PROPOSAL_TIMEOUT,
+) -> List[NegotiatedAgreement]:
+    """Negotiate an agreement with each of `providers`, concurrently.
+
+    A negotiation with a provider starts as soon as its initial proposal accepted
+    by `proposal_filter` arrives. At most `max_concurrency` negotiations run
+    at the same time. Return the agreements in the order of `providers`.
+    """
+
+    dispatcher = ProposalDispatcher(requestor, subscription_id, proposal_filter)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _negotiate(provider: "ProviderProbe") -> NegotiatedAgreement:
+        assert provider.address
+        proposal = await dispatcher.initial_proposal(provider.address, proposal_timeout)
+
+        async with semaphore:
+            logger.info("Negotiating with %s", provider.name)
+            phase_times: Dict[str, float] = {}
+            start_time = time.monotonic()
+
+            def _phase_finished(phase: str) -> None:
+                nonlocal start_time
+                now = time.monotonic()
+                phase_times[phase] = now - start_time
+                start_time = now
+
+            counter_proposal_id = await requestor.counter_proposal(
+                subscription_id, demand, proposal
+            )
+            await provider.wait_for_proposal_accepted()
+            new_proposal = await dispatcher.response(
+                counter_proposal_id, proposal_timeout
+            )
+            _phase_finished("counter_proposal")
+
+            agreement_id = await requestor.create_agreement(new_proposal)
+            await requestor.confirm_agreement(agreement_id)
+            _phase_finished("create_agreement")
+
+            await provider.wait_for_agreement_approved()
+            await requestor.wait_for_approval(agreement_id)
+            _phase_finished("approval")
+
+        negotiated = NegotiatedAgreement(agreement_id, provider, phase_times)
+        logger.info(
+            "Negotiated agreement with %s in %.1f s. id=%s",
+            provider.name,
+            negotiated.duration,
+            agreement_id,
+        )
+        return negotiated
+
+    dispatcher_task = asyncio.ensure_future(dispatcher.run())
+    tasks = [asyncio.ensure_future(_negotiate(p)) for p in providers]
+    negotiations = asyncio.gather(*tasks)
+    try:
+        await asyncio.wait(
+            {dispatcher_task, negotiations}, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not negotiations.done():
+            # Collecting proposals failed, re-raise the error
+            dispatcher_task.result()
+        return list(negotiations.result())
+    finally:
+        for task in (dispatcher_task, *tasks):
+            task.cancel()
+        await asyncio.gather(
+            negotiations, dispatcher_task, *tasks, return_exceptions=True
+        )
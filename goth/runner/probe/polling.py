@@ -0,0 +1,96 @@
+"""Pacing of repeated calls to yagna REST API endpoints made by probe steps."""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import ya_activity
+import ya_market
+import ya_payment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_TIMEOUT = 5.0
+"""Time for which the server may hold a long-polling call, in seconds."""
+
+DEFAULT_MIN_DELAY = 0.1
+DEFAULT_MAX_DELAY = 2.0
+
+HTTP_REQUEST_TIMEOUT = 408
+"""Status returned by yagna for long-polling calls which timed out with no events."""
+
+_API_EXCEPTIONS = (
+    ya_activity.ApiException,
+    ya_market.ApiException,
+    ya_payment.ApiException,
+)
+
+T = TypeVar("T")
+
+
+class Poller:
+    """Paces the calls made by a single polling loop.
+
+    Each call is passed the long-polling `timeout`, so that the server can hold
+    it until there is something new to return. The next call is made without delay
+    after a call which made progress, or which was held by the server for most of
+    its timeout. Otherwise, e.g. with endpoints which don't support long-polling,
+    the delay grows exponentially from `min_delay` to `max_delay`.
+    """
+
+    timeout: float
+    """Timeout passed to the long-polling calls, in seconds."""
+
+    min_delay: float
+    """Delay after the first call which made no progress, in seconds."""
+
+    max_delay: float
+    """Upper limit of the delay between calls, in seconds."""
+
+    num_calls: int
+    """Number of calls made so far."""
+
+    _delay: float
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_POLL_TIMEOUT,
+        min_delay: float = DEFAULT_MIN_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        self.timeout = timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.num_calls = 0
+        self._delay = min_delay
+
+    async def poll(
+        self,
+        call: Callable[[float], Awaitable[T]],
+        default: T,
+        progress: Callable[[T], bool] = bool,
+    ) -> T:
+        """Make a single call, waiting before it returns if it made no progress.
+
+        `call` is called with the long-polling timeout. If the server reports that
+        the timeout passed with no events, `default` is returned. `progress` checks
+        whether the call's result contains anything new.
+        """
+
+        self.num_calls += 1
+        start_time = time.monotonic()
+        try:
+            result = await call(self.timeout)
+        except _API_EXCEPTIONS as e:
+            if e.status != HTTP_REQUEST_TIMEOUT:
+                raise
+            result = default
+
+        if progress(result):
+            self._delay = self.min_delay
+        elif time.monotonic() - start_time < self.timeout / 2:
+            logger.debug("No progress, next call in %.2f s", self._delay)
+            await asyncio.sleep(self._delay)
+            self._delay = min(self._delay * 2, self.max_delay)
+        return result
@@ -1,8 +1,10 @@
 """Module containing classes related to the yagna REST API client."""
+import asyncio
 import dataclasses
 import logging
-from typing import TypeVar, TYPE_CHECKING
+from typing import List, Optional, TypeVar, TYPE_CHECKING
 
+import aiohttp
 from typing_extensions import Protocol
 
 import ya_activity
@@ -25,6 +27,20 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+@dataclasses.dataclass(frozen=True)
+class HttpPoolConfig:
+    """Settings of the HTTP connection pool shared by the API clients of a probe."""
+
+    limit: int = 32
+    """Maximum number of simultaneous connections."""
+
+    keepalive_timeout: float = 60.0
+    """Time after which idle connections are closed, in seconds."""
+
+    dns_cache_ttl: Optional[int] = 300
+    """Time for which resolved host names are cached, in seconds."""
+
+
 @dataclasses.dataclass
 class ActivityApiClient:
     """
@@ -78,9 +94,26 @@ class RestApiComponent(ProbeComponent):
     payment: ya_payment.RequestorApi
     """Payment API client."""
 
-    def __init__(self, probe: "Probe"):
+    _session: aiohttp.ClientSession
+    """HTTP session with a connection pool, shared by all API clients."""
+
+    _unused_sessions: List[aiohttp.ClientSession]
+    """Sessions created by the API clients and replaced with `_session`."""
+
+    def __init__(self, probe: "Probe", pool_config: HttpPoolConfig = HttpPoolConfig()):
         super().__init__(probe)
 
+        # All API clients talk to the same proxy address, so they can reuse
+        # keep-alive connections from a single pool
+        connector = aiohttp.TCPConnector(
+            limit=pool_config.limit,
+            keepalive_timeout=pool_config.keepalive_timeout,
+            use_dns_cache=pool_config.dns_cache_ttl is not None,
+            ttl_dns_cache=pool_config.dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._unused_sessions = []
+
         # We reach the daemon through MITM proxy running on localhost using the
         # container's unique port mapping
         host_port = probe.container.ports[YAGNA_REST_PORT]
@@ -99,7 +132,18 @@ class RestApiComponent(ProbeComponent):
         if not self.probe.app_key:
             raise RuntimeError("No app key found. probe=%s", self.probe.name)
         config.access_token = self.probe.app_key
-        return api_module.ApiClient(config)
+        client = api_module.ApiClient(config)
+        self._unused_sessions.append(client.rest_client.pool_manager)
+        client.rest_client.pool_manager = self._session
+        return client
+
+    async def close(self) -> None:
+        """Close the HTTP session shared by the API clients."""
+
+        sessions = [self._session, *self._unused_sessions]
+        await asyncio.gather(*(session.close() for session in sessions))
+        self._unused_sessions = []
+        logger.debug("API clients closed. probe=%s", self.probe.name)
 
     def _init_activity_api(self, api_base_host: str) -> None:
         api_url = ACTIVITY_API_URL.substitute(base=api_base_host)
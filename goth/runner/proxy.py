@@ -1,9 +1,11 @@
-"""A class for starting an embedded instance of mitmproxy."""
+"""A class for starting an embedded proxy server for API calls."""
 import asyncio
 import contextlib
+from enum import Enum
 import logging
+import os
 import threading
-from typing import AsyncIterator, Mapping, Optional
+from typing import AsyncIterator, Mapping, Optional, Union
 
 from mitmproxy import options
 import mitmproxy.utils.debug
@@ -12,7 +14,13 @@ from mitmproxy.tools import _main, cmdline, dump
 from goth.address import MITM_PROXY_PORT
 from goth.assertions.monitor import EventMonitor
 from goth.api_monitor.api_events import APIEvent
-from goth.api_monitor.router_addon import RouterAddon
+from goth.api_monitor.body_store import BodyStore
+from goth.api_monitor.har_recorder import HarRecorder, HarRecorderAddon
+from goth.api_monitor.latency import ApiLatencyStats
+from goth.api_monitor.reverse_proxy import ReverseProxyServer
+from goth.api_monitor.router_addon import RouterAddon, RoutingTable
+from goth.api_monitor.shaping import TrafficShaper
+from goth.api_monitor.sharded_proxy import ShardedProxyServer
 from goth.api_monitor.monitor_addon import MonitorAddon
 
 
@@ -25,52 +33,128 @@ mitmproxy.utils.debug.register_info_dumpers = lambda *args: None
 logger = logging.getLogger(__name__)
 
 
+class ProxyEngine(Enum):
+    """Implementations of the proxy server available to `Proxy`."""
+
+    MITMPROXY = "mitmproxy"
+    """Embedded mitmproxy running in a separate thread, with its own event loop."""
+
+    AIOHTTP = "aiohttp"
+    """Reverse proxy based on `aiohttp`, running in the caller's event loop."""
+
+    SHARDED = "sharded"
+    """Reverse proxies based on `aiohttp`, running in several worker processes."""
+
+
 class Proxy:
-    """Proxy using mitmproxy to generate events out of http calls."""
+    """Proxy generating events out of http calls."""
+
+    body_store: BodyStore
+    """Storage for bodies of requests and responses registered by the monitor."""
+
+    engine: ProxyEngine
+
+    num_workers: int
+    """Number of worker processes used by the `SHARDED` engine."""
+
+    latency_stats: ApiLatencyStats
+    """Latency statistics of API calls passing through this proxy."""
 
     monitor: EventMonitor[APIEvent]
+
+    routing_table: RoutingTable
+    """Nodes to which API calls are routed, may be updated while the proxy runs."""
+
+    shaper: TrafficShaper
+    """Shaping of API calls, its rules can be changed while the proxy is running.
+
+    With the `SHARDED` engine, the rules are forwarded to the worker processes.
+    """
+
     _proxy_thread: threading.Thread
     _logger: logging.Logger
     _mitmproxy_runner: Optional[dump.DumpMaster]
-    _node_names: Mapping[str, str]
-    _server_ready: threading.Event
-    """Mapping of IP addresses to node names"""
+    _recorder: Optional[HarRecorder]
+    """Recorder for archiving all API calls, if enabled."""
 
-    _ports: Mapping[str, dict]
-    """Mapping of IP addresses to their port mappings"""
+    _reverse_proxy: Optional[Union[ReverseProxyServer, ShardedProxyServer]]
+    _server_ready: threading.Event
 
     def __init__(
         self,
-        node_names: Mapping[str, str],
-        ports: Mapping[str, dict],
+        node_names: Optional[Mapping[str, str]] = None,
+        ports: Optional[Mapping[str, dict]] = None,
         assertions_module: Optional[str] = None,
+        engine: ProxyEngine = ProxyEngine.MITMPROXY,
+        body_store: Optional[BodyStore] = None,
+        recorder: Optional[HarRecorder] = None,
+        num_workers: Optional[int] = None,
+        shaper: Optional[TrafficShaper] = None,
     ):
-        self._node_names = node_names
-        self._ports = ports
+        self.body_store = body_store or BodyStore()
+        self.engine = engine
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.latency_stats = ApiLatencyStats()
+        self.shaper = shaper or TrafficShaper()
+        self.routing_table = RoutingTable(node_names, ports)
         self._logger = logging.getLogger(__name__)
         self._proxy_thread = threading.Thread(
             target=self._run_mitmproxy, name="ProxyThread", daemon=True
         )
         self._server_ready = threading.Event()
         self._mitmproxy_runner = None
+        self._recorder = recorder
+        self._reverse_proxy = None
 
         self.monitor = EventMonitor("rest", self._logger)
         if assertions_module:
             self.monitor.load_assertions(assertions_module)
 
-    def start(self):
-        """Start the proxy thread."""
+    async def start(self):
+        """Start the proxy server using the selected engine."""
         self.monitor.start()
-        self._proxy_thread.start()
-        self._server_ready.wait()
+        if self._recorder:
+            self._recorder.start()
+        if self.engine == ProxyEngine.SHARDED:
+            self._reverse_proxy = ShardedProxyServer(
+                self.monitor,
+                self.routing_table,
+                self.num_workers,
+                self.body_store,
+                self._recorder,
+                self.latency_stats,
+                shaper=self.shaper,
+            )
+            await self._reverse_proxy.start(None, MITM_PROXY_PORT)
+        elif self.engine == ProxyEngine.AIOHTTP:
+            self._reverse_proxy = ReverseProxyServer(
+                self.monitor,
+                self.routing_table,
+                self.body_store,
+                self._recorder,
+                self.latency_stats,
+                shaper=self.shaper,
+            )
+            await self._reverse_proxy.start(None, MITM_PROXY_PORT)
+        else:
+            self._proxy_thread.start()
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._server_ready.wait
+            )
 
     async def stop(self):
-        """Stop the proxy thread and the monitor."""
+        """Stop the proxy server and the monitor."""
+        if self._reverse_proxy:
+            await self._reverse_proxy.stop()
         if self._mitmproxy_runner:
             self._mitmproxy_runner.shutdown()
-        self._proxy_thread.join()
-        self._logger.info("The mitmproxy thread has finished")
+        if self._proxy_thread.is_alive():
+            self._proxy_thread.join()
+            self._logger.info("The mitmproxy thread has finished")
+        if self._recorder:
+            self._recorder.stop()
         await self.monitor.stop()
+        self.body_store.close()
 
     def _run_mitmproxy(self):
         """Run by `self.proxy_thread`."""
@@ -80,8 +164,19 @@ class Proxy:
         class MITMProxyRunner(dump.DumpMaster):
             def __init__(inner_self, opts: options.Options) -> None:
                 super().__init__(opts)
-                inner_self.addons.add(RouterAddon(self._node_names, self._ports))
-                inner_self.addons.add(MonitorAddon(self.monitor))
+                har_addon = HarRecorderAddon(self._recorder) if self._recorder else None
+                inner_self.addons.add(RouterAddon(self.routing_table))
+                inner_self.addons.add(
+                    MonitorAddon(
+                        self.monitor,
+                        self.body_store,
+                        self.latency_stats,
+                        shaper=self.shaper,
+                        har_addon=har_addon,
+                    )
+                )
+                if har_addon:
+                    inner_self.addons.add(har_addon)
 
             def start(inner_self):
                 super().start()
@@ -113,9 +208,9 @@ async def run_proxy(proxy: Proxy) -> AsyncIterator[Proxy]:
     """Implement AsyncContextManager protocol for starting and stopping a Proxy."""
 
     try:
-        logger.debug("Starting mitmproxy")
-        proxy.start()
+        logger.debug("Starting proxy. engine=%s", proxy.engine.value)
+        await proxy.start()
         yield
     finally:
-        logger.debug("Stopping mitmproxy")
+        logger.debug("Stopping proxy. engine=%s", proxy.engine.value)
         await proxy.stop()
@@ -0,0 +1,107 @@
+"""Tests for the `api_monitor.api_events` module."""
+
+import json
+from unittest import mock
+
+from mitmproxy.http import HTTPRequest, HTTPResponse
+import pytest
+
+from goth.api_monitor.api_events import (
+    APIRequest,
+    APIResponse,
+    get_operation,
+    get_response_event_types,
+    get_response_json,
+    is_collect_demands_request,
+)
+from goth.api_monitor.body_store import BodyStore
+from goth.api_monitor.routes import Operation
+
+
+def _response(path: str, body: bytes) -> APIResponse:
+    return APIResponse(APIRequest(1, "GET", path), 200, body)
+
+
+def test_response_body_is_decoded_and_parsed_once():
+    """Test that the body is decoded and parsed once for all accessors."""
+
+    response = _response("/market-api/v1/offers", b'"sub-1"')
+
+    with mock.patch("json.loads", wraps=json.loads) as loads:
+        assert get_response_json(response) == "sub-1"
+        assert get_response_json(response) == "sub-1"
+        assert response.json == "sub-1"
+        str(response)
+
+    assert loads.call_count == 1
+    assert response.content is response.content
+
+
+def test_response_event_types():
+    """Test extracting event types from responses with lists of API events."""
+
+    response = _response(
+        "/activity-api/v1/events?appSessionId=1",
+        b'[{"eventType": "CreateActivity"}, {"eventType": "DestroyActivity"}]',
+    )
+    assert get_response_event_types(response) == ["CreateActivity", "DestroyActivity"]
+
+    response = _response("/market-api/v1/offers", b'[{"offerId": "o-1"}]')
+    assert get_response_event_types(response) == []
+
+
+def test_predicates_use_operations():
+    """Test event predicates based on classified operations and path parameters."""
+
+    request = APIRequest(1, "GET", "/market-api/v1/offers/s1/events")
+    response = APIResponse(request, 200, b"[]")
+
+    assert get_operation(response) == Operation.COLLECT_DEMANDS
+    assert is_collect_demands_request(request)
+    assert is_collect_demands_request(request, "s1")
+    assert not is_collect_demands_request(request, "s2")
+    assert not is_collect_demands_request(response)
+
+
+def test_events_from_mitmproxy_objects():
+    """Test that events keep only the data they need from mitmproxy objects."""
+
+    http_request = HTTPRequest.make(
+        "POST",
+        "http://127.0.0.1:6000/market-api/v1/offers",
+        b'{"properties": {}}',
+        {"X-Caller": "provider:agent", "X-Callee": "provider:daemon"},
+    )
+    http_request.timestamp_start = 1.0
+    request = APIRequest.from_http(1, http_request)
+    http_response = HTTPResponse.make(201, b'"sub-1"')
+    http_response.timestamp_start = 2.0
+    response = APIResponse.from_http(request, http_response)
+
+    assert request.header_str == (
+        "provider:agent -> provider:daemon: POST /market-api/v1/offers"
+    )
+    assert request.json == {"properties": {}}
+    assert (request.timestamp, response.timestamp) == (1.0, 2.0)
+    assert response.json == "sub-1"
+    assert not hasattr(response, "__dict__")
+
+
+def test_large_bodies_are_spilled(tmp_path):
+    """Test that bodies larger than the limit are kept in the store's file."""
+
+    store = BodyStore(tmp_path / "bodies.bin", max_inline_size=8)
+    small = APIResponse(APIRequest(1, "GET", "/"), 200, b"[1]", body_store=store)
+    large = APIResponse(
+        APIRequest(2, "GET", "/"), 200, b"[1, 2, 3, 4, 5]", body_store=store
+    )
+
+    assert isinstance(small._body, bytes)
+    assert not isinstance(large._body, bytes)
+    assert (tmp_path / "bodies.bin").stat().st_size == 15
+    assert large.json == [1, 2, 3, 4, 5]
+    assert small.json == [1]
+
+    store.close()
+    with pytest.raises(ValueError):
+        large.content
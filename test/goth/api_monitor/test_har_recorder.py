@@ -0,0 +1,112 @@
+"""Tests for the `api_monitor.har_recorder` module."""
+
+import asyncio
+import gzip
+import json
+from unittest import mock
+
+from mitmproxy.test import tflow, tutils
+import pytest
+
+from goth.api_monitor.har_recorder import (
+    ArchiveFormat,
+    build_entry,
+    HarRecorder,
+    HarRecorderAddon,
+)
+from goth.api_monitor.monitor_addon import MonitorAddon
+
+TIMINGS = {"connect": -1, "send": 0.5, "wait": 12.0, "receive": 1.5}
+
+
+def _entry(response_body: bytes = b'{"ok": true}') -> dict:
+    return build_entry(
+        1614600000.0,
+        "GET",
+        "http://127.0.0.1:6001/market-api/v1/demands/s1/events?timeout=5",
+        [("X-Caller", "requestor:agent"), ("X-Callee", "requestor:daemon")],
+        b"",
+        TIMINGS,
+        status=200,
+        reason="OK",
+        response_headers=[("Content-Type", "application/json")],
+        response_body=response_body,
+    )
+
+
+def test_har_archive(tmp_path):
+    """Test that streamed entries form a valid HAR document."""
+
+    recorder = HarRecorder(tmp_path / "api.har", max_body_size=4)
+    recorder.start()
+    recorder.record(_entry())
+    recorder.record(_entry(b"\xff\xfe"))
+    recorder.stop()
+
+    har = json.loads((tmp_path / "api.har").read_text())
+    first, second = har["log"]["entries"]
+    assert har["log"]["version"] == "1.2"
+    assert first["time"] == 14.0
+    assert first["timings"]["wait"] == 12.0
+    assert first["request"]["queryString"] == [{"name": "timeout", "value": "5"}]
+    assert first["response"]["content"] == {
+        "size": 12,
+        "mimeType": "application/json",
+        "comment": "truncated",
+        "text": '{"ok',
+    }
+    assert first["_caller"] == "requestor:agent"
+    assert second["response"]["content"]["encoding"] == "base64"
+
+
+def test_compressed_jsonl_archive_from_mitmproxy_flows(tmp_path):
+    """Test recording mitmproxy flows to a gzipped JSON Lines archive."""
+
+    recorder = HarRecorder(
+        tmp_path / "api.jsonl", ArchiveFormat.JSONL, max_body_size=None, compress=True
+    )
+    addon = HarRecorderAddon(recorder)
+    recorder.start()
+    addon.response(tflow.tflow(resp=True))
+    addon.error(tflow.tflow(err=True))
+    recorder.stop()
+
+    assert recorder.path == tmp_path / "api.jsonl.gz"
+    with gzip.open(recorder.path, "rt") as f:
+        response, error = [json.loads(line) for line in f]
+
+    assert response["response"]["status"] == 200
+    assert response["timings"]["connect"] == 1000.0
+    assert response["time"] > 0
+    assert error["response"]["status"] == 0
+    assert error["_error"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_recorded_with_body(tmp_path):
+    """Test that a streamed response is recorded once its body is passed through."""
+
+    recorder = HarRecorder(tmp_path / "api.jsonl", ArchiveFormat.JSONL)
+    har_addon = HarRecorderAddon(recorder)
+    monitor_addon = MonitorAddon(mock.Mock(), har_addon=har_addon)
+    recorder.start()
+
+    flow = tflow.tflow(req=tutils.treq(path=b"/market-api/v1/demands/s1/events"))
+    monitor_addon.request(flow)
+    flow.response = tutils.tresp(content=None)
+    flow.response.timestamp_end = None
+    monitor_addon.responseheaders(flow)
+    for addon in (monitor_addon, har_addon):
+        addon.response(flow)
+
+    body = b'[{"eventType": "a"}]'
+    await asyncio.get_running_loop().run_in_executor(
+        None, lambda: list(flow.response.stream(iter([body[:5], body[5:]])))
+    )
+    await asyncio.sleep(0)
+    recorder.stop()
+
+    with open(recorder.path) as f:
+        (entry,) = [json.loads(line) for line in f]
+    assert entry["response"]["content"]["text"] == body.decode()
+    assert entry["timings"]["receive"] > 0
@@ -0,0 +1,78 @@
+"""Tests for the `api_monitor.latency` module."""
+
+import json
+
+import pytest
+
+from goth.api_monitor.api_events import APIError, APIRequest, APIResponse
+from goth.api_monitor.latency import (
+    ApiLatencyStats,
+    compare_reports,
+    LatencyHistogram,
+    load_report,
+)
+
+
+def test_histogram_percentiles():
+    """Test that percentiles are within the histogram's relative error."""
+
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+
+    assert histogram.count == 1000
+    assert histogram.percentile_ms(50) == pytest.approx(500, rel=0.01)
+    assert histogram.percentile_ms(99) == pytest.approx(990, rel=0.01)
+    assert histogram.percentile_ms(100) == 1000
+    assert len(histogram._buckets) < 600
+
+
+def _call(stats, path, latency, status=200, caller="requestor:agent"):
+    request = APIRequest(
+        1, "GET", path, caller, "requestor:daemon", b"", timestamp=100.0
+    )
+    if status:
+        event = APIResponse(request, status, b"[]", timestamp_end=100.0 + latency)
+    else:
+        event = APIError(request, "connection reset", timestamp=100.0 + latency)
+    stats.add_event(event)
+
+
+def test_stats_report(tmp_path):
+    """Test that statistics are grouped by operation, caller and callee."""
+
+    stats = ApiLatencyStats()
+    for _ in range(3):
+        _call(stats, "/market-api/v1/demands/s1/events", 0.1)
+    _call(stats, "/market-api/v1/demands/s2/events", 0.2, status=500)
+    _call(stats, "/market-api/v1/demands/s2/events", 0.2, status=0)
+    _call(stats, "/payment-api/v1/invoices", 0.01)
+
+    stats.write_report(tmp_path)
+
+    report = load_report(tmp_path)
+    collect = report[("COLLECT_OFFERS", "requestor:agent", "requestor:daemon")]
+    assert collect["count"] == 5
+    assert collect["errors"] == 2
+    assert collect["error_rate"] == 0.4
+    assert collect["p50_ms"] == pytest.approx(100, rel=0.01)
+    assert collect["response_bytes"] == 8
+    assert ("GET_INVOICES", "requestor:agent", "requestor:daemon") in report
+    assert "| COLLECT_OFFERS |" in (tmp_path / "api-latency.md").read_text()
+
+
+def test_compare_reports(tmp_path):
+    """Test detecting latency regressions between two runs."""
+
+    key = ("COLLECT_OFFERS", "requestor:agent", "requestor:daemon")
+    base = {key: {"p95_ms": 100.0}}
+
+    _lines, regressions = compare_reports(base, {key: {"p95_ms": 110.0}})
+    assert regressions == []
+
+    lines, regressions = compare_reports(base, {key: {"p95_ms": 150.0}})
+    assert regressions == [key]
+    assert "+50.0% (regression)" in lines[-1]
+
+    (tmp_path / "report.json").write_text(json.dumps({"operations": []}))
+    assert load_report(tmp_path / "report.json") == {}
@@ -0,0 +1,116 @@
+"""Tests for the `api_monitor.monitor_addon` module."""
+
+import asyncio
+import gzip
+import threading
+import time
+from unittest import mock
+
+from mitmproxy.test import tflow, tutils
+import pytest
+
+from goth.api_monitor.api_events import APIError, APIRequest, APIResponse, APIShaping
+from goth.api_monitor.monitor_addon import MonitorAddon
+from goth.api_monitor.shaping import ShapingRule, TrafficShaper
+
+
+def _registered_events(monitor: mock.Mock) -> list:
+    return [call.args[0] for call in monitor.add_event_sync.call_args_list]
+
+
+@pytest.mark.asyncio
+async def test_long_polling_response_is_streamed():
+    """Test that a long-polling response is registered once its body is streamed.
+
+    The body is streamed in another thread, as in mitmproxy, and the response
+    is registered in the event loop in which the hooks are called.
+    """
+
+    monitor = mock.Mock()
+    event_threads = set()
+    monitor.add_event_sync.side_effect = lambda _: event_threads.add(
+        threading.get_ident()
+    )
+    addon = MonitorAddon(monitor)
+    flow = tflow.tflow(req=tutils.treq(path=b"/market-api/v1/demands/s1/events"))
+    addon.request(flow)
+
+    flow.response = tutils.tresp(content=None)
+    flow.response.headers["content-encoding"] = "gzip"
+    addon.responseheaders(flow)
+    addon.response(flow)
+    assert flow.response.stream
+    assert len(_registered_events(monitor)) == 1
+
+    body = gzip.compress(b'[{"eventType": "a"}]')
+    chunks = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: list(flow.response.stream(iter([body[:5], body[5:]])))
+    )
+    assert b"".join(chunks) == body
+    await asyncio.sleep(0)
+    assert event_threads == {threading.get_ident()}
+
+    request, response = _registered_events(monitor)
+    assert isinstance(request, APIRequest)
+    assert isinstance(response, APIResponse)
+    assert response.request is request
+    assert response.streamed
+    assert response.json == [{"eventType": "a"}]
+
+
+def test_other_responses_are_not_streamed():
+    """Test that responses to other requests are registered by the `response` hook."""
+
+    monitor = mock.Mock()
+    addon = MonitorAddon(monitor)
+    flow = tflow.tflow(req=tutils.treq(path=b"/market-api/v1/offers"), resp=True)
+    addon.request(flow)
+    addon.responseheaders(flow)
+    assert not flow.response.stream
+    addon.response(flow)
+
+    _request, response = _registered_events(monitor)
+    assert not response.streamed
+
+
+def test_shaped_failure_is_not_forwarded():
+    """Test that a shaped failure sets the response in the `request` hook."""
+
+    monitor = mock.Mock()
+    shaper = TrafficShaper([ShapingRule(failure_rate=1.0, failure_status=500)])
+    addon = MonitorAddon(monitor, shaper=shaper)
+    flow = tflow.tflow(req=tutils.treq(path=b"/market-api/v1/offers"))
+    addon.request(flow)
+    assert flow.response.status_code == 500
+    assert not flow.intercepted
+    addon.response(flow)
+
+    _request, shaping, response = _registered_events(monitor)
+    assert isinstance(shaping, APIShaping)
+    assert response.status_code == 500
+
+
+def test_killed_and_expired_requests_get_errors():
+    """Test that error events are registered for killed and timed out requests."""
+
+    monitor = mock.Mock()
+    addon = MonitorAddon(monitor, request_timeout=10)
+    killed = tflow.tflow()
+    killed.kill()
+    addon.request(killed)
+    hung = tflow.tflow()
+    hung.request.timestamp_start = time.time() - 60
+    addon.request(hung)
+    assert len(addon.pending_requests) == 1
+
+    addon.request(tflow.tflow())
+
+    killed_request, killed_error, hung_request, hung_error, _ = _registered_events(
+        monitor
+    )
+    assert isinstance(killed_error, APIError)
+    assert killed_error.request is killed_request
+    assert hung_error.request is hung_request
+    assert hung_error.message.startswith("timeout: no response after 60")
+    assert len(addon.pending_requests) == 1
+    assert addon.pending_requests.num_expired == 1
@@ -0,0 +1,74 @@
+"""Tests for the `api_monitor.pending_requests` module."""
+
+import threading
+
+from goth.api_monitor.api_events import APIRequest
+from goth.api_monitor.pending_requests import PendingRequests
+from goth.api_monitor.routes import Operation
+
+
+def _request(path: str, timestamp: float) -> APIRequest:
+    return APIRequest(1, "GET", path, timestamp=timestamp)
+
+
+def test_requests_expire_by_deadline():
+    """Test that requests expire in the order of deadlines of their operations."""
+
+    pending: PendingRequests[str] = PendingRequests(
+        default_timeout=10, timeouts={Operation.COLLECT_OFFERS: 60}
+    )
+    collect = _request("/market-api/v1/demands/s1/events", 0)
+    offers = _request("/market-api/v1/offers", 5)
+    pending.add("collect", collect)
+    pending.add("offers", offers)
+    pending.add("done", _request("/market-api/v1/offers", 0))
+    assert pending.pop("done")
+
+    assert pending.expire(14) == []
+    assert pending.expire(15) == [("offers", offers)]
+    assert pending.get("collect") is collect
+    assert pending.expire(100) == [("collect", collect)]
+    assert len(pending) == 0
+    assert pending.max_in_flight == 3
+    assert pending.num_expired == 2
+
+
+def test_heap_of_deadlines_stays_bounded():
+    """Test that entries of completed requests are removed from the heap."""
+
+    pending: PendingRequests[int] = PendingRequests()
+    for n in range(1000):
+        pending.add(n, _request("/market-api/v1/offers", n))
+        pending.pop(n)
+
+    assert len(pending._deadlines) <= 2 * len(pending) + 65
+
+
+def test_expire_racing_with_pop():
+    """Test that a request popped by another thread while expiring isn't popped."""
+
+    pending: PendingRequests[str] = PendingRequests(default_timeout=10)
+    request = _request("/market-api/v1/offers", 0)
+    pending.add("r", request)
+    popped = []
+    threads = []
+
+    class _RacingDict(dict):
+        """Pops the request in another thread when `expire()` looks it up."""
+
+        def get(self, key, default=None):
+            entry = super().get(key, default)
+            thread = threading.Thread(target=lambda: popped.append(pending.pop(key)))
+            thread.start()
+            # Without locking, the pop completes before `expire()` deletes the entry
+            thread.join(0.1)
+            threads.append(thread)
+            return entry
+
+    pending._requests = _RacingDict(pending._requests)
+    assert pending.expire(100) == [("r", request)]
+    for thread in threads:
+        thread.join()
+
+    assert popped == [None]
+    assert len(pending) == 0
@@ -0,0 +1,177 @@
+"""Tests for the in-loop reverse proxy and the routing rules used by both engines."""
+
+import asyncio
+
+import aiohttp
+from aiohttp import web
+import pytest
+
+from goth.address import YAGNA_REST_PORT
+from goth.api_monitor.api_events import APIError, APIRequest, APIResponse
+from goth.api_monitor.reverse_proxy import ReverseProxyServer
+from goth.api_monitor.router_addon import route_request, RoutingTable
+from goth.assertions.monitor import EventMonitor
+
+NODE_ADDR = "172.19.0.3"
+NODE_NAMES = {NODE_ADDR: "provider"}
+
+
+def _headers(server_port: int) -> dict:
+    return {
+        "X-Server-Addr": "172.19.0.2",
+        "X-Server-Port": str(server_port),
+        "X-Remote-Addr": NODE_ADDR,
+    }
+
+
+def test_route_request():
+    """Test routing of requests made by provider and requestor agents."""
+
+    ports = {NODE_ADDR: {YAGNA_REST_PORT: 6042}}
+
+    route = route_request(_headers(YAGNA_REST_PORT), NODE_NAMES, ports)
+    assert route == ("127.0.0.1", 6042, "provider:agent", "provider:daemon")
+
+    route = route_request(_headers(6010), NODE_NAMES, ports)
+    assert route.port == 6010
+
+    with pytest.raises(ValueError):
+        route_request(_headers(80), NODE_NAMES, ports)
+    with pytest.raises(KeyError):
+        route_request({"X-Server-Port": "6010"}, NODE_NAMES, ports)
+
+
+def test_routing_table_updates():
+    """Test registering and unregistering nodes in a routing table."""
+
+    updates = []
+    table = RoutingTable({"172.19.0.2": "requestor"})
+    table.add_listener(lambda *update: updates.append(update))
+    node_names = table.node_names
+
+    table.register(NODE_ADDR, "provider", {YAGNA_REST_PORT: 6042})
+    assert table.route(_headers(YAGNA_REST_PORT)).port == 6042
+    assert NODE_ADDR not in node_names
+
+    table.unregister(NODE_ADDR)
+    table.unregister(NODE_ADDR)
+    with pytest.raises(KeyError):
+        table.route(_headers(YAGNA_REST_PORT))
+    assert updates == [
+        (NODE_ADDR, "provider", {YAGNA_REST_PORT: 6042}),
+        (NODE_ADDR, None, None),
+    ]
+
+
+async def _start_daemon(port: int) -> web.AppRunner:
+    """Start a fake daemon API server which echoes the request and its headers."""
+
+    async def _echo(request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "path": request.path_qs,
+                "body": await request.text(),
+                "callee": request.headers.get("X-Callee"),
+            },
+            status=201,
+        )
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", _echo)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+@pytest.mark.asyncio
+async def test_reverse_proxy_forwards_and_registers_events(unused_tcp_port_factory):
+    """Test that API calls are forwarded to daemons and added to the monitor."""
+
+    daemon_port = unused_tcp_port_factory()
+    daemon = await _start_daemon(daemon_port)
+    monitor = EventMonitor("rest")
+    monitor.start()
+    proxy = ReverseProxyServer(
+        monitor, RoutingTable(NODE_NAMES, {NODE_ADDR: {YAGNA_REST_PORT: daemon_port}})
+    )
+    proxy_port = unused_tcp_port_factory()
+    await proxy.start("127.0.0.1", proxy_port)
+
+    async with aiohttp.ClientSession(headers=_headers(YAGNA_REST_PORT)) as session:
+        url = f"http://127.0.0.1:{proxy_port}/market-api/v1/offers?timeout=5"
+        async with session.post(url, data=b"offer") as resp:
+            assert resp.status == 201
+            assert await resp.json() == {
+                "path": "/market-api/v1/offers?timeout=5",
+                "body": "offer",
+                "callee": "provider:daemon",
+            }
+        async with session.get(url, headers={"X-Server-Port": "80"}) as resp:
+            assert resp.status == 502
+
+    await proxy.stop()
+    await daemon.cleanup()
+    await monitor.stop()
+
+    request, response, invalid_request, error = monitor._events
+    assert isinstance(request, APIRequest)
+    assert request.header_str == (
+        "provider:agent -> provider:daemon: POST /market-api/v1/offers?timeout=5"
+    )
+    assert request.content == "offer"
+    assert isinstance(response, APIResponse)
+    assert response.request is request
+    assert response.status_code == 201
+    assert isinstance(invalid_request, APIRequest)
+    assert isinstance(error, APIError)
+    assert error.request is invalid_request
+
+
+@pytest.mark.asyncio
+async def test_reverse_proxy_streams_long_polling_responses(unused_tcp_port_factory):
+    """Test that chunks of a long-polling response reach the client as they arrive."""
+
+    first_chunk_received = asyncio.Event()
+
+    async def _collect(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b'[{"eventType": "a"}')
+        await asyncio.wait_for(first_chunk_received.wait(), 5)
+        await response.write(b', {"eventType": "b"}]')
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/market-api/v1/demands/{sub_id}/events", _collect)
+    daemon = web.AppRunner(app)
+    await daemon.setup()
+    daemon_port = unused_tcp_port_factory()
+    await web.TCPSite(daemon, "127.0.0.1", daemon_port).start()
+
+    monitor = EventMonitor("rest")
+    monitor.start()
+    proxy = ReverseProxyServer(
+        monitor, RoutingTable(NODE_NAMES, {NODE_ADDR: {YAGNA_REST_PORT: daemon_port}})
+    )
+    proxy_port = unused_tcp_port_factory()
+    await proxy.start("127.0.0.1", proxy_port)
+
+    async with aiohttp.ClientSession(headers=_headers(YAGNA_REST_PORT)) as session:
+        url = f"http://127.0.0.1:{proxy_port}/market-api/v1/demands/s1/events"
+        async with session.get(url) as resp:
+            first = await resp.content.readany()
+            first_chunk_received.set()
+            rest = await resp.content.read()
+
+    await proxy.stop()
+    await daemon.cleanup()
+    await monitor.stop()
+
+    assert first == b'[{"eventType": "a"}'
+    _request, response = monitor._events
+    assert isinstance(response, APIResponse)
+    assert response.streamed
+    assert response.json == [{"eventType": "a"}, {"eventType": "b"}]
+    assert first + rest == response.body
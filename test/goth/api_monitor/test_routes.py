@@ -0,0 +1,50 @@
+"""Tests for the `api_monitor.routes` module."""
+
+import pytest
+
+from goth.api_monitor.routes import classify_request, Operation
+
+
+@pytest.mark.parametrize(
+    "method, path, operation, params",
+    [
+        ("POST", "/market-api/v1/offers", Operation.SUBSCRIBE_OFFER, {}),
+        (
+            "GET",
+            "/market-api/v1/offers/sub-1/events?timeout=5&maxEvents=10",
+            Operation.COLLECT_DEMANDS,
+            {"subscription_id": "sub-1"},
+        ),
+        (
+            "POST",
+            "/market-api/v1/demands/sub-2/proposals/prop-1/reject",
+            Operation.REJECT_PROPOSAL_OFFER,
+            {"subscription_id": "sub-2", "proposal_id": "prop-1"},
+        ),
+        (
+            "GET",
+            "/activity-api/v1/activity/act-1/exec/batch-1",
+            Operation.GET_EXEC_BATCH_RESULTS,
+            {"activity_id": "act-1", "batch_id": "batch-1"},
+        ),
+        (
+            "POST",
+            "/payment-api/v1/provider/invoices/inv-1/send",
+            Operation.SEND_INVOICE,
+            {"invoice_id": "inv-1"},
+        ),
+        (
+            "POST",
+            "/payment-api/v1/invoices/inv-1/send",
+            Operation.SEND_INVOICE,
+            {"invoice_id": "inv-1"},
+        ),
+        ("GET", "/payment-api/v1/requestor/accounts", Operation.GET_ACCOUNTS, {}),
+        ("PUT", "/market-api/v1/offers", Operation.UNKNOWN, {}),
+        ("GET", "/market-api/v1/offers/sub-1/other", Operation.UNKNOWN, {}),
+    ],
+)
+def test_classify_request(method, path, operation, params):
+    """Test classification of API calls and extraction of path parameters."""
+
+    assert classify_request(method, path) == (operation, params)
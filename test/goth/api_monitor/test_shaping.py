@@ -0,0 +1,106 @@
+"""Tests for the `api_monitor.shaping` module."""
+
+import aiohttp
+import pytest
+
+from goth.address import YAGNA_REST_PORT
+from goth.api_monitor.api_events import APIRequest, APIResponse, APIShaping
+from goth.api_monitor.reverse_proxy import ReverseProxyServer
+from goth.api_monitor.router_addon import RoutingTable
+from goth.api_monitor.routes import Operation
+from goth.api_monitor.shaping import LatencyDistribution, ShapingRule, TrafficShaper
+from goth.assertions.monitor import EventMonitor
+from test.goth.api_monitor.test_reverse_proxy import (
+    _headers,
+    _start_daemon,
+    NODE_ADDR,
+    NODE_NAMES,
+)
+
+
+def _request(caller: str = "provider-1:agent", path: str = "/market-api/v1/offers"):
+    return APIRequest(1, "GET", path, caller, "provider-1:daemon")
+
+
+def test_most_recent_matching_rule_applies():
+    """Test that rules are matched by caller, callee and operation."""
+
+    shaper = TrafficShaper()
+    assert shaper.decide(_request()) is None
+
+    shaper.add_rule(ShapingRule(caller="provider-*", latency=0.5))
+    invoices = shaper.add_rule(
+        ShapingRule(
+            callee="provider-1:*",
+            operations={Operation.GET_INVOICES},
+            latency=2.0,
+            bandwidth=1000,
+        )
+    )
+
+    assert shaper.decide(_request()).delay == 0.5
+    shaping = shaper.decide(_request(path="/payment-api/v1/invoices"))
+    assert shaping.delay == 2.0
+    assert shaping.transfer_time(500) == 0.5
+    assert shaper.decide(_request(caller="requestor:agent")) is None
+
+    shaper.remove_rule(invoices)
+    assert shaper.decide(_request(path="/payment-api/v1/invoices")).delay == 0.5
+
+
+@pytest.mark.parametrize("distribution", list(LatencyDistribution))
+def test_delays_are_reproducible(distribution):
+    """Test that delays depend only on the seed and have the expected mean."""
+
+    rule = ShapingRule(latency=0.1, jitter=0.05, distribution=distribution)
+    delays = [
+        [TrafficShaper([rule], seed=1).decide(_request()).delay for _ in range(3)]
+        for _ in range(2)
+    ]
+    assert delays[0] == delays[1]
+
+    shaper = TrafficShaper([rule], seed=2)
+    samples = [shaper.decide(_request()).delay for _ in range(2000)]
+    assert min(samples) >= 0
+    assert sum(samples) / len(samples) == pytest.approx(0.1, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_reverse_proxy_shaping(unused_tcp_port_factory):
+    """Test that shaped failures are registered and not forwarded to the daemon."""
+
+    daemon_port = unused_tcp_port_factory()
+    daemon = await _start_daemon(daemon_port)
+    monitor = EventMonitor("rest")
+    monitor.start()
+    shaper = TrafficShaper()
+    proxy = ReverseProxyServer(
+        monitor,
+        RoutingTable(NODE_NAMES, {NODE_ADDR: {YAGNA_REST_PORT: daemon_port}}),
+        shaper=shaper,
+    )
+    proxy_port = unused_tcp_port_factory()
+    await proxy.start("127.0.0.1", proxy_port)
+
+    url = f"http://127.0.0.1:{proxy_port}/market-api/v1/offers"
+    async with aiohttp.ClientSession(headers=_headers(YAGNA_REST_PORT)) as session:
+        rule = shaper.add_rule(ShapingRule(latency=0.01, failure_rate=1.0))
+        async with session.get(url) as resp:
+            assert resp.status == 503
+        shaper.remove_rule(rule)
+        async with session.get(url) as resp:
+            assert resp.status == 201
+
+    await proxy.stop()
+    await daemon.cleanup()
+    await monitor.stop()
+
+    request, shaping, response, *other = monitor._events
+    assert isinstance(shaping, APIShaping)
+    assert shaping.request is request
+    assert shaping.failure_status == 503
+    assert str(shaping).endswith("delay=0.010s, failure_status=503")
+    assert isinstance(response, APIResponse)
+    assert response.status_code == 503
+    assert response.timestamp - request.timestamp >= 0.01
+    assert [type(e) for e in other] == [APIRequest, APIResponse]
@@ -0,0 +1,154 @@
+"""Tests for the `api_monitor.sharded_proxy` module."""
+
+import asyncio
+import queue
+from unittest import mock
+
+import aiohttp
+import pytest
+
+from goth.address import YAGNA_REST_PORT
+from goth.api_monitor.api_events import APIRequest, APIResponse, APIShaping
+from goth.api_monitor.latency import ApiLatencyStats
+from goth.api_monitor.router_addon import RoutingTable
+from goth.api_monitor.shaping import ShapingRule, TrafficShaper
+from goth.api_monitor.sharded_proxy import (
+    _apply_routing_updates,
+    _apply_shaping_updates,
+    ShardedProxyServer,
+)
+from goth.assertions.monitor import EventMonitor
+from test.goth.api_monitor.test_reverse_proxy import (
+    _headers,
+    _start_daemon,
+    NODE_ADDR,
+    NODE_NAMES,
+)
+
+
+@pytest.mark.asyncio
+async def test_sharded_proxy_registers_events_in_main_process(
+    unused_tcp_port_factory,
+):
+    """Test that events from worker processes are numbered and linked in order."""
+
+    daemon_port = unused_tcp_port_factory()
+    daemon = await _start_daemon(daemon_port)
+    monitor = EventMonitor("rest")
+    monitor.start()
+    latency_stats = ApiLatencyStats()
+    proxy = ShardedProxyServer(
+        monitor,
+        RoutingTable(NODE_NAMES, {NODE_ADDR: {YAGNA_REST_PORT: daemon_port}}),
+        num_workers=2,
+        latency_stats=latency_stats,
+    )
+    proxy_port = unused_tcp_port_factory()
+    await proxy.start("127.0.0.1", proxy_port)
+
+    async def _call(session: aiohttp.ClientSession, n: int) -> None:
+        url = f"http://127.0.0.1:{proxy_port}/payment-api/v1/invoices/{n}"
+        async with session.get(url) as resp:
+            assert resp.status == 201
+
+    try:
+        for _ in range(2):
+            # Each session uses its own connections, possibly handled by both workers
+            async with aiohttp.ClientSession(
+                headers=_headers(YAGNA_REST_PORT)
+            ) as session:
+                await asyncio.gather(*(_call(session, n) for n in range(5)))
+    finally:
+        await proxy.stop()
+        await daemon.cleanup()
+        await monitor.stop()
+
+    requests = [e for e in monitor._events if isinstance(e, APIRequest)]
+    responses = [e for e in monitor._events if isinstance(e, APIResponse)]
+    assert [r.number for r in requests] == list(range(1, 11))
+    assert {id(r.request) for r in responses} == {id(r) for r in requests}
+    for response in responses:
+        assert monitor._events.index(response) > monitor._events.index(response.request)
+        assert response.json["callee"] == "provider:daemon"
+    assert (
+        latency_stats.summary()[("GET_INVOICE", "provider:agent", "provider:daemon")][
+            "count"
+        ]
+        == 10
+    )
+
+
+def test_routing_updates_are_sent_to_workers():
+    """Test that routing table updates reach the routing tables of the workers."""
+
+    table = RoutingTable(NODE_NAMES)
+    proxy = ShardedProxyServer(mock.Mock(), table, num_workers=1)
+    updates: queue.Queue = queue.Queue()
+    proxy._updates = [updates]
+    table.add_listener(proxy._send_routing_update)
+
+    table.register("172.19.0.4", "provider-2", {YAGNA_REST_PORT: 6044})
+    table.unregister(NODE_ADDR)
+    updates.put(None)
+
+    worker_table = RoutingTable(NODE_NAMES)
+    _apply_routing_updates(updates, worker_table)
+    assert worker_table.node_names == {"172.19.0.4": "provider-2"}
+    assert worker_table.ports == {"172.19.0.4": {YAGNA_REST_PORT: 6044}}
+
+
+@pytest.mark.asyncio
+async def test_sharded_proxy_applies_shaping_rules(unused_tcp_port_factory):
+    """Test that shaping rules added while the proxy runs are applied by workers."""
+
+    daemon_port = unused_tcp_port_factory()
+    daemon = await _start_daemon(daemon_port)
+    monitor = EventMonitor("rest")
+    monitor.start()
+    shaper = TrafficShaper()
+    proxy = ShardedProxyServer(
+        monitor,
+        RoutingTable(NODE_NAMES, {NODE_ADDR: {YAGNA_REST_PORT: daemon_port}}),
+        num_workers=2,
+        shaper=shaper,
+    )
+    proxy_port = unused_tcp_port_factory()
+    await proxy.start("127.0.0.1", proxy_port)
+    url = f"http://127.0.0.1:{proxy_port}/payment-api/v1/invoices/1"
+
+    try:
+        shaper.add_rule(ShapingRule(failure_rate=1.0, failure_status=500))
+        # Let the workers apply the update
+        await asyncio.sleep(0.5)
+        async with aiohttp.ClientSession(headers=_headers(YAGNA_REST_PORT)) as session:
+            async with session.get(url) as resp:
+                assert resp.status == 500
+    finally:
+        await proxy.stop()
+        await daemon.cleanup()
+        await monitor.stop()
+
+    request, shaping, response = monitor._events
+    assert isinstance(shaping, APIShaping)
+    assert shaping.request is request
+    assert shaping.failure_status == 500
+    assert response.status_code == 500
+
+
+def test_shaping_updates_are_sent_to_workers():
+    """Test that changes of shaping rules reach the shapers of the workers."""
+
+    shaper = TrafficShaper()
+    proxy = ShardedProxyServer(mock.Mock(), RoutingTable(), 1, shaper=shaper)
+    updates: queue.Queue = queue.Queue()
+    proxy._shaping_updates = [updates]
+    shaper.add_listener(proxy._send_shaping_update)
+
+    rule = shaper.add_rule(ShapingRule(latency=1.0))
+    shaper.add_rule(ShapingRule(latency=2.0))
+    shaper.remove_rule(rule)
+    updates.put(None)
+
+    worker_shaper = TrafficShaper()
+    _apply_shaping_updates(updates, worker_shaper)
+    assert worker_shaper.rules == (ShapingRule(latency=2.0),)
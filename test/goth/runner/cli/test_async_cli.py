@@ -0,0 +1,44 @@
+"""Tests for the `runner.cli.async_cli` module."""
+
+import asyncio
+import threading
+
+import pytest
+
+from goth.runner.cli import Cli
+from goth.runner.exceptions import KeyAlreadyExistsError
+
+
+@pytest.mark.asyncio
+async def test_commands_run_as_coroutines(yagna_container):
+    """Test that async commands return the same results as the sync ones."""
+
+    cli = Cli(yagna_container)
+
+    key = await cli.yagna_async.app_key_create("test key")
+    keys = await cli.yagna_async.app_key_list()
+    assert [k.key for k in keys] == [key]
+    assert cli.yagna.app_key_list() == keys
+
+    with pytest.raises(KeyAlreadyExistsError):
+        await cli.yagna_async.app_key_create("test key")
+
+
+@pytest.mark.asyncio
+async def test_commands_run_in_parallel(yagna_container, mock_yagna_cli):
+    """Test that commands called concurrently don't wait for each other."""
+
+    num_commands = 4
+    barrier = threading.Barrier(num_commands, timeout=5)
+    exec_run = mock_yagna_cli.exec_run
+
+    def _exec_run(*args, **kwargs):
+        # Blocks until all commands are running, unless they run in parallel
+        barrier.wait()
+        return exec_run(*args, **kwargs)
+
+    yagna_container._container.exec_run = _exec_run
+    yagna = Cli(yagna_container).yagna_async
+
+    results = await asyncio.gather(*(yagna.id_list() for _ in range(num_commands)))
+    assert len(results) == num_commands
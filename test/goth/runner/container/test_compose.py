@@ -0,0 +1,75 @@
+"""Tests for ready checks performed by `ComposeNetworkManager`."""
+
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from goth.runner.container.compose import ComposeConfig, ComposeNetworkManager
+from goth.runner.container.readiness import ComposeService, ReadinessProbe
+from goth.runner.exceptions import TimeoutError
+
+
+class SleepProbe(ReadinessProbe):
+    """A probe that reports the service ready after a given delay."""
+
+    def __init__(self, delay: float, timeout: float = 1.0):
+        super().__init__(timeout)
+        self.delay = delay
+
+    async def wait_until_ready(self, service: ComposeService) -> None:
+        """Sleep for `self.delay` seconds."""
+        await asyncio.sleep(self.delay)
+
+
+def _manager(probes) -> ComposeNetworkManager:
+    config = ComposeConfig(MagicMock(), MagicMock(), {}, probes)
+    manager = ComposeNetworkManager(MagicMock(), config)
+    manager._services = {
+        name: ComposeService(name, MagicMock(), MagicMock()) for name in probes
+    }
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_ready_checks_run_concurrently():
+    """Test that the total wait time is that of the slowest service."""
+
+    manager = _manager({f"service_{n}": SleepProbe(0.2) for n in range(5)})
+
+    start = time.monotonic()
+    await manager._wait_for_containers()
+
+    assert time.monotonic() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_ready_check_timeouts_are_reported():
+    """Test that services not ready within their own timeout are reported."""
+
+    manager = _manager(
+        {
+            "fast": SleepProbe(0.0),
+            "slow": SleepProbe(1.0, timeout=0.1),
+            "slower": SleepProbe(1.0, timeout=0.2),
+        }
+    )
+
+    with pytest.raises(TimeoutError, match="slow, slower"):
+        await manager._wait_for_containers()
+
+
+def test_readiness_probes_override_log_patterns():
+    """Test that readiness probes take precedence over log patterns."""
+
+    probe = SleepProbe(0.0)
+    config = ComposeConfig(
+        MagicMock(), MagicMock(), {"ethereum": "ready", "zksync": "ready"}
+    )
+    config.readiness_probes["zksync"] = probe
+
+    checks = config.ready_checks
+
+    assert checks["zksync"] is probe
+    assert checks["ethereum"].pattern == "ready"
@@ -0,0 +1,82 @@
+"""Tests for running activities for many agreements concurrently."""
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from ya_activity import ExeScriptCommandResult
+
+from goth.runner.probe.activities import ParallelActivities
+
+
+def _result(index, is_batch_finished=False):
+    return ExeScriptCommandResult(
+        index=index,
+        event_date=datetime.now(timezone.utc),
+        result="Ok",
+        is_batch_finished=is_batch_finished,
+    )
+
+
+def _requestor(num_results, fail_activity=None):
+    """Return a requestor mock which produces a result every 10 ms."""
+
+    async def _get_exec_batch_results(activity_id, _batch_id, command_index, timeout):
+        if activity_id == fail_activity:
+            raise ValueError(activity_id)
+        await asyncio.sleep(0.01)
+        return [
+            _result(i, i == num_results - 1)
+            for i in range(min(command_index + 1, num_results))
+        ]
+
+    requestor = MagicMock()
+    requestor.create_activity = AsyncMock(side_effect=lambda a: f"activity-{a}")
+    requestor.call_exec = AsyncMock(return_value="batch")
+    requestor.destroy_activity = AsyncMock()
+    requestor.api.activity.control.get_exec_batch_results = _get_exec_batch_results
+    return requestor
+
+
+def _provider(name):
+    provider = MagicMock()
+    provider.name = name
+    provider.wait_for_exeunit_started = AsyncMock()
+    provider.wait_for_exeunit_finished = AsyncMock()
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_results_streamed():
+    """Test that results of concurrent activities are streamed as they arrive."""
+
+    agreements = [("a1", _provider("p1")), ("a2", _provider("p2"))]
+    activities = ParallelActivities(_requestor(3), agreements, "[]", 3)
+
+    streamed = [(run.agreement_id, r.index) async for run, r in activities.results()]
+
+    # Results from both activities are interleaved
+    assert streamed[:2] in ([("a1", 0), ("a2", 0)], [("a2", 0), ("a1", 0)])
+    assert sorted(streamed) == [(a, i) for a in ("a1", "a2") for i in range(3)]
+    for run in activities.runs:
+        assert run.activity_id == f"activity-{run.agreement_id}"
+        assert len(run.results) == 3
+        assert list(run.phase_times) == [
+            "create",
+            "first_result",
+            "complete",
+            "destroy",
+        ]
+        run.provider.wait_for_exeunit_finished.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_run_raises():
+    """Test that an error in one of the activities is raised."""
+
+    agreements = [("a1", _provider("p1")), ("a2", _provider("p2"))]
+    requestor = _requestor(3, fail_activity="activity-a2")
+    activities = ParallelActivities(requestor, agreements, "[]", 3)
+
+    with pytest.raises(ValueError):
+        await activities.run()
@@ -0,0 +1,145 @@
+"""Tests for starting probe agents."""
+import asyncio
+import os
+import shlex
+import subprocess
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from goth.runner.exceptions import CommandError
+from goth.runner.log import LogConfig
+from goth.runner.probe import Probe
+from goth.runner.probe.agent import ProviderAgentComponent
+
+PROVIDER_LOG_LINES = [
+    "[2021-03-01T12:00:00Z INFO  ya_provider] Starting ya-provider",
+    "[2021-03-01T12:00:01Z INFO  ya_provider::market] Subscribed offer. id=1",
+]
+
+
+def _create_agent(tmp_path, config_exit_code=0) -> ProviderAgentComponent:
+    probe = MagicMock()
+    probe.name = "provider_1"
+    probe.app_key = "key"
+    probe.container.log_config = LogConfig("probe", base_dir=tmp_path)
+    probe.container.log_ingestion_policy = None
+    probe.container.json_logs = False
+
+    def _exec_run(cmd, stream=False):
+        if stream:
+            return MagicMock(output=iter(["\n".join(PROVIDER_LOG_LINES).encode()]))
+        return MagicMock(exit_code=config_exit_code, output=b"")
+
+    probe.container.exec_run.side_effect = _exec_run
+    return ProviderAgentComponent(probe, "subnet", agent_preset="wasmtime")
+
+
+@pytest.mark.asyncio
+async def test_provider_agent_configured_with_single_exec(tmp_path):
+    """Test that the provider agent is configured with a single command."""
+
+    agent = _create_agent(tmp_path)
+    await agent.start()
+    await agent.stop()
+
+    calls = agent.probe.container.exec_run.call_args_list
+    assert len(calls) == 2
+    config_cmd = calls[0].args[0]
+    assert config_cmd.startswith("sh -c ")
+    assert "ya-provider preset activate wasmtime" in config_cmd
+    assert "ya-provider config set --subnet subnet" in config_cmd
+    assert calls[1].args[0].startswith("ya-provider run")
+
+
+@pytest.mark.asyncio
+async def test_provider_agent_config_error(tmp_path):
+    """Test that a failure to configure the provider agent is raised."""
+
+    agent = _create_agent(tmp_path, config_exit_code=1)
+    with pytest.raises(CommandError):
+        await agent.start()
+
+
+@pytest.mark.asyncio
+async def test_provider_agent_preset_error(tmp_path):
+    """Test that a failure to activate the preset is raised."""
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ya_provider = bin_dir / "ya-provider"
+    # Fails to activate a preset, succeeds with other commands
+    ya_provider.write_text('#!/bin/sh\n[ "$1" = preset ] && exit 3\nexit 0\n')
+    ya_provider.chmod(0o755)
+    env = {"PATH": f"{bin_dir}:{os.environ['PATH']}"}
+
+    agent = _create_agent(tmp_path)
+    agent.probe.container.exec_run.side_effect = lambda cmd: MagicMock(
+        exit_code=subprocess.run(shlex.split(cmd), env=env).returncode, output=b""
+    )
+    with pytest.raises(CommandError, match="exit_code=3"):
+        await agent.start()
+
+
+@pytest.mark.asyncio
+async def test_provider_agent_ready(tmp_path):
+    """Test that waiting for readiness doesn't consume the matching log line."""
+
+    agent = _create_agent(tmp_path)
+    await agent.start()
+
+    await agent.wait_until_ready(timeout=1)
+    await agent.wait_until_ready(timeout=1)
+    entry = await agent.wait_for_log("Subscribed offer", timeout=1)
+    assert entry.message == "Subscribed offer. id=1"
+    await agent.stop()
+
+
+@pytest.mark.asyncio
+async def test_provider_agent_stopped_before_ready(tmp_path):
+    """Test that waiting for an agent which logged no offer fails after it stops."""
+
+    agent = _create_agent(tmp_path)
+    agent.READY_PATTERN = "Never logged"
+    await agent.start()
+    await agent.stop()
+
+    with pytest.raises(RuntimeError):
+        await agent.wait_until_ready(timeout=1)
+    assert not agent.log_monitor.failed
+
+
+@pytest.mark.asyncio
+async def test_provider_agent_ready_timeout(tmp_path):
+    """Test that a timed out wait for readiness doesn't fail the log monitor."""
+
+    agent = _create_agent(tmp_path)
+    agent.READY_PATTERN = "Never logged"
+    await agent.start()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await agent.wait_until_ready(timeout=0.1)
+    await agent.stop()
+    assert not agent.log_monitor.failed
+
+
+@pytest.mark.asyncio
+async def test_agents_start_concurrently():
+    """Test that a probe's agents start concurrently."""
+
+    running = 0
+    max_running = 0
+
+    class _Agent:
+        async def start(self):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    probe = SimpleNamespace(agents=[_Agent(), _Agent(), _Agent()])
+    await Probe.start_agents(probe)
+
+    assert max_running == 3
@@ -0,0 +1,55 @@
+"""Tests for caching the identity and the app key of a probe."""
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import goth.runner.probe
+from goth.runner.cli.yagna_app_key_cmd import AppKeyInfo
+from goth.runner.cli.yagna_id_cmd import Identity
+from goth.runner.container.yagna import YagnaContainerConfig
+from goth.runner.probe import Probe, RequestorProbe
+
+IDENTITY = Identity(None, True, False, "0xdeadbeef")
+
+
+@pytest.mark.asyncio
+async def test_identity_cached(monkeypatch):
+    """Test that the address and the app key are only read when starting."""
+
+    monkeypatch.setattr(goth.runner.probe, "Cli", MagicMock())
+    monkeypatch.setattr(
+        goth.runner.probe, "get_container_address", lambda *_args: "1.2.3.4"
+    )
+    monkeypatch.setattr(Probe, "_setup_gftp_proxy", lambda _self, config: config)
+
+    config = MagicMock(spec=YagnaContainerConfig)
+    config.name = "probe"
+    config.environment = {}
+    config.volumes = {}
+    config.privileged_mode = False
+    config.payment_id = None
+    probe = RequestorProbe(MagicMock(), MagicMock(), config, log_config=None)
+    probe.async_cli = AsyncMock()
+    probe.async_cli.app_key_create.return_value = "0xcafebabe"
+    probe.async_cli.id_show.return_value = IDENTITY
+    probe.cli.id_show.return_value = IDENTITY
+    probe.cli.app_key_list.return_value = [
+        AppKeyInfo("test_key", "0xcafebabe", "0xdeadbeef", "manager", "")
+    ]
+
+    probe.container._container.status = "created"
+    await probe._start_container()
+
+    for _ in range(3):
+        assert probe.address == "0xdeadbeef"
+        assert probe.app_key == "0xcafebabe"
+    probe.cli.id_show.assert_not_called()
+    probe.cli.app_key_list.assert_not_called()
+
+    probe.container._container.status = "running"
+    probe.container.restart()
+
+    for _ in range(3):
+        assert probe.address == "0xdeadbeef"
+        assert probe.app_key == "0xcafebabe"
+    assert probe.cli.id_show.call_count == 1
+    assert probe.cli.app_key_list.call_count == 1
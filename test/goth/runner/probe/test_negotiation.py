@@ -0,0 +1,99 @@
+"""Tests for negotiating agreements with many providers concurrently."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from ya_market import Proposal, ProposalEvent
+
+from goth.runner.probe.negotiation import negotiate_agreements
+
+
+def _proposal(issuer_id, proposal_id, prev_proposal_id=None):
+    proposal = MagicMock(spec=Proposal)
+    proposal.issuer_id = issuer_id
+    proposal.proposal_id = proposal_id
+    proposal.prev_proposal_id = prev_proposal_id
+    return ProposalEvent(proposal=proposal)
+
+
+class _Market:
+    """Market API returning proposals from providers, and their responses."""
+
+    def __init__(self, provider_ids):
+        self.events = [_proposal(p, f"initial-{p}") for p in provider_ids]
+        self.num_collect_calls = 0
+
+    async def collect_offers(self, _subscription_id, timeout):
+        self.num_collect_calls += 1
+        await asyncio.sleep(0.01)
+        events, self.events = self.events, []
+        return events
+
+    async def counter_proposal(self, _subscription_id, _demand, proposal):
+        counter_id = f"counter-{proposal.issuer_id}"
+        self.events.append(
+            _proposal(proposal.issuer_id, f"response-{proposal.issuer_id}", counter_id)
+        )
+        return counter_id
+
+
+@pytest.mark.asyncio
+async def test_negotiate_agreements():
+    """Test that negotiations run concurrently, up to the concurrency limit."""
+
+    provider_ids = ["0x01", "0x02", "0x03"]
+    market = _Market(provider_ids)
+    running = 0
+    max_running = 0
+
+    async def _wait_for_proposal_accepted():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    requestor = MagicMock()
+    requestor.api.market.collect_offers = market.collect_offers
+    requestor.counter_proposal = market.counter_proposal
+    requestor.create_agreement = AsyncMock(
+        side_effect=lambda proposal: f"agreement-{proposal.proposal_id}"
+    )
+    requestor.confirm_agreement = AsyncMock()
+    requestor.wait_for_approval = AsyncMock()
+    providers = []
+    for provider_id in provider_ids:
+        provider = MagicMock()
+        provider.address = provider_id
+        provider.wait_for_proposal_accepted = _wait_for_proposal_accepted
+        provider.wait_for_agreement_approved = AsyncMock()
+        providers.append(provider)
+
+    agreements = await negotiate_agreements(
+        requestor, "subscription", MagicMock(), providers, max_concurrency=2
+    )
+
+    assert [a.agreement_id for a in agreements] == [
+        f"agreement-response-{p}" for p in provider_ids
+    ]
+    assert [a.provider for a in agreements] == providers
+    assert list(agreements[0].phase_times) == [
+        "counter_proposal",
+        "create_agreement",
+        "approval",
+    ]
+    assert agreements[0].duration >= 0.05
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_negotiate_agreements_collect_error():
+    """Test that an error in collecting proposals fails the negotiation."""
+
+    requestor = MagicMock()
+    requestor.api.market.collect_offers = AsyncMock(side_effect=ValueError("boom"))
+    provider = MagicMock()
+    provider.address = "0x01"
+
+    with pytest.raises(ValueError):
+        await negotiate_agreements(requestor, "subscription", MagicMock(), [provider])
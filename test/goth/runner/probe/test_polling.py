@@ -0,0 +1,93 @@
+"""Tests for polling yagna REST APIs in probe steps."""
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import ya_activity
+from ya_activity import ExeScriptCommandResult
+from ya_payment import Invoice, InvoiceReceivedEvent
+
+from goth.runner.probe.mixin import ActivityApiMixin, PaymentApiMixin
+from goth.runner.probe.polling import Poller
+
+
+class _Probe(ActivityApiMixin, PaymentApiMixin):
+    def __init__(self):
+        self.name = "probe"
+        self.runner = MagicMock()
+        self.api = MagicMock()
+
+
+@pytest.mark.asyncio
+async def test_poller_backoff(monkeypatch):
+    """Test that the delay grows after calls with no progress and is then reset."""
+
+    delays = []
+
+    async def _sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("goth.runner.probe.polling.asyncio.sleep", _sleep)
+
+    poller = Poller(timeout=10.0, min_delay=0.1, max_delay=0.3)
+    for result in ([], [], [], [], [1], []):
+        assert await poller.poll(AsyncMock(return_value=result), []) == result
+
+    assert delays == [0.1, 0.2, 0.3, 0.3, 0.1]
+    assert poller.num_calls == 6
+
+
+@pytest.mark.asyncio
+async def test_poller_timeout_returns_default():
+    """Test that a long-polling call which timed out returns the default value."""
+
+    call = AsyncMock(side_effect=ya_activity.ApiException(status=408))
+    assert await Poller(min_delay=0).poll(call, ["default"]) == ["default"]
+    call.assert_awaited_once_with(Poller().timeout)
+
+    call = AsyncMock(side_effect=ya_activity.ApiException(status=500))
+    with pytest.raises(ya_activity.ApiException):
+        await Poller().poll(call, [])
+
+
+@pytest.mark.asyncio
+async def test_collect_results_long_polls():
+    """Test that results are long-polled up to the last command of the batch."""
+
+    probe = _Probe()
+    result = ExeScriptCommandResult(
+        index=0, event_date=datetime.now(timezone.utc), result="Ok"
+    )
+    probe.api.activity.control.get_exec_batch_results = AsyncMock(
+        side_effect=[[result], [result, result]]
+    )
+
+    results = await probe.collect_results("activity", "batch", 2)
+
+    assert len(results) == 2
+    probe.api.activity.control.get_exec_batch_results.assert_awaited_with(
+        "activity", "batch", command_index=1, timeout=Poller().timeout
+    )
+
+
+@pytest.mark.asyncio
+async def test_gather_invoices_uses_events():
+    """Test that only invoices from received invoice events are fetched."""
+
+    probe = _Probe()
+    first_date = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    events = [
+        [InvoiceReceivedEvent(event_date=first_date, invoice_id="i1")],
+        [InvoiceReceivedEvent(event_date=first_date, invoice_id="i2")],
+    ]
+    invoices = {
+        "i1": MagicMock(spec=Invoice, agreement_id="other"),
+        "i2": MagicMock(spec=Invoice, agreement_id="agreement"),
+    }
+    probe.api.payment.get_invoice_events = AsyncMock(side_effect=events)
+    probe.api.payment.get_invoice = AsyncMock(side_effect=invoices.get)
+
+    assert await probe.gather_invoices("agreement") == [invoices["i2"]]
+    probe.api.payment.get_invoice_events.assert_awaited_with(
+        timeout=Poller().timeout, after_timestamp=first_date
+    )
@@ -0,0 +1,99 @@
+"""Tests for waiting until a probe's daemon is ready."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from aiohttp import web
+import pytest
+
+import goth.runner.probe
+from goth.address import YAGNA_REST_PORT
+from goth.runner.container.yagna import YagnaContainerConfig
+from goth.runner.exceptions import CommandError
+from goth.runner.probe import Probe, RequestorProbe
+
+
+async def _start_rest_api(port, statuses):
+    """Start a server responding with the given statuses, then with 404."""
+
+    async def _handler(_request):
+        status = statuses.pop(0) if statuses else 404
+        return web.Response(status=status)
+
+    app = web.Application()
+    app.router.add_get("/", _handler)
+    app_runner = web.AppRunner(app)
+    await app_runner.setup()
+    await web.TCPSite(app_runner, "127.0.0.1", port).start()
+    return app_runner
+
+
+def _create_probe(monkeypatch, port) -> Probe:
+    """Create a probe whose REST API port is mapped to `port` on the host."""
+
+    monkeypatch.setattr(goth.runner.probe, "Cli", MagicMock())
+    monkeypatch.setattr(Probe, "_setup_gftp_proxy", lambda _self, config: config)
+
+    config = MagicMock(spec=YagnaContainerConfig)
+    config.name = "probe"
+    config.environment = {}
+    config.volumes = {}
+    config.privileged_mode = False
+    config.payment_id = None
+    probe = RequestorProbe(MagicMock(), MagicMock(), config, log_config=None)
+    probe.container.ports = {YAGNA_REST_PORT: port}
+    return probe
+
+
+@pytest.mark.asyncio
+async def test_wait_until_ready(monkeypatch, unused_tcp_port):
+    """Test that CLI and REST API checks are retried until they succeed."""
+
+    probe = _create_probe(monkeypatch, unused_tcp_port)
+    probe.async_cli = MagicMock()
+    probe.async_cli.id_show = AsyncMock(side_effect=[CommandError("no GSB"), None])
+    statuses = [503]
+    app_runner = await _start_rest_api(unused_tcp_port, statuses)
+
+    try:
+        await probe.wait_until_ready(timeout=5)
+    finally:
+        await app_runner.cleanup()
+
+    assert probe.async_cli.id_show.await_count == 2
+    assert statuses == []
+
+
+@pytest.mark.asyncio
+async def test_wait_until_ready_container_address_unreachable(
+    monkeypatch, unused_tcp_port
+):
+    """Test that the REST API is checked without using the container's address.
+
+    Container addresses are not reachable from the host on macOS and Windows.
+    """
+
+    # An address from a block reserved for documentation, never routed
+    monkeypatch.setattr(
+        goth.runner.probe, "get_container_address", lambda *_args: "192.0.2.1"
+    )
+    probe = _create_probe(monkeypatch, unused_tcp_port)
+    probe.async_cli = MagicMock()
+    probe.async_cli.id_show = AsyncMock()
+    app_runner = await _start_rest_api(unused_tcp_port, [])
+
+    try:
+        await probe.wait_until_ready(timeout=2)
+    finally:
+        await app_runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_wait_until_ready_timeout(monkeypatch, unused_tcp_port):
+    """Test that a daemon which is not ready in time raises a timeout error."""
+
+    probe = _create_probe(monkeypatch, unused_tcp_port)
+    probe.async_cli = MagicMock()
+    probe.async_cli.id_show = AsyncMock()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await probe.wait_until_ready(timeout=0.5)
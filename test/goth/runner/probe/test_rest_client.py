@@ -0,0 +1,33 @@
+"""Tests for the `runner.probe.rest_client` module."""
+from unittest.mock import MagicMock
+
+import pytest
+
+from goth.address import YAGNA_REST_PORT
+from goth.runner.probe.rest_client import HttpPoolConfig, RestApiComponent
+
+
+@pytest.mark.asyncio
+async def test_api_clients_share_session():
+    """Test that all API clients of a probe use a single HTTP session."""
+
+    probe = MagicMock()
+    probe.app_key = "0xcafebabe"
+    probe.container.ports = {YAGNA_REST_PORT: 6001}
+
+    api = RestApiComponent(probe, HttpPoolConfig(limit=4, dns_cache_ttl=None))
+
+    clients = [
+        api.activity.control.api_client,
+        api.activity.state.api_client,
+        api.market.api_client,
+        api.payment.api_client,
+    ]
+    sessions = {id(client.rest_client.pool_manager) for client in clients}
+    assert sessions == {id(api._session)}
+    assert api._session.connector.limit == 4
+
+    unused_sessions = list(api._unused_sessions)
+    await api.close()
+    assert api._session.closed
+    assert all(session.closed for session in unused_sessions)
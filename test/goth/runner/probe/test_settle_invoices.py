@@ -0,0 +1,135 @@
+"""Tests for settling invoices and debit notes with a single allocation."""
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from ya_payment import DebitNote, Invoice
+
+from goth.runner.exceptions import StepTimeoutError
+from goth.runner.probe.mixin import PaymentApiMixin, total_amount_due
+
+
+class _Probe(PaymentApiMixin):
+    def __init__(self):
+        self.name = "probe"
+        self.runner = MagicMock()
+        self.api = MagicMock()
+        self.api.payment.create_allocation = AsyncMock(
+            return_value=MagicMock(allocation_id="allocation")
+        )
+        self.api.payment.release_allocation = AsyncMock()
+
+
+def _invoice(invoice_id, amount, agreement_id=None):
+    return MagicMock(
+        spec=Invoice,
+        invoice_id=invoice_id,
+        amount=amount,
+        agreement_id=agreement_id or f"agreement-{invoice_id}",
+    )
+
+
+def _debit_note(debit_note_id, amount, agreement_id, activity_id):
+    return MagicMock(
+        spec=DebitNote,
+        debit_note_id=debit_note_id,
+        total_amount_due=amount,
+        agreement_id=agreement_id,
+        activity_id=activity_id,
+    )
+
+
+@pytest.mark.asyncio
+async def test_settle_invoices():
+    """Test that documents are accepted concurrently using one allocation."""
+
+    probe = _Probe()
+    running = 0
+    max_running = 0
+
+    async def _accept(_doc_id, acceptance):
+        nonlocal running, max_running
+        assert acceptance.allocation_id == "allocation"
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    probe.api.payment.accept_invoice = _accept
+    probe.api.payment.accept_debit_note = _accept
+    invoices = [_invoice(f"i{n}", "0.1") for n in range(5)]
+    debit_note = _debit_note("d1", "1", "agreement-d1", "activity-d1")
+
+    latencies = await probe.settle_invoices(invoices, [debit_note], 2)
+
+    allocation = probe.api.payment.create_allocation.call_args[0][0]
+    assert allocation.total_amount == "1.5"
+    assert set(latencies) == {"i0", "i1", "i2", "i3", "i4", "d1"}
+    assert max_running == 2
+    probe.api.payment.release_allocation.assert_awaited_once_with("allocation")
+
+
+@pytest.mark.asyncio
+async def test_settle_invoices_failure_releases_allocation():
+    """Test that the allocation is released if an invoice is not accepted."""
+
+    probe = _Probe()
+    probe.api.payment.accept_invoice = AsyncMock(side_effect=[None, ValueError()])
+
+    with pytest.raises(ValueError):
+        await probe.settle_invoices([_invoice("i1", "1"), _invoice("i2", "2")])
+
+    probe.api.payment.release_allocation.assert_awaited_once_with("allocation")
+
+
+@pytest.mark.asyncio
+async def test_settle_invoices_with_debit_notes():
+    """Test that the allocation isn't increased by debit notes of invoiced agreements.
+
+    Amounts due in debit notes are cumulative for an activity, and an invoice
+    covers all activities of its agreement.
+    """
+
+    probe = _Probe()
+    probe.api.payment.accept_invoice = AsyncMock()
+    probe.api.payment.accept_debit_note = AsyncMock()
+    invoice = _invoice("i1", "3", agreement_id="a1")
+    debit_notes = [
+        _debit_note("d1", "1", "a1", "act1"),
+        _debit_note("d2", "2", "a1", "act1"),
+        _debit_note("d3", "0.5", "a2", "act2"),
+        _debit_note("d4", "1.5", "a2", "act2"),
+        _debit_note("d5", "0.25", "a2", "act3"),
+    ]
+
+    await probe.settle_invoices([invoice], debit_notes)
+
+    allocation = probe.api.payment.create_allocation.call_args[0][0]
+    assert allocation.total_amount == "4.75"
+    assert probe.api.payment.accept_debit_note.await_count == 5
+    probe.api.payment.release_allocation.assert_awaited_once_with("allocation")
+
+
+def test_total_amount_due_without_debit_notes():
+    """Test that the total amount due is the sum of invoice amounts."""
+
+    invoices = [_invoice("i1", "0.1"), _invoice("i2", "0.2")]
+    assert total_amount_due(invoices, []) == Decimal("0.3")
+
+
+@pytest.mark.asyncio
+async def test_settle_invoices_timeout_releases_allocation():
+    """Test that the allocation is released if the step times out."""
+
+    probe = _Probe()
+
+    async def _accept(_doc_id, _acceptance):
+        await asyncio.sleep(10)
+
+    probe.api.payment.accept_invoice = _accept
+
+    with pytest.raises(StepTimeoutError):
+        await probe.settle_invoices([_invoice("i1", "1")], timeout=0.1)
+
+    probe.api.payment.release_allocation.assert_awaited_once_with("allocation")
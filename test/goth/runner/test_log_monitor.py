@@ -0,0 +1,236 @@
+"""Tests for the `runner.log_monitor` module."""
+
+import asyncio
+
+import pytest
+
+from goth.runner.log_monitor import (
+    LogEvent,
+    LogEventMonitor,
+    LogIngestionPolicy,
+    LogLevel,
+    parse_json_record,
+)
+
+
+PANIC_LINES = [
+    "[2021-03-01T12:00:00Z INFO  yagna] Starting service",
+    "[2021-03-01T12:00:01Z ERROR ya_payment::api] Payment failed",
+    "stack backtrace:",
+    "   0: std::panicking::begin_panic",
+    "   1: ya_payment::processor::run",
+    "[2021-03-01T12:00:02Z INFO  yagna] Stopping service",
+]
+
+
+@pytest.mark.asyncio
+async def test_continuation_lines_are_assembled():
+    """Test that lines not matching the yagna pattern extend the previous record."""
+
+    monitor = LogEventMonitor("test", flush_interval=0.1)
+    monitor.start(iter(["\n".join(PANIC_LINES).encode()]))
+
+    await monitor.wait_for_entry("Stopping service", timeout=1)
+    await monitor.stop()
+
+    assert len(monitor.events) == 3
+    error = monitor.events[1]
+    assert error.level == LogLevel.ERROR
+    assert error.message.splitlines() == [
+        "Payment failed",
+        "stack backtrace:",
+        "   0: std::panicking::begin_panic",
+        "   1: ya_payment::processor::run",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_entry_pattern_matches_first_line_of_record():
+    """Test that `$` in patterns matches the end of the first line of a record."""
+
+    monitor = LogEventMonitor("test", flush_interval=0.1)
+    monitor.start(iter(["\n".join(PANIC_LINES[1:4]).encode()]))
+
+    event = await monitor.wait_for_entry("Payment failed$", timeout=1)
+    await monitor.stop()
+
+    assert event.module.strip() == "ya_payment::api"
+
+
+@pytest.mark.asyncio
+async def test_lines_outside_records_are_registered():
+    """Test that lines of non-yagna logs are registered as separate events."""
+
+    monitor = LogEventMonitor("test", flush_interval=0.1)
+    monitor.start(iter([b"first line\nsecond line\n"]))
+
+    await monitor.wait_for_entry("second line", timeout=1)
+    await monitor.stop()
+
+    assert [e.message for e in monitor.events] == ["first line", "second line"]
+
+
+@pytest.mark.asyncio
+async def test_idle_record_is_flushed():
+    """Test that the last record is registered after the flush interval."""
+
+    monitor = LogEventMonitor("test", flush_interval=0.1)
+    monitor.start(iter(["\n".join(PANIC_LINES[1:3]).encode()]))
+
+    await asyncio.sleep(0.3)
+    assert len(monitor.events) == 1
+    assert monitor.events[0].message == "Payment failed\nstack backtrace:"
+    await monitor.stop()
+
+
+@pytest.mark.asyncio
+async def test_record_assembly_disabled():
+    """Test that each line is a separate event if `flush_interval` is `None`."""
+
+    monitor = LogEventMonitor("test", flush_interval=None)
+    monitor.start(iter(["\n".join(PANIC_LINES).encode()]))
+
+    await monitor.wait_for_entry("Stopping service", timeout=1)
+    await monitor.stop()
+
+    assert len(monitor.events) == len(PANIC_LINES)
+
+
+DEBUG_LINES = [
+    "[2021-03-01T12:00:00Z DEBUG ya_market::matcher] Offer received",
+    "[2021-03-01T12:00:01Z TRACE ya_net] Packet sent",
+    "[2021-03-01T12:00:02Z DEBUG ya_payment] Invoice event",
+    "[2021-03-01T12:00:03Z INFO  yagna] Service started",
+]
+
+
+@pytest.mark.asyncio
+async def test_ingestion_policy_min_level():
+    """Test that records below the policy's minimum level are not registered."""
+
+    policy = LogIngestionPolicy(min_level=LogLevel.INFO)
+    monitor = LogEventMonitor("test", flush_interval=0.1, ingestion_policy=policy)
+    monitor.start(iter(["\n".join(PANIC_LINES + DEBUG_LINES).encode()]))
+
+    await monitor.wait_for_entry("Service started", timeout=1)
+    await monitor.stop()
+
+    assert [e.level for e in monitor.events] == [
+        LogLevel.INFO,
+        LogLevel.ERROR,
+        LogLevel.INFO,
+        LogLevel.INFO,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ingestion_policy_skips_continuation_lines():
+    """Test that continuation lines of skipped records are not registered."""
+
+    lines = [DEBUG_LINES[0], "  details", DEBUG_LINES[3]]
+    policy = LogIngestionPolicy(min_level=LogLevel.INFO)
+    monitor = LogEventMonitor("test", flush_interval=None, ingestion_policy=policy)
+    monitor.start(iter(["\n".join(lines).encode()]))
+
+    await monitor.wait_for_entry("Service started", timeout=1)
+    await monitor.stop()
+
+    assert [e.message for e in monitor.events] == ["Service started"]
+
+
+def test_ingestion_policy_module_levels():
+    """Test that the longest matching module prefix determines the level."""
+
+    policy = LogIngestionPolicy(
+        min_level=LogLevel.INFO,
+        module_levels={
+            "ya_market": LogLevel.TRACE,
+            "ya_market::matcher": LogLevel.WARN,
+        },
+    )
+
+    assert policy.level_for("yagna") == LogLevel.INFO
+    assert policy.level_for("ya_market::negotiation") == LogLevel.TRACE
+    assert policy.level_for("ya_market::matcher::store") == LogLevel.WARN
+
+
+@pytest.mark.asyncio
+async def test_ingestion_policy_sampling():
+    """Test that sampling registers an even fraction of less severe records."""
+
+    lines = [f"[2021-03-01T12:00:00Z DEBUG ya_net] Packet {n}" for n in range(1, 9)]
+    lines.append(DEBUG_LINES[3])
+    policy = LogIngestionPolicy(sample_rate=0.25)
+    monitor = LogEventMonitor("test", flush_interval=None, ingestion_policy=policy)
+    monitor.start(iter(["\n".join(lines).encode()]))
+
+    await monitor.wait_for_entry("Service started", timeout=1)
+    await monitor.stop()
+
+    assert [e.message for e in monitor.events] == [
+        "Packet 4",
+        "Packet 8",
+        "Service started",
+    ]
+
+
+JSON_LINES = [
+    '{"timestamp":"2021-03-01T12:00:00.123456789Z","level":"INFO",'
+    '"fields":{"message":"Agreement created","agreement_id":"a1"},'
+    '"target":"ya_market::negotiation"}',
+    '{"ts":1614600001000,"level":"debug","msg":"Invoice sent",'
+    '"module_path":"ya_provider::payments","agreement_id":"a2","amount":3}',
+]
+
+
+def test_json_record_fields():
+    """Test that JSON log records are parsed into typed event attributes."""
+
+    event = LogEvent.from_json(JSON_LINES[0], parse_json_record(JSON_LINES[0]))
+
+    assert event.message == "Agreement created"
+    assert event.level == LogLevel.INFO
+    assert event.module == "ya_market::negotiation"
+    assert event.timestamp == pytest.approx(1614600000.123456)
+    assert event.fields == {"agreement_id": "a1"}
+
+    event = LogEvent.from_json(JSON_LINES[1], parse_json_record(JSON_LINES[1]))
+
+    assert event.message == "Invoice sent"
+    assert event.level == LogLevel.DEBUG
+    assert event.module == "ya_provider::payments"
+    assert event.timestamp == 1614600001.0
+    assert event.fields == {"agreement_id": "a2", "amount": 3}
+
+
+@pytest.mark.asyncio
+async def test_wait_for_json_fields():
+    """Test waiting for records by message text and by structured fields."""
+
+    monitor = LogEventMonitor("test", flush_interval=0.1, json_records=True)
+    monitor.start(iter(["\n".join(JSON_LINES).encode()]))
+
+    event = await monitor.wait_for_entry("Agreement created", timeout=1)
+    assert event.fields["agreement_id"] == "a1"
+
+    event = await monitor.wait_for_fields({"agreement_id": "a2"}, timeout=1)
+    assert event.message == "Invoice sent"
+    await monitor.stop()
+
+
+@pytest.mark.asyncio
+async def test_json_lines_not_parsed_by_default():
+    """Test that a JSON payload continues a text record unless JSON is enabled."""
+
+    lines = [PANIC_LINES[0], '{"message": "payload"}', PANIC_LINES[-1]]
+    monitor = LogEventMonitor("test", flush_interval=0.1)
+    monitor.start(iter(["\n".join(lines).encode()]))
+
+    await monitor.wait_for_entry("Stopping service", timeout=1)
+    await monitor.stop()
+
+    assert len(monitor.events) == 2
+    assert monitor.events[0].message.splitlines() == [
+        "Starting service",
+        '{"message": "payload"}',
+    ]
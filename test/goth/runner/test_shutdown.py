@@ -186,14 +186,14 @@ async def test_runner_startup_shutdown(
     # it depends on start successfully.
     assert web_server_start.called or manager_start_network.failed
     assert probe_init.called or manager_start_network.failed or web_server_start.failed
-    assert probe_start.called or (
+    assert proxy_start.called or (
         manager_start_network.failed or web_server_start.failed or probe_init.failed
     )
-    assert proxy_start.called or (
+    assert probe_start.called or (
         manager_start_network.failed
         or web_server_start.failed
         or probe_init.failed
-        or probe_start.failed
+        or proxy_start.failed
     )
 
 
@@ -245,3 +245,37 @@ async def test_runner_cancelled(mock_function, cancel):
             raise asyncio.CancelledError()
 
     assert cancellation_callback.called == cancel
+
+
+@pytest.mark.asyncio
+async def test_probes_start_concurrently(mock_function, monkeypatch):
+    """Test that probes start concurrently, with bounded parallelism."""
+
+    for class_, funcs in (
+        (ComposeNetworkManager, ("start_network", "stop_network")),
+        (WebServer, ("start", "stop")),
+        (Probe, ("remove", "stop")),
+        (Proxy, ("start", "stop")),
+        (Runner, ("check_assertion_errors",)),
+    ):
+        for func in funcs:
+            mock_function(class_, func)
+
+    running = 0
+    max_running = 0
+
+    async def _start(_probe):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    monkeypatch.setattr(Probe, "start", _start)
+
+    runner = mock_runner()
+    runner.max_concurrent_probe_starts = 2
+    async with runner(topology * 3):
+        assert len(runner.probes) == 6
+
+    assert max_running == 2
@@ -2,6 +2,7 @@
 from pathlib import Path
 
 import pytest
+import yaml
 
 from goth.configuration import load_yaml
 from goth.project import PROJECT_ROOT
@@ -19,3 +20,23 @@ def test_parse_default_config(default_config_file: Path):
 
     config = load_yaml(default_config_file)
     assert config.compose_config.build_env
+
+
+def test_parse_json_logs(default_config_file: Path, tmp_path: Path):
+    """Test that the `json-logs` setting of a node type applies to its nodes."""
+
+    with open(default_config_file) as f:
+        doc = yaml.safe_load(f)
+    doc["node-types"][0]["json-logs"] = True
+    doc["key-dir"] = str(default_config_file.parent / doc["key-dir"])
+    config_file = tmp_path / "goth-config.yml"
+    with open(config_file, "w") as f:
+        yaml.safe_dump(doc, f)
+
+    config = load_yaml(config_file)
+    json_logs = {c.name: c.json_logs for c in config.containers}
+    assert json_logs == {
+        "requestor": True,
+        "provider-1": False,
+        "provider-2": False,
+    }
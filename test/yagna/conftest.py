@@ -11,6 +11,7 @@ from goth.runner.container.build import YagnaBuildEnvironment
 from goth.runner.container.compose import ComposeConfig, DEFAULT_COMPOSE_FILE
 from goth.runner.container.payment import PaymentIdPool
 from goth.runner.log import configure_logging, DEFAULT_LOG_DIR
+from goth.runner.proxy import ProxyEngine
 
 
 def pytest_addoption(parser):
@@ -31,6 +32,19 @@ def pytest_addoption(parser):
         action="store",
         help="path under which all test run logs should be stored",
     )
+    parser.addoption(
+        "--proxy-engine",
+        action="store",
+        choices=[engine.value for engine in ProxyEngine],
+        default=ProxyEngine.MITMPROXY.value,
+        help="implementation of the proxy server for API calls",
+    )
+    parser.addoption(
+        "--proxy-workers",
+        action="store",
+        type=int,
+        help="number of worker processes for the sharded proxy engine",
+    )
     parser.addoption(
         "--yagna-binary-path",
         action="store",
@@ -85,6 +99,18 @@ def session_log_dir(request) -> Path:
     return base_log_dir
 
 
+@pytest.fixture(scope="session")
+def proxy_engine(request) -> ProxyEngine:
+    """Fixture that passes the --proxy-engine CLI parameter to the test suite."""
+    return ProxyEngine(request.config.option.proxy_engine)
+
+
+@pytest.fixture(scope="session")
+def proxy_workers(request) -> Optional[int]:
+    """Fixture that passes the --proxy-workers CLI parameter to the test suite."""
+    return request.config.option.proxy_workers
+
+
 @pytest.fixture(scope="session")
 def yagna_binary_path(request) -> Optional[Path]:
     """Fixture that passes the --yagna-binary-path CLI parameter to the test suite."""
@@ -236,6 +262,8 @@ def runner(
     proxy_assertions_module: str,
     test_failure_callback: Callable[[TestFailure], None],
     cancellation_callback: Callable[[], None],
+    proxy_engine: ProxyEngine,
+    proxy_workers: Optional[int],
 ) -> Runner:
     """Fixture providing the `Runner` object for a test."""
 
@@ -246,4 +274,6 @@ def runner(
         test_failure_callback=test_failure_callback,
         cancellation_callback=cancellation_callback,
         web_root_path=assets_path / "web-root",
+        proxy_engine=proxy_engine,
+        proxy_workers=proxy_workers,
     )
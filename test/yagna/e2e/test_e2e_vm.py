@@ -106,35 +106,13 @@ async def test_e2e_vm_success(
             task_package, demand_constraints
         )
 
-        proposals = await requestor.wait_for_proposals(
+        agreements = await requestor.negotiate_agreements(
             subscription_id,
+            demand,
             providers,
             lambda proposal: proposal.properties.get("golem.runtime.name") == "vm",
         )
-        logger.info("Collected %s proposals", len(proposals))
-
-        agreement_providers = []
-
-        for proposal in proposals:
-            provider = next(p for p in providers if p.address == proposal.issuer_id)
-            logger.info("Processing proposal from %s", provider.name)
-
-            counterproposal_id = await requestor.counter_proposal(
-                subscription_id, demand, proposal
-            )
-            await provider.wait_for_proposal_accepted()
-
-            new_proposals = await requestor.wait_for_proposals(
-                subscription_id,
-                (provider,),
-                lambda proposal: proposal.prev_proposal_id == counterproposal_id,
-            )
-
-            agreement_id = await requestor.create_agreement(new_proposals[0])
-            await requestor.confirm_agreement(agreement_id)
-            await provider.wait_for_agreement_approved()
-            await requestor.wait_for_approval(agreement_id)
-            agreement_providers.append((agreement_id, provider))
+        agreement_providers = [(a.agreement_id, a.provider) for a in agreements]
 
         await requestor.unsubscribe_demand(subscription_id)
         logger.info("Got %s agreements", len(agreement_providers))
@@ -143,16 +121,16 @@ async def test_e2e_vm_success(
 
         num_commands = len(exe_script)
 
-        for agreement_id, provider in agreement_providers:
-            logger.info("Running activity on %s", provider.name)
-            activity_id = await requestor.create_activity(agreement_id)
-            await provider.wait_for_exeunit_started()
-            batch_id = await requestor.call_exec(activity_id, json.dumps(exe_script))
-            await requestor.collect_results(
-                activity_id, batch_id, num_commands, timeout=300
+        activities = requestor.run_activities(
+            agreement_providers, json.dumps(exe_script), num_commands
+        )
+        async for run, result in activities.results():
+            logger.info("Result from %s: %s", run.provider.name, result.result)
+        for run in activities.runs:
+            assert len(run.results) == num_commands
+            logger.info(
+                "Activity timing for %s: %s", run.provider.name, run.phase_times
             )
-            await requestor.destroy_activity(activity_id)
-            await provider.wait_for_exeunit_finished()
 
         assert output_path.is_file()
         assert output_path.stat().st_size > 0
@@ -72,42 +72,17 @@ async def negotiate_agreements(
 
     Use negotiate_agreements function, when you don't need any custom negotiation
     logic, but rather you want to test further parts of yagna protocol
-    and need ready Agreements.
+    and need ready Agreements. Negotiations with the providers run concurrently.
     """
     for provider in providers:
         await provider.wait_for_offer_subscribed()
 
     subscription_id, demand = await requestor.subscribe_demand(demand)
 
-    proposals = await requestor.wait_for_proposals(
-        subscription_id,
-        providers,
-        proposal_filter,
+    agreements = await requestor.negotiate_agreements(
+        subscription_id, demand, providers, proposal_filter
     )
-    logger.info("Collected %s proposals", len(proposals))
-
-    agreement_providers = []
-
-    for proposal in proposals:
-        provider = next(p for p in providers if p.address == proposal.issuer_id)
-        logger.info("Processing proposal from %s", provider.name)
-
-        counter_proposal_id = await requestor.counter_proposal(
-            subscription_id, demand, proposal
-        )
-        await provider.wait_for_proposal_accepted()
-
-        new_proposals = await requestor.wait_for_proposals(
-            subscription_id,
-            (provider,),
-            lambda proposal: proposal.prev_proposal_id == counter_proposal_id,
-        )
-
-        agreement_id = await requestor.create_agreement(new_proposals[0])
-        await requestor.confirm_agreement(agreement_id)
-        await provider.wait_for_agreement_approved()
-        await requestor.wait_for_approval(agreement_id)
-        agreement_providers.append((agreement_id, provider))
+    agreement_providers = [(a.agreement_id, a.provider) for a in agreements]
 
     await requestor.unsubscribe_demand(subscription_id)
     logger.info("Got %s agreements", len(agreement_providers))
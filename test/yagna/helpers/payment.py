@@ -9,11 +9,13 @@ async def pay_all(
     requestor: RequestorProbe,
     agreements: List[Tuple[str, ProviderProbe]],
 ):
-    """Pay for all Agreements."""
+    """Pay for all Agreements, settling all of their invoices at once."""
+    all_invoices = []
     for agreement_id, provider in agreements:
         await provider.wait_for_invoice_sent()
         invoices = await requestor.gather_invoices(agreement_id)
         assert all(inv.agreement_id == agreement_id for inv in invoices)
-        # TODO:
-        await requestor.pay_invoices(invoices)
+        all_invoices.extend(invoices)
+    await requestor.settle_invoices(all_invoices)
+    for _, provider in agreements:
         await provider.wait_for_invoice_paid()
@@ -1,7 +1,6 @@
 """Test scenario that starts providers with VM runtime in interactive mode."""
 
 import asyncio
-import json
 import logging
 from pathlib import Path
 from typing import List
@@ -14,7 +13,11 @@ from goth.address import (
     YAGNA_BUS_PORT,
     YAGNA_REST_PORT,
 )
-from goth.api_monitor.api_events import APIEvent, APIResponse
+from goth.api_monitor.api_events import (
+    APIEvent,
+    APIResponse,
+    get_response_event_types,
+)
 from goth.assertions.common import APIEvents
 from goth.assertions.operators import eventually
 from goth.node import node_environment
@@ -87,15 +90,11 @@ def _topology(
 
 
 def _contains_activity_event(event: APIEvent, event_type: str) -> bool:
-    if (
+    return (
         isinstance(event, APIResponse)
         and event.request.path.startswith("/activity-api/v1/events?")
-        and event.status_code == 200
-    ):
-        body = json.loads(event.content)
-        if any(e["eventType"] == event_type for e in body):
-            return True
-    return False
+        and event_type in get_response_event_types(event)
+    )
 
 
 async def _assert_activity_started(stream: APIEvents) -> None: